@@ -0,0 +1,188 @@
+import os
+import math
+import time
+import asyncio
+from collections import deque
+from contextlib import asynccontextmanager
+from fastapi import HTTPException
+
+# GPU를 쓰는 엔드포인트 입장 제어 (백프레셔)
+# - 전체 동시 처리 수 제한 + 사용자별 동시 요청 수 제한 + 길이가 정해진 대기열
+# - 한도를 넘으면 오래 붙잡아 두지 않고 바로 429(사용자 한도) / 503(서버 혼잡)을 Retry-After와 함께 반환
+# 과부하 때 모든 요청이 함께 타임아웃 나는 대신, 받은 요청은 제시간에 끝내고 나머지는 빨리 거절합니다.
+
+TTS_MAX_IN_FLIGHT = int(os.getenv("TTS_MAX_IN_FLIGHT", 4))       # 동시에 AI 서버로 보내는 합성 요청 수
+TTS_MAX_PER_USER = int(os.getenv("TTS_MAX_PER_USER", 2))         # 사용자 한 명의 동시 요청 수 (대기 포함)
+TTS_MAX_QUEUE = int(os.getenv("TTS_MAX_QUEUE", 32))              # 대기열 길이
+TTS_MAX_QUEUE_WAIT = float(os.getenv("TTS_MAX_QUEUE_WAIT", 20))  # 대기열에서 기다리는 최대 시간 (초)
+
+TRAIN_MAX_BACKLOG = int(os.getenv("TRAIN_MAX_BACKLOG", 20))      # 대기 중인 학습 작업 수 한도
+TRAIN_MAX_PER_USER = int(os.getenv("TRAIN_MAX_PER_USER", 1))     # 사용자별 진행 중인 학습 작업 수
+TRAIN_RETRY_AFTER = 60
+
+RECENT_SAMPLES = 1000
+
+
+def _percentile(values: list[float], q: float) -> float | None:
+    if not values:
+        return None
+    ordered = sorted(values)
+    return round(ordered[min(int(len(ordered) * q), len(ordered) - 1)], 3)
+
+
+class AdmissionController:
+    def __init__(self, name: str, max_in_flight: int, max_per_user: int, max_queue: int, max_wait: float):
+        self.name = name
+        self.max_in_flight = max_in_flight
+        self.max_per_user = max_per_user
+        self.max_queue = max_queue
+        self.max_wait = max_wait
+        self.in_flight = 0
+        self.per_user = {}       # user_id -> 처리 중 + 대기 중 요청 수
+        self.waiters = deque()   # 자리를 기다리는 future (FIFO)
+        self.wait_times = deque(maxlen=RECENT_SAMPLES)
+        self.service_times = deque(maxlen=RECENT_SAMPLES)
+        self.stats = {"admitted": 0, "queued": 0, "rejected_user": 0, "rejected_queue": 0, "timed_out": 0}
+
+    def _retry_after(self) -> int:
+        # 평균 처리 시간 기준으로 대기열이 빠지는 데 걸릴 시간을 대략 계산
+        avg = sum(self.service_times) / len(self.service_times) if self.service_times else 5.0
+        return max(1, math.ceil(avg * (len(self.waiters) + 1) / self.max_in_flight))
+
+    def _reject(self, status_code: int, detail: str, counter: str):
+        self.stats[counter] += 1
+        raise HTTPException(status_code=status_code, detail=detail, headers={"Retry-After": str(self._retry_after())})
+
+    def _add_user(self, user_id: int, delta: int):
+        count = self.per_user.get(user_id, 0) + delta
+        if count > 0:
+            self.per_user[user_id] = count
+        else:
+            self.per_user.pop(user_id, None)
+
+    def _free_slot(self):
+        # 기다리는 요청이 있으면 자리를 그대로 넘겨주고, 없으면 반납
+        while self.waiters:
+            future = self.waiters.popleft()
+            if not future.done():
+                future.set_result(None)
+                return
+        self.in_flight -= 1
+
+    async def acquire(self, user_id: int) -> float:
+        """자리를 얻을 때까지 대기 (한도 초과 시 HTTPException). 처리 시작 시각 반환"""
+        if self.per_user.get(user_id, 0) >= self.max_per_user:
+            self._reject(429, "동시에 보낼 수 있는 요청 수를 넘었습니다. 잠시 후 다시 시도해주세요.", "rejected_user")
+
+        enqueued_at = time.monotonic()
+        if self.in_flight < self.max_in_flight and not self.waiters:
+            self.in_flight += 1
+        else:
+            if len(self.waiters) >= self.max_queue:
+                self._reject(503, "요청이 많아 처리할 수 없습니다. 잠시 후 다시 시도해주세요.", "rejected_queue")
+            future = asyncio.get_running_loop().create_future()
+            self.waiters.append(future)
+            self._add_user(user_id, 1)
+            self.stats["queued"] += 1
+            try:
+                await asyncio.wait({future}, timeout=self.max_wait)
+            except asyncio.CancelledError:
+                # 대기 중에 클라이언트가 끊김: 이미 자리를 받았으면 돌려줌
+                self._abandon(future)
+                self._add_user(user_id, -1)
+                raise
+            if not future.done():
+                self._abandon(future)
+                self._add_user(user_id, -1)
+                self._reject(503, "대기 시간이 초과되었습니다. 잠시 후 다시 시도해주세요.", "timed_out")
+            self._add_user(user_id, -1)
+
+        self._add_user(user_id, 1)
+        self.stats["admitted"] += 1
+        started_at = time.monotonic()
+        self.wait_times.append(started_at - enqueued_at)
+        return started_at
+
+    def _abandon(self, future):
+        if future.done() and not future.cancelled():
+            self._free_slot()
+            return
+        future.cancel()
+        try:
+            self.waiters.remove(future)
+        except ValueError:
+            pass
+
+    def release(self, user_id: int, started_at: float):
+        self._add_user(user_id, -1)
+        self.service_times.append(time.monotonic() - started_at)
+        self._free_slot()
+
+    @asynccontextmanager
+    async def slot(self, user_id: int):
+        started_at = await self.acquire(user_id)
+        try:
+            yield
+        finally:
+            self.release(user_id, started_at)
+
+    def report(self) -> dict:
+        waits = list(self.wait_times)
+        return {
+            **self.stats,
+            "in_flight": self.in_flight,
+            "queue_depth": len(self.waiters),
+            "active_users": len(self.per_user),
+            "max_in_flight": self.max_in_flight,
+            "max_per_user": self.max_per_user,
+            "max_queue": self.max_queue,
+            "max_wait_seconds": self.max_wait,
+            "wait_seconds": {
+                "avg": round(sum(waits) / len(waits), 3) if waits else None,
+                "p50": _percentile(waits, 0.5),
+                "p95": _percentile(waits, 0.95),
+                "max": round(max(waits), 3) if waits else None,
+            },
+            "avg_service_seconds": round(sum(self.service_times) / len(self.service_times), 3) if self.service_times else None,
+        }
+
+
+class BacklogGuard:
+    """학습처럼 백그라운드 큐로 넘기는 작업용: 큐가 가득 찼거나 사용자가 이미 작업 중이면 바로 거절"""
+
+    def __init__(self, max_backlog: int, max_per_user: int, retry_after: int):
+        self.max_backlog = max_backlog
+        self.max_per_user = max_per_user
+        self.retry_after = retry_after
+        self.stats = {"admitted": 0, "rejected_user": 0, "rejected_queue": 0}
+        self.last_backlog = 0
+
+    def check(self, backlog: int, user_pending: int):
+        self.last_backlog = backlog
+        if user_pending >= self.max_per_user:
+            self.stats["rejected_user"] += 1
+            raise HTTPException(
+                status_code=429,
+                detail="이미 진행 중인 학습이 있습니다. 끝난 뒤 다시 시도해주세요.",
+                headers={"Retry-After": str(self.retry_after)},
+            )
+        if backlog >= self.max_backlog:
+            self.stats["rejected_queue"] += 1
+            raise HTTPException(
+                status_code=503,
+                detail="학습 요청이 많아 지금은 접수할 수 없습니다. 잠시 후 다시 시도해주세요.",
+                headers={"Retry-After": str(self.retry_after)},
+            )
+        self.stats["admitted"] += 1
+
+    def report(self) -> dict:
+        return {
+            **self.stats,
+            "queue_depth": self.last_backlog,
+            "max_backlog": self.max_backlog,
+            "max_per_user": self.max_per_user,
+        }
+
+
+tts_admission = AdmissionController("tts", TTS_MAX_IN_FLIGHT, TTS_MAX_PER_USER, TTS_MAX_QUEUE, TTS_MAX_QUEUE_WAIT)
+train_admission = BacklogGuard(TRAIN_MAX_BACKLOG, TRAIN_MAX_PER_USER, TRAIN_RETRY_AFTER)
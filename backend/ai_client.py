@@ -0,0 +1,334 @@
+import os
+import time
+import random
+import bisect
+import hashlib
+import asyncio
+from contextlib import asynccontextmanager, contextmanager, AsyncExitStack
+import httpx
+import metrics
+
+# 백엔드 -> AI 서버(GPT-SoVITS) 호출용 공용 비동기 클라이언트
+# - keep-alive 커넥션 풀을 재사용 (요청마다 TCP 연결을 새로 열지 않음)
+# - 경로별 타임아웃
+# - 멱등 요청만 지터를 섞어 제한된 횟수로 재시도 (학습/합성은 연결 자체가 안 됐을 때만 재시도)
+# - AI 서버가 여러 대면 model_path 기준 일관 해싱으로 같은 목소리를 같은 서버로 보냄 (가중치 캐시 유지)
+
+GPT_SOVITS_URL = os.getenv("GPT_SOVITS_URL", "http://gpt-sovits:9880")
+# 쉼표로 구분한 AI 서버 목록 (없으면 GPT_SOVITS_URL 한 대)
+GPT_SOVITS_URLS = [u.strip() for u in os.getenv("GPT_SOVITS_URLS", GPT_SOVITS_URL).split(",") if u.strip()]
+
+# 경로별 읽기 타임아웃 (초)
+ROUTE_TIMEOUTS = {
+    "/train_model": 600,
+    "/tts": 120,
+    "/models/manifest": 5,
+    "/warmup": 5,
+}
+DEFAULT_TIMEOUT = 30
+CONNECT_TIMEOUT = 5
+
+MAX_RETRIES = 2
+RETRY_BACKOFF = 0.2          # 첫 재시도 대기 (초), 이후 2배씩
+RETRY_STATUS = {502, 503, 504}
+
+VIRTUAL_NODES = int(os.getenv("AI_RING_VNODES", 100))           # 서버 한 대당 해시 링 위의 가상 노드 수
+HEALTH_CHECK_INTERVAL = float(os.getenv("AI_HEALTH_CHECK_INTERVAL", 10))
+HEALTH_CHECK_TIMEOUT = 3
+HEALTH_FAILURE_THRESHOLD = 2                                     # 연속 실패 횟수가 이만큼이면 링에서 제외
+
+
+def _correlation_headers() -> dict:
+    # 현재 요청의 상관 ID를 AI 서버에도 전달 (두 서비스의 로그/지표를 한 요청으로 묶기)
+    request_id = metrics.request_id_var.get()
+    return {"X-Request-ID": request_id} if request_id else {}
+
+
+class AIServerError(Exception):
+    def __init__(self, status_code: int, text: str):
+        super().__init__(f"AI Server Error ({status_code}): {text}")
+        self.status_code = status_code
+        self.text = text
+
+
+class AIClient:
+    def __init__(self, base_url: str, max_connections: int = 20):
+        self.base_url = base_url
+        self.http = httpx.AsyncClient(
+            base_url=base_url,
+            limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections),
+            timeout=httpx.Timeout(DEFAULT_TIMEOUT, connect=CONNECT_TIMEOUT),
+        )
+
+    @staticmethod
+    def _timeout(path: str) -> httpx.Timeout:
+        return httpx.Timeout(ROUTE_TIMEOUTS.get(path, DEFAULT_TIMEOUT), connect=CONNECT_TIMEOUT)
+
+    async def _send(self, method: str, path: str, idempotent: bool, **kwargs) -> httpx.Response:
+        attempt = 0
+        while True:
+            try:
+                response = await self.http.request(method, path, timeout=self._timeout(path), headers=_correlation_headers(), **kwargs)
+                if not (idempotent and response.status_code in RETRY_STATUS and attempt < MAX_RETRIES):
+                    return response
+            except httpx.ConnectError:
+                # 요청이 서버에 닿지도 않았으므로 어떤 요청이든 재시도해도 안전
+                if attempt >= MAX_RETRIES:
+                    raise
+            except httpx.TransportError:
+                if not idempotent or attempt >= MAX_RETRIES:
+                    raise
+            attempt += 1
+            await asyncio.sleep(RETRY_BACKOFF * (2 ** (attempt - 1)) * (0.5 + random.random()))
+
+    async def get_json(self, path: str, params: dict = None) -> dict:
+        response = await self._send("GET", path, idempotent=True, params=params)
+        if response.status_code != 200:
+            raise AIServerError(response.status_code, response.text)
+        return response.json()
+
+    async def post(self, path: str, payload: dict, idempotent: bool = False) -> httpx.Response:
+        response = await self._send("POST", path, idempotent=idempotent, json=payload)
+        if response.status_code != 200:
+            raise AIServerError(response.status_code, response.text)
+        return response
+
+    @asynccontextmanager
+    async def stream(self, path: str, payload: dict):
+        """본문을 aiter_bytes()로 흘려 읽는 POST (스트리밍 TTS용)"""
+        async with self.http.stream("POST", path, json=payload, timeout=self._timeout(path), headers=_correlation_headers()) as response:
+            if response.status_code != 200:
+                text = (await response.aread()).decode("utf-8", errors="replace")
+                raise AIServerError(response.status_code, text)
+            yield response
+
+    async def aclose(self):
+        await self.http.aclose()
+
+
+class HashRing:
+    """가상 노드를 둔 일관 해싱 링. 서버가 추가/제거돼도 약 1/N 의 키만 다른 서버로 옮겨감"""
+
+    def __init__(self, vnodes: int):
+        self.vnodes = vnodes
+        self.points = []  # 정렬된 해시값
+        self.owners = []  # points와 같은 순서의 서버 URL
+
+    @staticmethod
+    def _hash(key: str) -> int:
+        return int(hashlib.md5(key.encode("utf-8")).hexdigest()[:16], 16)
+
+    def add(self, node: str):
+        if node in self.owners:
+            return
+        for i in range(self.vnodes):
+            point = self._hash(f"{node}#{i}")
+            idx = bisect.bisect(self.points, point)
+            self.points.insert(idx, point)
+            self.owners.insert(idx, node)
+
+    def remove(self, node: str):
+        kept = [(p, o) for p, o in zip(self.points, self.owners) if o != node]
+        self.points = [p for p, _ in kept]
+        self.owners = [o for _, o in kept]
+
+    def nodes(self) -> set:
+        return set(self.owners)
+
+    def candidates(self, key: str) -> list[str]:
+        """key의 담당 서버부터 링을 따라 도는 순서의 서버 목록 (장애 시 다음 서버로 넘기기용)"""
+        if not self.points:
+            return []
+        start = bisect.bisect(self.points, self._hash(key)) % len(self.points)
+        ordered = []
+        for i in range(len(self.points)):
+            owner = self.owners[(start + i) % len(self.points)]
+            if owner not in ordered:
+                ordered.append(owner)
+                if len(ordered) == len(self.nodes()):
+                    break
+        return ordered
+
+    def share(self) -> dict:
+        """서버별로 맡고 있는 해시 공간 비율"""
+        if not self.points:
+            return {}
+        span = 2 ** 64
+        shares = {}
+        for i, point in enumerate(self.points):
+            prev = self.points[i - 1] if i else self.points[-1] - span
+            shares[self.owners[i]] = shares.get(self.owners[i], 0) + (point - prev)
+        return {node: round(size / span, 4) for node, size in shares.items()}
+
+
+class AIWorkerPool:
+    """
+    AI 서버 여러 대를 AIClient와 같은 인터페이스(get_json / post / stream)로 감싼 풀.
+    - model_path가 있는 요청은 해시 링으로 담당 서버를 정하고, 연결이 안 되면 링의 다음 서버로 넘김
+    - model_path가 없는 요청(학습 등)은 처리 중인 요청이 가장 적은 서버로
+    - 주기적인 헬스 체크로 죽은 서버는 링에서 빼고, 살아나면 다시 넣음
+    """
+
+    def __init__(self, urls: list[str]):
+        self.nodes = {}     # url -> AIClient
+        self.metrics = {}   # url -> 서버별 부하 지표
+        self.ring = HashRing(VIRTUAL_NODES)
+        self.health_task = None
+        for url in urls:
+            self.add_node(url)
+
+    # --- 서버 관리 ---
+    def add_node(self, url: str) -> bool:
+        if url in self.nodes:
+            return False
+        self.nodes[url] = AIClient(url)
+        self.metrics[url] = {
+            "healthy": True, "consecutive_failures": 0, "in_flight": 0, "requests": 0,
+            "errors": 0, "total_latency": 0.0, "queue_depth": None, "last_checked": None,
+        }
+        self.ring.add(url)
+        print(f"AI 서버 추가: {url} (총 {len(self.nodes)}대)")
+        return True
+
+    async def remove_node(self, url: str) -> bool:
+        client = self.nodes.pop(url, None)
+        if client is None:
+            return False
+        self.ring.remove(url)
+        self.metrics.pop(url, None)
+        await client.aclose()
+        print(f"AI 서버 제거: {url}")
+        return True
+
+    def node(self, url: str) -> AIClient:
+        return self.nodes[url]
+
+    def owner(self, model_path: str) -> str | None:
+        candidates = self.ring.candidates(model_path)
+        return candidates[0] if candidates else None
+
+    def _mark_down(self, url: str, reason: str):
+        metrics = self.metrics.get(url)
+        if metrics and metrics["healthy"]:
+            metrics["healthy"] = False
+            self.ring.remove(url)
+            print(f"AI 서버 제외: {url} ({reason})")
+
+    def _mark_up(self, url: str):
+        metrics = self.metrics.get(url)
+        if metrics and not metrics["healthy"]:
+            metrics["healthy"] = True
+            self.ring.add(url)
+            print(f"AI 서버 복귀: {url}")
+
+    # --- 헬스 체크 ---
+    def start_health_checks(self):
+        if self.health_task is None or self.health_task.done():
+            self.health_task = asyncio.create_task(self._health_loop())
+
+    async def _health_loop(self):
+        while True:
+            await asyncio.gather(*(self._check(url) for url in list(self.nodes)), return_exceptions=True)
+            await asyncio.sleep(HEALTH_CHECK_INTERVAL)
+
+    async def _check(self, url: str):
+        metrics = self.metrics.get(url)
+        try:
+            response = await self.nodes[url].http.get("/tts/queue", timeout=HEALTH_CHECK_TIMEOUT)
+            response.raise_for_status()
+            metrics["queue_depth"] = response.json().get("queue_depth")
+            metrics["consecutive_failures"] = 0
+            self._mark_up(url)
+        except (httpx.HTTPError, ValueError) as e:
+            metrics["consecutive_failures"] += 1
+            if metrics["consecutive_failures"] >= HEALTH_FAILURE_THRESHOLD:
+                self._mark_down(url, f"헬스 체크 실패: {e}")
+        metrics["last_checked"] = time.time()
+
+    # --- 라우팅 ---
+    def _route(self, key: str | None) -> list[str]:
+        healthy = [url for url in self.nodes if self.metrics[url]["healthy"]]
+        if key:
+            candidates = self.ring.candidates(key)
+        else:
+            candidates = sorted(healthy, key=lambda url: self.metrics[url]["in_flight"])
+        if not candidates:
+            # 전부 제외된 상태면 헬스 체크 결과를 무시하고 아무 서버나 시도
+            candidates = list(self.nodes)
+        if not candidates:
+            raise AIServerError(503, "사용 가능한 AI 서버가 없습니다.")
+        return candidates
+
+    @contextmanager
+    def _track(self, url: str):
+        metrics = self.metrics[url]
+        metrics["in_flight"] += 1
+        metrics["requests"] += 1
+        started = time.monotonic()
+        try:
+            yield
+        except BaseException:
+            metrics["errors"] += 1
+            raise
+        finally:
+            metrics["in_flight"] -= 1
+            metrics["total_latency"] += time.monotonic() - started
+
+    async def _call(self, key: str | None, method: str, *args, **kwargs):
+        last_error = None
+        for url in self._route(key):
+            try:
+                with self._track(url):
+                    return await getattr(self.nodes[url], method)(*args, **kwargs)
+            except httpx.ConnectError as e:
+                # 요청이 닿지 않았으니 다음 서버로 넘겨도 안전
+                self._mark_down(url, f"연결 실패: {e}")
+                last_error = e
+        raise last_error
+
+    async def get_json(self, path: str, params: dict = None) -> dict:
+        return await self._call((params or {}).get("model_path"), "get_json", path, params=params)
+
+    async def post(self, path: str, payload: dict, idempotent: bool = False) -> httpx.Response:
+        return await self._call(payload.get("model_path"), "post", path, payload, idempotent=idempotent)
+
+    @asynccontextmanager
+    async def stream(self, path: str, payload: dict):
+        last_error = None
+        async with AsyncExitStack() as stack:
+            for url in self._route(payload.get("model_path")):
+                try:
+                    response = await stack.enter_async_context(self.nodes[url].stream(path, payload))
+                except httpx.ConnectError as e:
+                    self._mark_down(url, f"연결 실패: {e}")
+                    last_error = e
+                    continue
+                with self._track(url):
+                    yield response
+                return
+        raise last_error
+
+    def report(self) -> dict:
+        share = self.ring.share()
+        nodes = {}
+        for url, m in self.metrics.items():
+            nodes[url] = {
+                "healthy": m["healthy"],
+                "in_flight": m["in_flight"],
+                "requests": m["requests"],
+                "errors": m["errors"],
+                "avg_latency_ms": round(m["total_latency"] / m["requests"] * 1000, 1) if m["requests"] else None,
+                "queue_depth": m["queue_depth"],
+                "ring_share": share.get(url, 0.0),
+                "last_checked": m["last_checked"],
+            }
+        return {"nodes": nodes, "healthy_nodes": len(self.ring.nodes()), "virtual_nodes": VIRTUAL_NODES}
+
+    async def aclose(self):
+        if self.health_task is not None:
+            self.health_task.cancel()
+        for client in self.nodes.values():
+            await client.aclose()
+
+
+ai_client = AIWorkerPool(GPT_SOVITS_URLS)
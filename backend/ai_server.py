@@ -5,8 +5,24 @@ import shutil
 import subprocess
 import traceback
 import glob
-from fastapi import FastAPI, UploadFile, File, Form, HTTPException
+import json
+import time
+import hashlib
+import io
+import re
+import wave
+import asyncio
+import threading
+import bisect
+import contextvars
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+from fastapi import FastAPI, UploadFile, File, Form, HTTPException, Request
+from fastapi.responses import Response, StreamingResponse, JSONResponse, PlainTextResponse
 from pydantic import BaseModel
+from typing import Optional
+import numpy as np
 import uvicorn
 
 # [IMPORTANT] Import original api_v2 to reuse TTS logic
@@ -18,6 +34,80 @@ from api_v2 import APP as original_app, tts_handle, tts_pipeline
 # We only want OUR /tts handler, not the original one.
 app = FastAPI()
 
+# --- Latency instrumentation ---
+# Per-stage histograms exported on /metrics (Prometheus text format), plus a Server-Timing
+# header per response. X-Request-ID from the backend is reused so both services' logs line up.
+
+STAGE_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+request_id_var = contextvars.ContextVar("request_id", default=None)
+stage_timings_var = contextvars.ContextVar("stage_timings", default=None)
+
+class Histogram:
+    def __init__(self, name: str, help_text: str, labelnames: tuple, buckets: tuple = STAGE_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.labelnames = labelnames
+        self.buckets = buckets
+        self.series = {}  # label values -> [count per bucket..., sum, count]
+        self.lock = threading.Lock()
+
+    def observe(self, labels: tuple, value: float):
+        with self.lock:
+            series = self.series.setdefault(labels, [0] * len(self.buckets) + [0.0, 0])
+            idx = bisect.bisect_left(self.buckets, value)
+            if idx < len(self.buckets):
+                series[idx] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self.lock:
+            for labels, series in sorted(self.series.items()):
+                label_text = ",".join(f'{k}="{v}"' for k, v in zip(self.labelnames, labels))
+                prefix = f"{label_text}," if label_text else ""
+                cumulative = 0
+                for bound, count in zip(self.buckets, series):
+                    cumulative += count
+                    lines.append(f'{self.name}_bucket{{{prefix}le="{bound}"}} {cumulative}')
+                lines.append(f'{self.name}_bucket{{{prefix}le="+Inf"}} {series[-1]}')
+                lines.append(f"{self.name}_sum{{{label_text}}} {series[-2]:.6f}")
+                lines.append(f"{self.name}_count{{{label_text}}} {series[-1]}")
+        return lines
+
+STAGE_SECONDS = Histogram("ai_stage_seconds", "Time spent in each stage of a synthesis request", ("stage",))
+REQUEST_SECONDS = Histogram("ai_request_seconds", "End-to-end ai_server request latency", ("method", "path", "status"))
+
+def _observe_stage(name: str, elapsed: float):
+    STAGE_SECONDS.observe((name,), elapsed)
+    timings = stage_timings_var.get()
+    if timings is not None:
+        timings[name] = timings.get(name, 0.0) + elapsed
+
+@contextmanager
+def stage(name: str):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        _observe_stage(name, time.perf_counter() - started)
+
+@app.middleware("http")
+async def correlate_and_time_requests(request: Request, call_next):
+    request_id = request.headers.get("X-Request-ID") or uuid.uuid4().hex
+    timings = {}
+    request_id_var.set(request_id)
+    stage_timings_var.set(timings)
+    started = time.perf_counter()
+    response = await call_next(request)
+    REQUEST_SECONDS.observe((request.method, request.url.path, str(response.status_code)), time.perf_counter() - started)
+    response.headers["X-Request-ID"] = request_id
+    if timings:
+        response.headers["Server-Timing"] = ", ".join(f"{k};dur={v * 1000:.1f}" for k, v in timings.items())
+        print(f"[{request_id}] {request.url.path} " + " ".join(f"{k}={v * 1000:.0f}ms" for k, v in timings.items()))
+    return response
+
 # --- Fine-tuning wrapper logic ---
 
 # # Base Model Paths (To be created by user via WebUI)
@@ -26,6 +116,620 @@ BASE_S2_PATH = "/workspace/SoVITS_weights_v2Pro/TTSMaker5_e8_s320.pth"
 # BASE_S1_PATH = "/workspace/GPT_SoVITS/pretrained_models/s1v3.ckpt"
 # BASE_S2_PATH = "/workspace/GPT_SoVITS/pretrained_models/v2Pro/s2Gv2Pro.pth"
 
+# --- Weight residency (resident LRU of checkpoints in host RAM) ---
+
+WEIGHT_CACHE_MAX_MODELS = int(os.getenv("WEIGHT_CACHE_MAX_MODELS", "4"))
+WEIGHT_CACHE_MAX_BYTES = int(os.getenv("WEIGHT_CACHE_MAX_BYTES", str(8 * 1024 ** 3)))
+
+# Pipeline attribute holding the module, and the loader that fills it.
+WEIGHT_KINDS = {
+    "t2s": {"attr": "t2s_model", "init": "init_t2s_weights", "path_field": "t2s_weights_path"},
+    "vits": {"attr": "vits_model", "init": "init_vits_weights", "path_field": "vits_weights_path"},
+}
+
+# Placeholder for "attribute did not exist yet" in a snapshot.
+_UNSET = object()
+
+def _checkpoint_identity(weights_path: str) -> tuple:
+    """Identity of the checkpoint file itself, so hardlinks to one blob share a key."""
+    st = os.stat(weights_path)
+    return (st.st_dev, st.st_ino, st.st_size, st.st_mtime)
+
+class WeightResidencyManager:
+    """
+    Tracks which GPT/SoVITS checkpoints are loaded and keeps the N most recently
+    used ones resident in host RAM, so switching voices is a host->device copy
+    instead of a disk load.
+
+    Entries are keyed by file identity (device, inode, size, mtime), so voices
+    hardlinked to the same checkpoint blob share one resident copy.
+    init_*_weights sets more than the module: version flags, configs fields and
+    helper models (v2Pro speaker verification, v3/v4 vocoder). Every pipeline
+    and configs attribute a load of that kind has ever changed is recorded and
+    put back together with the module.
+    """
+
+    def __init__(self, pipeline, max_models: int, max_bytes: int):
+        self.pipeline = pipeline
+        self.max_models = max_models
+        self.max_bytes = max_bytes
+        self.resident = OrderedDict()  # (kind, dev, ino, size, mtime) -> {"module", "state", "path", "nbytes"}
+        self.active = {kind: None for kind in WEIGHT_KINDS}
+        self.active_paths = {kind: None for kind in WEIGHT_KINDS}
+        # kind -> {(owner, name)} of attributes init_*_weights has changed so far
+        self.tracked = {kind: set() for kind in WEIGHT_KINDS}
+        self.stats = {"hits": 0, "active_hits": 0, "misses": 0, "evictions": 0}
+        self.lock = threading.RLock()
+
+    def activate(self, kind: str, weights_path: str) -> str:
+        """Make weights_path the live checkpoint for kind. Returns 'active', 'hit' or 'miss'."""
+        key = (kind, *_checkpoint_identity(weights_path))
+        with self.lock:
+            if self.active[kind] == key:
+                self.stats["active_hits"] += 1
+                self._set_path(kind, weights_path)
+                return "active"
+
+            self._park(kind)
+            entry = self.resident.get(key)
+            if entry is not None:
+                self.resident.move_to_end(key)
+                self._restore(kind, entry)
+                self.stats["hits"] += 1
+                outcome = "hit"
+            else:
+                self._load_from_disk(kind, weights_path)
+                self.resident[key] = self._snapshot(kind, weights_path)
+                self.stats["misses"] += 1
+                outcome = "miss"
+
+            self.active[kind] = key
+            self._set_path(kind, weights_path)
+            self._evict()
+            return outcome
+
+    def resident_bytes(self) -> int:
+        return sum(entry["nbytes"] for entry in self.resident.values())
+
+    def report(self) -> dict:
+        with self.lock:
+            return {
+                **self.stats,
+                "resident_models": len(self.resident),
+                "resident_bytes": self.resident_bytes(),
+                "max_models": self.max_models,
+                "max_bytes": self.max_bytes,
+                "active": dict(self.active_paths),
+            }
+
+    def _state(self) -> dict:
+        state = {("pipeline", name): value for name, value in vars(self.pipeline).items()}
+        state.update({("configs", name): value for name, value in vars(self.pipeline.configs).items()})
+        return state
+
+    def _load_from_disk(self, kind: str, weights_path: str):
+        print(f"[WeightCache] Loading {kind} weights from disk: {weights_path}")
+        before = self._state()
+        getattr(self.pipeline, WEIGHT_KINDS[kind]["init"])(weights_path)
+        after = self._state()
+        changed = {attr for attr, value in after.items() if before.get(attr, _UNSET) is not value}
+
+        # An attribute no earlier load of this kind touched still held its pre-load
+        # value for every checkpoint already resident, so record that value for them.
+        for attr in changed - self.tracked[kind]:
+            for key, entry in self.resident.items():
+                if key[0] == kind:
+                    entry["state"][attr] = before.get(attr, _UNSET)
+        self.tracked[kind] |= changed
+
+    def _snapshot(self, kind: str, weights_path: str) -> dict:
+        module = getattr(self.pipeline, WEIGHT_KINDS[kind]["attr"])
+        current = self._state()
+        nbytes = sum(t.numel() * t.element_size() for t in list(module.parameters()) + list(module.buffers()))
+        return {
+            "module": module,
+            "state": {attr: current.get(attr, _UNSET) for attr in self.tracked[kind]},
+            "path": weights_path,
+            "nbytes": nbytes,
+        }
+
+    def _restore(self, kind: str, entry: dict):
+        print(f"[WeightCache] Restoring {kind} weights from host RAM: {entry['path']}")
+        for (owner, name), value in entry["state"].items():
+            if value is _UNSET:
+                continue
+            setattr(self.pipeline if owner == "pipeline" else self.pipeline.configs, name, value)
+        module = entry["module"].to(self.pipeline.configs.device)
+        setattr(self.pipeline, WEIGHT_KINDS[kind]["attr"], module)
+
+    def _set_path(self, kind: str, weights_path: str):
+        # A shared blob may be reached through another voice's hardlink; report the path actually asked for.
+        self.active_paths[kind] = weights_path
+        setattr(self.pipeline.configs, WEIGHT_KINDS[kind]["path_field"], weights_path)
+
+    def _park(self, kind: str):
+        # Move the outgoing module back to host RAM so only one copy stays on the GPU.
+        key = self.active[kind]
+        self.active[kind] = None
+        if key in self.resident:
+            self.resident[key]["module"].to("cpu")
+
+    def _evict(self):
+        active_keys = set(self.active.values())
+        while len(self.resident) > self.max_models or self.resident_bytes() > self.max_bytes:
+            victim = next((k for k in self.resident if k not in active_keys), None)
+            if victim is None:
+                break
+            entry = self.resident.pop(victim)
+            self.stats["evictions"] += 1
+            print(f"[WeightCache] Evicted {victim[0]} weights: {entry['path']}")
+
+weight_cache = WeightResidencyManager(tts_pipeline, WEIGHT_CACHE_MAX_MODELS, WEIGHT_CACHE_MAX_BYTES)
+
+# --- Model-affinity scheduling in front of tts_handle ---
+
+TTS_MAX_WAIT_SECONDS = float(os.getenv("TTS_MAX_WAIT_SECONDS", "5"))
+
+class ModelAffinityScheduler:
+    """
+    Single-consumer queue in front of the shared tts_pipeline.
+    Pending requests are grouped by model_path and the group whose weights are
+    loaded is drained first, unless another voice's oldest request has waited
+    longer than max_wait (then that voice goes next, so nobody starves).
+    """
+
+    def __init__(self, max_wait: float):
+        self.max_wait = max_wait
+        self.groups = OrderedDict()  # model_path -> deque of (enqueued_at, job, future)
+        self.current_model = None
+        # One GPU thread: jobs are blocking and the pipeline is not re-entrant.
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="tts-gpu")
+        self.wakeup = None
+        self.worker = None
+        self.stats = {"submitted": 0, "completed": 0, "failed": 0, "swaps": 0}
+
+    async def submit(self, model_path: str, job):
+        """Queue a blocking job for model_path and wait for its result."""
+        loop = asyncio.get_running_loop()
+        if self.worker is None or self.worker.done():
+            self.wakeup = asyncio.Event()
+            self.worker = loop.create_task(self._run())
+
+        future = loop.create_future()
+        enqueued_at = time.monotonic()
+        # Run the job in a copy of the caller's context so its stage timings land on the right request.
+        context = contextvars.copy_context()
+
+        def timed_job():
+            _observe_stage("queue_wait", time.monotonic() - enqueued_at)
+            return job()
+
+        self.groups.setdefault(model_path, deque()).append((enqueued_at, lambda: context.run(timed_job), future))
+        self.stats["submitted"] += 1
+        self.wakeup.set()
+        return await future
+
+    def depth(self) -> int:
+        return sum(len(q) for q in self.groups.values())
+
+    def report(self) -> dict:
+        return {
+            **self.stats,
+            "queue_depth": self.depth(),
+            "pending_models": len(self.groups),
+            "current_model": self.current_model,
+            "requests_per_swap": round(self.stats["completed"] / max(self.stats["swaps"], 1), 2),
+        }
+
+    def _next_model(self) -> str:
+        oldest_model = min(self.groups, key=lambda m: self.groups[m][0][0])
+        oldest_wait = time.monotonic() - self.groups[oldest_model][0][0]
+        if self.current_model in self.groups and oldest_wait <= self.max_wait:
+            return self.current_model
+        return oldest_model
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            if not self.groups:
+                self.wakeup.clear()
+                await self.wakeup.wait()
+                continue
+
+            model_path = self._next_model()
+            queue = self.groups[model_path]
+            _, job, future = queue.popleft()
+            if not queue:
+                del self.groups[model_path]
+            if future.done():  # client went away while queued
+                continue
+
+            if model_path != self.current_model:
+                self.stats["swaps"] += 1
+                self.current_model = model_path
+
+            try:
+                result = await loop.run_in_executor(self.executor, job)
+            except Exception as e:
+                self.stats["failed"] += 1
+                if not future.done():
+                    future.set_exception(e)
+            else:
+                self.stats["completed"] += 1
+                if not future.done():
+                    future.set_result(result)
+
+tts_scheduler = ModelAffinityScheduler(TTS_MAX_WAIT_SECONDS)
+
+# --- Model-directory manifest cache ---
+
+MANIFEST_FILE = "manifest.json"   # written by training runs (versioned)
+PIN_FILE = "pinned.json"          # optional checkpoint pin, written by /models/pin
+
+def _write_json_atomic(path: str, data: dict):
+    # Write-then-rename so readers never see a partial file and the directory mtime changes.
+    tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+def _read_json(path: str) -> dict:
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+class ModelManifestCache:
+    """
+    Caches what tts needs to know about a model directory: checkpoint paths,
+    prompt text/lang and reference audio. A lookup costs one stat of the
+    directory; the entry is rebuilt when its mtime changes, which happens when
+    training writes a new manifest.json or a pin is set (both via rename).
+    """
+
+    def __init__(self):
+        self.entries = {}  # model_path -> (dir_mtime, manifest)
+        self.lock = threading.Lock()
+        self.stats = {"hits": 0, "refreshes": 0}
+
+    def get(self, model_root: str) -> dict:
+        dir_mtime = os.stat(model_root).st_mtime
+        with self.lock:
+            cached = self.entries.get(model_root)
+            if cached and cached[0] == dir_mtime:
+                self.stats["hits"] += 1
+                return cached[1]
+
+        manifest = self._resolve(model_root)
+        with self.lock:
+            self.entries[model_root] = (dir_mtime, manifest)
+            self.stats["refreshes"] += 1
+        return manifest
+
+    def invalidate(self, model_root: str):
+        with self.lock:
+            self.entries.pop(model_root, None)
+
+    def _resolve(self, model_root: str) -> dict:
+        print(f"[Manifest] Resolving model directory: {model_root}")
+        written = _read_json(os.path.join(model_root, MANIFEST_FILE))
+        pin = _read_json(os.path.join(model_root, PIN_FILE))
+
+        gpt_path = self._pick_checkpoint(model_root, "*.ckpt", pin.get("gpt") or written.get("gpt_path"))
+        sovits_path = self._pick_checkpoint(model_root, "*.pth", pin.get("sovits") or written.get("sovits_path"))
+
+        prompt_text = written.get("prompt_text")
+        prompt_lang = written.get("prompt_lang")
+        if prompt_text is None:
+            prompt_text, prompt_lang = self._read_name2text(model_root)
+
+        ref_audio_path = written.get("ref_audio_path") or os.path.join(model_root, "1_input.wav")
+        if not os.path.exists(ref_audio_path):
+            print(f"[ERROR] Reference audio not found at {ref_audio_path}")
+
+        checkpoints = {
+            "gpt_path": gpt_path,
+            "gpt_mtime": os.path.getmtime(gpt_path) if gpt_path else None,
+            "sovits_path": sovits_path,
+            "sovits_mtime": os.path.getmtime(sovits_path) if sovits_path else None,
+        }
+        return {
+            **checkpoints,
+            "version": self._version(written, checkpoints),
+            "pinned": bool(pin),
+            "prompt_text": prompt_text,
+            "prompt_lang": prompt_lang,
+            "ref_audio_path": ref_audio_path,
+        }
+
+    @staticmethod
+    def _pick_checkpoint(model_root: str, pattern: str, preferred: str = None):
+        if preferred:
+            path = preferred if os.path.isabs(preferred) else os.path.join(model_root, preferred)
+            if os.path.exists(path):
+                return path
+            print(f"[Manifest] Pinned/declared checkpoint missing, falling back to newest: {path}")
+        candidates = glob.glob(os.path.join(model_root, pattern))
+        # Pick the newest one
+        return max(candidates, key=os.path.getmtime) if candidates else None
+
+    @staticmethod
+    def _read_name2text(model_root: str):
+        name2text_path = os.path.join(model_root, "2-name2text.txt")
+        if not os.path.exists(name2text_path):
+            print(f"[ERROR] 2-name2text.txt not found at {name2text_path}")
+            return "", None
+        with open(name2text_path, "r", encoding="utf-8") as f:
+            # format: filename|text|speaker|lang
+            parts = f.readline().strip().split("|")
+        prompt_text = parts[1] if len(parts) >= 2 else ""
+        prompt_lang = parts[3] if len(parts) >= 4 else None
+        return prompt_text, prompt_lang
+
+    @staticmethod
+    def _version(written: dict, checkpoints: dict) -> str:
+        # A pinned/overridden checkpoint must not share a version with the training run's default.
+        digest = hashlib.sha1(json.dumps(checkpoints, sort_keys=True).encode()).hexdigest()[:12]
+        if "version" in written:
+            return f"v{written['version']}-{digest}"
+        return digest
+
+manifest_cache = ModelManifestCache()
+
+# --- Content-addressed checkpoint store ---
+
+# Lives inside the logs volume so model directories can hardlink into it.
+CHECKPOINT_STORE_DIR = os.getenv("CHECKPOINT_STORE_DIR", "/workspace/logs/.blobs")
+
+def _materialize(blob: str, dest: str):
+    # Hardlink if possible, else reflink (cp falls back to a plain copy on its own).
+    try:
+        os.link(blob, dest)
+    except OSError:
+        subprocess.run(["cp", "--reflink=auto", blob, dest], check=True)
+
+class CheckpointStore:
+    """
+    Stores checkpoint bytes once under their sha256 and lets model directories
+    reference them instead of holding copies. A referenced checkpoint is the
+    blob itself (a hardlink), so it must never be opened for writing: link()
+    replaces dest with write-then-rename, and training writes each run's
+    outputs to new paths. refs.json records which paths use each blob; gc()
+    drops blobs nobody references.
+    """
+
+    def __init__(self, root: str):
+        self.root = root
+        self.refs_path = os.path.join(root, "refs.json")
+        self.digests = {}  # source path -> (size, mtime, sha256); base models are hashed once
+        self.lock = threading.Lock()
+
+    def link(self, src: str, dest: str) -> str:
+        """Makes dest a reference to the blob holding src's bytes. Returns the blob path."""
+        with self.lock:
+            os.makedirs(self.root, exist_ok=True)
+            blob = self._put(src)
+            # rename() is a no-op between two links of one inode, so skip dests already on the blob.
+            if not (os.path.exists(dest) and os.path.samefile(blob, dest)):
+                tmp_path = f"{dest}.{uuid.uuid4().hex}.tmp"
+                _materialize(blob, tmp_path)
+                os.replace(tmp_path, dest)
+
+            refs = self._load_refs()
+            self._drop_ref(refs, dest)
+            refs.setdefault(os.path.basename(blob), []).append(dest)
+            _write_json_atomic(self.refs_path, refs)
+            return blob
+
+    def release(self, dest: str):
+        with self.lock:
+            refs = self._load_refs()
+            self._drop_ref(refs, dest)
+            _write_json_atomic(self.refs_path, refs)
+
+    def gc(self) -> dict:
+        """Forgets references whose path is gone and deletes unreferenced blobs."""
+        with self.lock:
+            refs = self._load_refs()
+            for name in list(refs):
+                refs[name] = [path for path in refs[name] if os.path.exists(path)]
+                if not refs[name]:
+                    del refs[name]
+
+            removed, freed = 0, 0
+            for name in os.listdir(self.root) if os.path.isdir(self.root) else []:
+                if name == "refs.json" or name.endswith(".tmp") or name in refs:
+                    continue
+                path = os.path.join(self.root, name)
+                freed += os.path.getsize(path)
+                os.remove(path)
+                removed += 1
+            _write_json_atomic(self.refs_path, refs)
+            return {"removed_blobs": removed, "freed_bytes": freed}
+
+    def report(self) -> dict:
+        with self.lock:
+            refs = self._load_refs()
+            stored, referenced = 0, 0
+            for name, paths in refs.items():
+                path = os.path.join(self.root, name)
+                if os.path.exists(path):
+                    size = os.path.getsize(path)
+                    stored += size
+                    referenced += size * len(paths)
+            return {
+                "blobs": len(refs),
+                "references": sum(len(paths) for paths in refs.values()),
+                "stored_bytes": stored,
+                "saved_bytes": referenced - stored,
+            }
+
+    def _put(self, src: str) -> str:
+        digest = self._digest(src)
+        blob = os.path.join(self.root, f"{digest}{os.path.splitext(src)[1]}")
+        if not os.path.exists(blob):
+            print(f"[CheckpointStore] Storing new blob {digest[:12]} from {src}")
+            tmp_path = f"{blob}.{uuid.uuid4().hex}.tmp"
+            shutil.copyfile(src, tmp_path)
+            # Only a hint: root (the training container) can still write through it.
+            os.chmod(tmp_path, 0o444)
+            os.replace(tmp_path, blob)
+        return blob
+
+    def _digest(self, path: str) -> str:
+        st = os.stat(path)
+        cached = self.digests.get(path)
+        if cached and cached[:2] == (st.st_size, st.st_mtime):
+            return cached[2]
+        h = hashlib.sha256()
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                h.update(block)
+        self.digests[path] = (st.st_size, st.st_mtime, h.hexdigest())
+        return self.digests[path][2]
+
+    def _load_refs(self) -> dict:
+        return _read_json(self.refs_path)
+
+    @staticmethod
+    def _drop_ref(refs: dict, dest: str):
+        for name in list(refs):
+            if dest in refs[name]:
+                refs[name].remove(dest)
+
+checkpoint_store = CheckpointStore(CHECKPOINT_STORE_DIR)
+
+def _prune_checkpoints(model_root: str, prefix: str, keep_from: int):
+    """
+    Removes training outputs ({prefix}*_v{N}.*) of runs older than keep_from,
+    except pinned ones. The run before the newest is kept so loads that
+    resolved the previous manifest can still open its files.
+    """
+    pin = _read_json(os.path.join(model_root, PIN_FILE))
+    pinned = {os.path.join(model_root, path) for path in pin.values() if path}
+    for path in glob.glob(os.path.join(model_root, f"{glob.escape(prefix)}*_v*")):
+        match = re.search(r"_v(\d+)\.\w+$", path)
+        if not match or int(match.group(1)) >= keep_from or path in pinned:
+            continue
+        checkpoint_store.release(path)
+        os.remove(path)
+
+# --- Sentence-level segment cache ---
+
+SENTENCE_CACHE_ENABLED = os.getenv("SENTENCE_CACHE_ENABLED", "true").lower() == "true"
+SENTENCE_CACHE_MAX_BYTES = int(os.getenv("SENTENCE_CACHE_MAX_BYTES", str(512 * 1024 ** 2)))
+SENTENCE_CROSSFADE_MS = int(os.getenv("SENTENCE_CROSSFADE_MS", "15"))
+
+# Sentence ends: the terminal punctuation cut5 also splits on, plus newlines.
+# A period only ends a sentence when it is not between two digits ("3.5"), like cut5.
+_SENTENCE_END = re.compile(r"(?<=[!?。！？…])\s*|(?<=\.)(?!(?<=\d\.)\d)\s*|\n+")
+_HAS_WORD = re.compile(r"\w")
+
+def _split_sentences(text: str) -> list:
+    """
+    Splits text into sentences, normalizing whitespace. Pieces without any
+    word characters (stray punctuation) are folded into the previous sentence.
+    """
+    sentences = []
+    for piece in _SENTENCE_END.split(text):
+        piece = " ".join(piece.split())
+        if not piece:
+            continue
+        if sentences and not _HAS_WORD.search(piece):
+            sentences[-1] += piece
+        else:
+            sentences.append(piece)
+    return sentences
+
+class SentenceSegmentCache:
+    """
+    LRU of synthesized sentence audio (raw PCM) per voice and checkpoint, bounded
+    by bytes. Each entry remembers how long it took to synthesize, so a hit
+    reports the GPU seconds it saved.
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()  # key -> {"pcm", "params", "gpu_seconds"}
+        self.nbytes = 0
+        self.stats = {
+            "requests": 0, "full_hits": 0, "sentences": 0, "sentence_hits": 0,
+            "evictions": 0, "gpu_seconds_spent": 0.0, "gpu_seconds_saved": 0.0,
+        }
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def key(manifest: dict, req, sentence: str) -> tuple:
+        # Checkpoint mtimes are part of the key, so retraining or re-pinning invalidates.
+        # Every other tts_handle argument (prompt, languages, sampling) comes from _tts_params,
+        # the same dict the synthesis call is built from, so no parameter can be left out.
+        return (
+            manifest["gpt_path"], manifest["gpt_mtime"], manifest["sovits_path"], manifest["sovits_mtime"],
+            tuple(sorted(_tts_params(req, manifest).items())), sentence,
+        )
+
+    def get(self, key: tuple) -> Optional[dict]:
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                self.entries.move_to_end(key)
+            return entry
+
+    def put(self, key: tuple, pcm: bytes, params: tuple, gpu_seconds: float):
+        with self.lock:
+            old = self.entries.pop(key, None)
+            if old is not None:
+                self.nbytes -= len(old["pcm"])
+            self.entries[key] = {"pcm": pcm, "params": params, "gpu_seconds": gpu_seconds}
+            self.nbytes += len(pcm)
+            while self.nbytes > self.max_bytes and len(self.entries) > 1:
+                _, victim = self.entries.popitem(last=False)
+                self.nbytes -= len(victim["pcm"])
+                self.stats["evictions"] += 1
+
+    def record(self, sentences: int, hits: int, spent: float, saved: float):
+        with self.lock:
+            self.stats["requests"] += 1
+            self.stats["full_hits"] += int(hits == sentences)
+            self.stats["sentences"] += sentences
+            self.stats["sentence_hits"] += hits
+            self.stats["gpu_seconds_spent"] += spent
+            self.stats["gpu_seconds_saved"] += saved
+
+    def report(self) -> dict:
+        with self.lock:
+            stats = dict(self.stats)
+            stats["gpu_seconds_spent"] = round(stats["gpu_seconds_spent"], 3)
+            stats["gpu_seconds_saved"] = round(stats["gpu_seconds_saved"], 3)
+            return {
+                **stats,
+                "sentence_hit_rate": round(stats["sentence_hits"] / max(stats["sentences"], 1), 4),
+                "entries": len(self.entries),
+                "resident_bytes": self.nbytes,
+                "max_bytes": self.max_bytes,
+                "crossfade_ms": SENTENCE_CROSSFADE_MS,
+            }
+
+sentence_cache = SentenceSegmentCache(SENTENCE_CACHE_MAX_BYTES)
+
+def _crossfade_concat(segments: list, sample_rate: int, channels: int) -> bytes:
+    """
+    Joins int16 PCM segments, overlapping each boundary with a short linear crossfade.
+    """
+    fade = int(sample_rate * SENTENCE_CROSSFADE_MS / 1000)
+    out = np.frombuffer(segments[0], dtype=np.int16).reshape(-1, channels).astype(np.float32)
+    for pcm in segments[1:]:
+        nxt = np.frombuffer(pcm, dtype=np.int16).reshape(-1, channels).astype(np.float32)
+        n = min(fade, len(out), len(nxt))
+        if n:
+            ramp = np.linspace(0.0, 1.0, n, dtype=np.float32)[:, None]
+            blended = out[-n:] * (1.0 - ramp) + nxt[:n] * ramp
+            out = np.concatenate([out[:-n], blended, nxt[n:]])
+        else:
+            out = np.concatenate([out, nxt])
+    return np.clip(out, -32768, 32767).astype(np.int16).tobytes()
+
 class TrainRequest(BaseModel):
     user_id: str
     model_name: str
@@ -40,6 +744,14 @@ class TTSRequestWithModel(BaseModel):
     prompt_lang: str = "ko"
     text_split_method: str = "cut5"
     speed_factor: float = 1.0
+    # Sampling (api_v2 defaults)
+    top_k: int = 5
+    top_p: float = 1.0
+    temperature: float = 1.0
+    repetition_penalty: float = 1.35
+    streaming_mode: bool = False
+    # Write the WAV into HANDOFF_DIR and answer with its path instead of the bytes
+    handoff: bool = False
 
 @app.post("/train_model")
 async def train_model_wrapper(req: TrainRequest):
@@ -59,24 +771,51 @@ async def train_model_wrapper(req: TrainRequest):
              raise HTTPException(status_code=400, detail=f"Audio file not found at {source_audio}")
 
         # 2. Preprocessing & Formatting
+        # The voice's reference audio must live in the model directory: /shared is a
+        # scratch mount the backend cleans up. Hardlink when the upload is on the same
+        # filesystem (no copy), otherwise (EXDEV, the usual compose layout) copy it as before.
         target_wav_name = "1_input.wav"
         target_wav_path = os.path.join(dataset_root, target_wav_name)
-        shutil.copy(source_audio, target_wav_path)
+        if os.path.lexists(target_wav_path):
+            os.remove(target_wav_path)
+        try:
+            os.link(source_audio, target_wav_path)
+        except OSError:
+            shutil.copy(source_audio, target_wav_path)
         
         with open(os.path.join(dataset_root, "2-name2text.txt"), "w", encoding="utf-8") as f:
             f.write(f"{target_wav_name}|{req.ref_text}|{req.user_id}|ko\n")
 
         # 3. Training Execution (Mocked for now)
         # In a real scenario, correct commands would be here.
-        # For connection testing, we SIMULATE training by copying base models to the output dir.
-        
-        dummy_s1 = os.path.join(dataset_root, f"mock_s1_{safe_model_name}.ckpt")
-        dummy_s2 = os.path.join(dataset_root, f"mock_s2_{safe_model_name}.pth")
+        # For connection testing, we SIMULATE training by inheriting the base models unchanged.
+        # They are referenced from the checkpoint store, so this is O(1) disk work per voice.
+        # Every run gets new output paths (_v{version}): an existing checkpoint may be a
+        # hardlink to a blob other voices share, so it is never opened for writing.
+        # A real trainer should write to these new paths too and checkpoint_store.link() them.
+        manifest_path = os.path.join(dataset_root, MANIFEST_FILE)
+        previous = _read_json(manifest_path)
+        version = previous.get("version", 0) + 1
+
+        dummy_s1 = os.path.join(dataset_root, f"mock_s1_{safe_model_name}_v{version}.ckpt")
+        dummy_s2 = os.path.join(dataset_root, f"mock_s2_{safe_model_name}_v{version}.pth")
         
         if os.path.exists(BASE_S1_PATH):
-            shutil.copy(BASE_S1_PATH, dummy_s1)
+            checkpoint_store.link(BASE_S1_PATH, dummy_s1)
         if os.path.exists(BASE_S2_PATH):
-            shutil.copy(BASE_S2_PATH, dummy_s2)
+            checkpoint_store.link(BASE_S2_PATH, dummy_s2)
+
+        # 4. Versioned manifest (lets /tts skip globbing and prompt parsing)
+        _write_json_atomic(manifest_path, {
+            "version": version,
+            "gpt_path": dummy_s1 if os.path.exists(dummy_s1) else None,
+            "sovits_path": dummy_s2 if os.path.exists(dummy_s2) else None,
+            "prompt_text": req.ref_text,
+            "prompt_lang": "ko",
+            "ref_audio_path": target_wav_path,
+        })
+        manifest_cache.invalidate(dataset_root)
+        _prune_checkpoints(dataset_root, "mock_s", version - 1)
 
         return {"model_path": dataset_root}
         
@@ -88,6 +827,7 @@ async def train_model_wrapper(req: TrainRequest):
 async def tts_wrapper(req: TTSRequestWithModel):
     """
     Custom TTS endpoint that loads weights from model_path before inference.
+    Requests go through the model-affinity scheduler so same-voice requests share one weight load.
     """
     try:
         model_root = req.model_path
@@ -96,63 +836,424 @@ async def tts_wrapper(req: TTSRequestWithModel):
         if not os.path.exists(model_root):
             raise HTTPException(status_code=404, detail="Model path not found")
 
-        # 1. Load Weights from model_path
-        # Look for .ckpt and .pth files
-        gpt_models = glob.glob(os.path.join(model_root, "*.ckpt"))
-        sovits_models = glob.glob(os.path.join(model_root, "*.pth"))
+        if req.streaming_mode:
+            return await _stream_response(req)
 
-        if gpt_models:
-            # Pick the newest one
-            gpt_model = max(gpt_models, key=os.path.getmtime)
-            print(f"Loading GPT weights: {gpt_model}")
-            tts_pipeline.init_t2s_weights(gpt_model)
-        
-        if sovits_models:
-            sovits_model = max(sovits_models, key=os.path.getmtime)
-            print(f"Loading SoVITS weights: {sovits_model}")
-            tts_pipeline.init_vits_weights(sovits_model)
+        if req.handoff:
+            return await tts_scheduler.submit(model_root, lambda: _handoff(_synthesize(req)))
 
-        # 2. Resolve Reference Audio & Text
-        ref_audio_path = os.path.join(model_root, "1_input.wav")
-        prompt_text = ""
-
-        # Read prompt text from 2-name2text.txt if exists
-        name2text_path = os.path.join(model_root, "2-name2text.txt")
-        if not os.path.exists(name2text_path):
-            print(f"[ERROR] 2-name2text.txt not found at {name2text_path}")
-        else:
-            with open(name2text_path, "r", encoding="utf-8") as f:
-                # format: filename|text|speaker|lang
-                line = f.readline().strip()
-                print(f"[DEBUG] Read line from 2-name2text.txt: {line}")
-                parts = line.split("|")
-                if len(parts) >= 2:
-                    prompt_text = parts[1]
-        
-        print(f"[DEBUG] Using ref_audio: {ref_audio_path}, prompt_text: {prompt_text}")
-
-        # 3. Construct Request for api_v2
-        api_req = {
-            "text": req.text,
-            "text_lang": req.text_lang,
-            "ref_audio_path": ref_audio_path,
-            "prompt_text": prompt_text,
-            "prompt_lang": req.prompt_lang,
-            "text_split_method": req.text_split_method,
-            "speed_factor": req.speed_factor,
-            # Add defaults for others
-            "streaming_mode": False,
-            "media_type": "wav"
-        }
-        
-        print(f"[DEBUG] Calling tts_handle with req: {api_req}")
-        return await tts_handle(api_req)
+        return await tts_scheduler.submit(model_root, lambda: _synthesize(req))
 
     except Exception as e:
         print("!!! EXCEPTION IN TTS WRAPPER !!!")
         traceback.print_exc()
         raise HTTPException(status_code=500, detail=str(e))
 
+def _synthesize(req: TTSRequestWithModel):
+    """
+    Loads the voice's weights and runs tts_handle. Called on the scheduler's GPU thread.
+    Non-streaming requests go through the sentence cache and only synthesize missing sentences.
+    """
+    # 1. Resolve checkpoints and prompt from the cached manifest
+    with stage("manifest"):
+        manifest = manifest_cache.get(req.model_path)
+    if SENTENCE_CACHE_ENABLED and not req.streaming_mode:
+        return _synthesize_by_sentence(req, manifest)
+    return _run_tts_handle(req, manifest, req.text)
+
+def _tts_params(req: TTSRequestWithModel, manifest: dict) -> dict:
+    """tts_handle arguments that shape the audio (everything but the text and output options)."""
+    return {
+        "text_lang": req.text_lang,
+        "ref_audio_path": manifest["ref_audio_path"],
+        "prompt_text": manifest["prompt_text"],
+        "prompt_lang": manifest["prompt_lang"] or req.prompt_lang,
+        "text_split_method": req.text_split_method,
+        "speed_factor": req.speed_factor,
+        "top_k": req.top_k,
+        "top_p": req.top_p,
+        "temperature": req.temperature,
+        "repetition_penalty": req.repetition_penalty,
+    }
+
+def _run_tts_handle(req: TTSRequestWithModel, manifest: dict, text: str):
+    """
+    Activates the manifest's weights and runs tts_handle on text.
+    """
+    # 2. Load Weights (no-op when already active)
+    if manifest["gpt_path"]:
+        print(f"Using GPT weights: {manifest['gpt_path']}")
+        with stage("t2s_load"):
+            weight_cache.activate("t2s", manifest["gpt_path"])
+
+    if manifest["sovits_path"]:
+        print(f"Using SoVITS weights: {manifest['sovits_path']}")
+        with stage("vits_load"):
+            weight_cache.activate("vits", manifest["sovits_path"])
+
+    ref_audio_path = manifest["ref_audio_path"]
+    prompt_text = manifest["prompt_text"]
+    print(f"[DEBUG] Using ref_audio: {ref_audio_path}, prompt_text: {prompt_text}")
+
+    # Load the reference prompt up front (tts_handle would otherwise do it inside inference)
+    # so its cost shows up as its own stage. No-op when the pipeline already has it cached.
+    prompt_cache = getattr(tts_pipeline, "prompt_cache", None)
+    if ref_audio_path and prompt_cache is not None and prompt_cache.get("ref_audio_path") != ref_audio_path:
+        with stage("prompt_read"):
+            tts_pipeline.set_ref_audio(ref_audio_path)
+
+    # 3. Construct Request for api_v2
+    api_req = {
+        "text": text,
+        **_tts_params(req, manifest),
+        "streaming_mode": req.streaming_mode,
+        "media_type": "wav"
+    }
+    
+    print(f"[DEBUG] Calling tts_handle with req: {api_req}")
+    # tts_handle is a coroutine but does its work synchronously; run it on this thread's own loop.
+    with stage("inference"):
+        return asyncio.run(tts_handle(api_req))
+
+def _synthesize_by_sentence(req: TTSRequestWithModel, manifest: dict):
+    """
+    Serves cached sentences from sentence_cache, synthesizes the rest one sentence
+    at a time and stitches the PCM with short crossfades into a single WAV.
+    """
+    sentences = _split_sentences(req.text)
+    if not sentences:
+        return _run_tts_handle(req, manifest, req.text)
+
+    segments = []
+    hits = 0
+    spent = saved = 0.0
+    for sentence in sentences:
+        key = SentenceSegmentCache.key(manifest, req, sentence)
+        entry = sentence_cache.get(key)
+        if entry is not None:
+            hits += 1
+            saved += entry["gpu_seconds"]
+        else:
+            started = time.perf_counter()
+            response = _run_tts_handle(req, manifest, sentence)
+            if response.status_code != 200:
+                return response
+            elapsed = time.perf_counter() - started
+            spent += elapsed
+            with wave.open(io.BytesIO(response.body)) as w:
+                params = (w.getframerate(), w.getnchannels(), w.getsampwidth())
+                pcm = w.readframes(w.getnframes())
+            entry = {"pcm": pcm, "params": params, "gpu_seconds": elapsed}
+            sentence_cache.put(key, pcm, params, elapsed)
+        segments.append(entry)
+
+    sentence_cache.record(len(sentences), hits, spent, saved)
+    print(f"[SentenceCache] {hits}/{len(sentences)} sentences cached, saved {saved:.2f}s GPU")
+
+    sample_rate, channels, sampwidth = segments[0]["params"]
+    if sampwidth != 2 or any(seg["params"] != segments[0]["params"] for seg in segments):
+        # Not int16 or mismatched formats: cannot stitch safely, synthesize the whole text.
+        return _run_tts_handle(req, manifest, req.text)
+
+    buffer = io.BytesIO()
+    with stage("stitch"), wave.open(buffer, "wb") as w:
+        w.setnchannels(channels)
+        w.setsampwidth(sampwidth)
+        w.setframerate(sample_rate)
+        w.writeframes(_crossfade_concat([seg["pcm"] for seg in segments], sample_rate, channels))
+    return Response(
+        content=buffer.getvalue(),
+        media_type="audio/wav",
+        headers={
+            "X-Sentence-Cache-Hits": str(hits),
+            "X-Sentence-Cache-Total": str(len(sentences)),
+            "X-GPU-Seconds-Saved": f"{saved:.3f}",
+        },
+    )
+
+# --- Shared-volume handoff ---
+
+# Must be visible to the backend (see HANDOFF_DIR in docker-compose.yml).
+HANDOFF_DIR = os.getenv("HANDOFF_DIR", "/shared/handoff")
+HANDOFF_MAX_AGE = 3600          # unclaimed files older than this are swept
+HANDOFF_SWEEP_INTERVAL = 300
+_last_handoff_sweep = 0.0
+
+def _handoff(response):
+    """
+    Writes tts_handle's WAV into HANDOFF_DIR (temp file + atomic rename) and
+    returns only its name, size and duration, so the backend never holds the audio in memory.
+    """
+    if response.status_code != 200:
+        return response
+
+    os.makedirs(HANDOFF_DIR, exist_ok=True)
+    _sweep_handoff_dir()
+
+    audio = response.body
+    filename = f"tts_{uuid.uuid4().hex}.wav"
+    path = os.path.join(HANDOFF_DIR, filename)
+    tmp_path = f"{path}.tmp"
+    with stage("handoff_write"):
+        with open(tmp_path, "wb") as f:
+            f.write(audio)
+        os.replace(tmp_path, path)
+
+    with wave.open(io.BytesIO(audio)) as w:
+        duration = w.getnframes() / float(w.getframerate())
+    return JSONResponse({"filename": filename, "path": path, "size": len(audio), "duration": round(duration, 3)})
+
+def _sweep_handoff_dir():
+    # Files the backend never claimed (e.g. it crashed mid-request).
+    global _last_handoff_sweep
+    now = time.time()
+    if now - _last_handoff_sweep < HANDOFF_SWEEP_INTERVAL:
+        return
+    _last_handoff_sweep = now
+    for name in os.listdir(HANDOFF_DIR):
+        path = os.path.join(HANDOFF_DIR, name)
+        try:
+            if now - os.path.getmtime(path) > HANDOFF_MAX_AGE:
+                os.remove(path)
+        except FileNotFoundError:
+            pass
+
+async def _stream_response(req: TTSRequestWithModel):
+    """
+    Queues a streaming synthesis and relays its chunks as a chunked HTTP response.
+    Waits for the first chunk so that failures before any audio still surface as errors.
+    """
+    loop = asyncio.get_running_loop()
+    chunks = asyncio.Queue()
+    stop = threading.Event()
+
+    def push(item):
+        loop.call_soon_threadsafe(chunks.put_nowait, item)
+
+    job = asyncio.ensure_future(
+        tts_scheduler.submit(req.model_path, lambda: _stream_synthesis(req, push, stop))
+    )
+
+    first = await chunks.get()
+    if isinstance(first, Exception):
+        await asyncio.gather(job, return_exceptions=True)
+        raise first
+
+    async def relay():
+        item = first
+        try:
+            while item is not None:
+                if isinstance(item, Exception):
+                    print(f"[Stream] synthesis failed mid-stream: {item}")
+                    break
+                yield item
+                item = await chunks.get()
+        finally:
+            # Client disconnected or stream finished; let the GPU thread stop early.
+            stop.set()
+            await asyncio.gather(job, return_exceptions=True)
+
+    return StreamingResponse(relay(), media_type="audio/wav")
+
+def _stream_synthesis(req: TTSRequestWithModel, push, stop: threading.Event):
+    """
+    Drives api_v2's streaming generator on the scheduler's GPU thread, pushing
+    each chunk to the request's queue. None marks the end, an exception an error.
+    """
+    try:
+        response = _synthesize(req)
+        if not isinstance(response, StreamingResponse):
+            raise Exception(f"tts_handle failed: {response.body.decode('utf-8', errors='replace')}")
+
+        async def drain():
+            async for chunk in response.body_iterator:
+                if stop.is_set():
+                    break
+                push(chunk)
+
+        asyncio.run(drain())
+        push(None)
+    except Exception as e:
+        push(e)
+        raise
+
+# --- Popularity-driven warmup ---
+
+WARMUP_FILE = os.getenv("WARMUP_FILE", "/workspace/logs/warmup.json")  # last pushed ranking, replayed on startup
+WARMUP_MAX_MODELS = int(os.getenv("WARMUP_MAX_MODELS", str(WEIGHT_CACHE_MAX_MODELS)))
+WARMUP_TEXT = os.getenv("WARMUP_TEXT", "안녕하세요.")
+
+class WarmupRequest(BaseModel):
+    # Most popular first (e.g. ordered by VoiceModel.usage_count)
+    model_paths: list
+
+class ModelWarmup:
+    """
+    Preloads the most popular voices into the resident weight cache and runs a
+    short dummy synthesis for each, so the first real requests after a restart are warm.
+    Runs through tts_scheduler, so it never races live requests for the GPU.
+    """
+
+    def __init__(self, max_models: int):
+        self.max_models = max_models
+        self.task = None
+        self.state = {"status": "idle", "requested": [], "warmed": [], "failed": {}, "started_at": None, "finished_at": None}
+
+    def start(self, model_paths: list):
+        ranked = [p for p in dict.fromkeys(model_paths) if p and os.path.exists(p)][:self.max_models]
+        if self.task is not None and not self.task.done():
+            self.task.cancel()
+        self.state = {
+            "status": "running", "requested": ranked, "warmed": [], "failed": {},
+            "started_at": time.time(), "finished_at": None,
+        }
+        self.task = asyncio.ensure_future(self._run(ranked))
+        return self.report()
+
+    def ready(self) -> bool:
+        return self.state["status"] != "running"
+
+    def report(self) -> dict:
+        return {**self.state, "ready": self.ready()}
+
+    async def _run(self, ranked: list):
+        # Least popular first, so the most popular voice ends up most recently used in the LRU.
+        for model_path in reversed(ranked):
+            started = time.perf_counter()
+            try:
+                await tts_scheduler.submit(model_path, lambda p=model_path: self._warm(p))
+            except Exception as e:
+                self.state["failed"][model_path] = str(e)
+                print(f"[Warmup] Failed for {model_path}: {e}")
+                continue
+            self.state["warmed"].append(model_path)
+            print(f"[Warmup] {model_path} ready in {time.perf_counter() - started:.2f}s")
+        self.state["status"] = "ready"
+        self.state["finished_at"] = time.time()
+
+    @staticmethod
+    def _warm(model_path: str):
+        manifest = manifest_cache.get(model_path)
+        # Pull the reference prompt into the page cache, then synthesize once to
+        # load both checkpoints and prime the pipeline's prompt features.
+        if manifest["ref_audio_path"] and os.path.exists(manifest["ref_audio_path"]):
+            with open(manifest["ref_audio_path"], "rb") as f:
+                f.read()
+        req = TTSRequestWithModel(text=WARMUP_TEXT, text_lang=manifest["prompt_lang"] or "ko", model_path=model_path)
+        response = _run_tts_handle(req, manifest, WARMUP_TEXT)
+        if response.status_code != 200:
+            raise Exception(f"dummy synthesis failed: {response.body.decode('utf-8', errors='replace')}")
+
+model_warmup = ModelWarmup(WARMUP_MAX_MODELS)
+
+@app.on_event("startup")
+async def replay_last_warmup():
+    # Warm the ranking the backend pushed last time, so a restarted ai_server is warm without waiting for it.
+    saved = _read_json(WARMUP_FILE)
+    if saved.get("model_paths"):
+        model_warmup.start(saved["model_paths"])
+
+@app.post("/warmup")
+async def start_warmup(req: WarmupRequest):
+    """
+    Starts warming a ranked list of model paths (replaces any warmup in progress).
+    """
+    os.makedirs(os.path.dirname(WARMUP_FILE), exist_ok=True)
+    _write_json_atomic(WARMUP_FILE, {"model_paths": req.model_paths})
+    return model_warmup.start(req.model_paths)
+
+@app.get("/ready")
+async def readiness():
+    """
+    503 while a warmup is running, 200 once it has finished (or none was requested).
+    """
+    report = model_warmup.report()
+    return JSONResponse(report, status_code=200 if report["ready"] else 503)
+
+class PinRequest(BaseModel):
+    model_path: str
+    # Checkpoint file names (or absolute paths) inside model_path; None keeps "newest"
+    gpt: Optional[str] = None
+    sovits: Optional[str] = None
+
+@app.get("/models/manifest")
+async def get_model_manifest(model_path: str):
+    """
+    Resolved checkpoint paths, version and prompt of a model directory.
+    """
+    if not os.path.exists(model_path):
+        raise HTTPException(status_code=404, detail="Model path not found")
+    return manifest_cache.get(model_path)
+
+@app.post("/models/pin")
+async def pin_model_checkpoint(req: PinRequest):
+    """
+    Pins a specific checkpoint instead of always choosing the newest mtime.
+    """
+    if not os.path.exists(req.model_path):
+        raise HTTPException(status_code=404, detail="Model path not found")
+    for name in (req.gpt, req.sovits):
+        if name and not os.path.exists(os.path.join(req.model_path, name)):
+            raise HTTPException(status_code=400, detail=f"Checkpoint not found: {name}")
+
+    pin_path = os.path.join(req.model_path, PIN_FILE)
+    if req.gpt or req.sovits:
+        _write_json_atomic(pin_path, {"gpt": req.gpt, "sovits": req.sovits})
+    elif os.path.exists(pin_path):
+        os.remove(pin_path)
+    manifest_cache.invalidate(req.model_path)
+    return manifest_cache.get(req.model_path)
+
+@app.get("/checkpoints/stats")
+async def checkpoint_store_stats():
+    """
+    Blob / reference counts of the checkpoint store and the bytes deduplication saves.
+    """
+    return checkpoint_store.report()
+
+@app.post("/checkpoints/gc")
+async def checkpoint_store_gc():
+    """
+    Removes checkpoint blobs that no model directory references anymore.
+    """
+    return checkpoint_store.gc()
+
+@app.get("/weights/stats")
+async def weight_cache_stats():
+    """
+    Hit / miss / eviction counters of the resident weight cache.
+    """
+    return weight_cache.report()
+
+@app.get("/tts/segments/stats")
+async def sentence_cache_stats():
+    """
+    Sentence cache reuse and the GPU seconds it saved.
+    """
+    return sentence_cache.report()
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def prometheus_metrics():
+    """
+    Stage / request latency histograms and cache and queue gauges in Prometheus text format.
+    """
+    gauges = {
+        "ai_tts_queue_depth": tts_scheduler.depth(),
+        "ai_weight_cache_resident_bytes": weight_cache.resident_bytes(),
+        "ai_sentence_cache_resident_bytes": sentence_cache.nbytes,
+    }
+    lines = STAGE_SECONDS.render() + REQUEST_SECONDS.render()
+    for name, value in gauges.items():
+        lines += [f"# TYPE {name} gauge", f"{name} {value}"]
+    return "\n".join(lines) + "\n"
+
+@app.get("/tts/queue")
+async def tts_queue_stats():
+    """
+    Scheduler queue depth and achieved requests per weight swap.
+    """
+    return tts_scheduler.report()
+
 
 if __name__ == "__main__":
     uvicorn.run(app, host="0.0.0.0", port=9880)
@@ -0,0 +1,99 @@
+import io
+import os
+import sys
+import time
+import wave
+import asyncio
+from fastapi import FastAPI
+from fastapi.responses import Response, JSONResponse
+from pydantic import BaseModel
+import uvicorn
+
+# 로컬 개발/부하 테스트용 가짜 AI 서버 (GPU, GPT-SoVITS 없이 실행)
+# ai_server.py와 같은 경로를 흉내 내고, /tts는 글자 수에 비례한 무음 WAV를 돌려줍니다.
+# 여러 대 띄워서 백엔드의 AI 서버 풀(일관 해싱, 헬스 체크, 장애 전환)을 확인할 때 사용:
+#   python ai_stub_server.py 9881 & python ai_stub_server.py 9882 &
+#   GPT_SOVITS_URLS=http://localhost:9881,http://localhost:9882 uvicorn main:app
+
+STUB_SECONDS_PER_CHAR = float(os.getenv("STUB_SECONDS_PER_CHAR", "0.01"))  # 가짜 합성 시간
+STUB_SAMPLE_RATE = 32000
+
+app = FastAPI()
+state = {"served": 0, "models": set(), "in_flight": 0}
+
+
+class TrainRequest(BaseModel):
+    user_id: str
+    model_name: str
+    ref_audio_path: str
+    ref_text: str
+
+
+class TTSRequestWithModel(BaseModel):
+    text: str
+    text_lang: str
+    model_path: str
+    prompt_lang: str = "ko"
+    text_split_method: str = "cut5"
+    speed_factor: float = 1.0
+    streaming_mode: bool = False
+    handoff: bool = False
+
+
+class WarmupRequest(BaseModel):
+    model_paths: list
+
+
+def _silent_wav(seconds: float) -> bytes:
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as w:
+        w.setnchannels(1)
+        w.setsampwidth(2)
+        w.setframerate(STUB_SAMPLE_RATE)
+        w.writeframes(b"\x00\x00" * int(STUB_SAMPLE_RATE * seconds))
+    return buffer.getvalue()
+
+
+@app.post("/train_model")
+async def train_model(req: TrainRequest):
+    return {"model_path": f"/stub/logs/{req.user_id}_{req.model_name}"}
+
+
+@app.post("/tts")
+async def tts(req: TTSRequestWithModel):
+    state["in_flight"] += 1
+    try:
+        await asyncio.sleep(len(req.text) * STUB_SECONDS_PER_CHAR)
+    finally:
+        state["in_flight"] -= 1
+    state["served"] += 1
+    state["models"].add(req.model_path)
+    # handoff는 지원하지 않으므로 항상 WAV 본문으로 응답 (백엔드는 본문 응답도 처리함)
+    return Response(content=_silent_wav(max(len(req.text) * 0.1, 0.5)), media_type="audio/wav")
+
+
+@app.get("/models/manifest")
+async def manifest(model_path: str):
+    return {"model_path": model_path, "version": 1, "gpt_mtime": 0, "sovits_mtime": 0}
+
+
+@app.post("/warmup")
+async def warmup(req: WarmupRequest):
+    state["models"].update(req.model_paths)
+    return {"status": "ready", "requested": req.model_paths, "warmed": req.model_paths, "ready": True}
+
+
+@app.get("/ready")
+async def ready():
+    return JSONResponse({"status": "ready", "ready": True})
+
+
+@app.get("/tts/queue")
+async def queue():
+    # 요청마다 어떤 목소리가 이 서버로 왔는지 보고, 일관 해싱이 지켜지는지 확인
+    return {"queue_depth": state["in_flight"], "served": state["served"], "models": sorted(state["models"]), "time": time.time()}
+
+
+if __name__ == "__main__":
+    port = int(sys.argv[1]) if len(sys.argv) > 1 else 9881
+    uvicorn.run(app, host="0.0.0.0", port=port)
@@ -0,0 +1,88 @@
+import os
+import asyncio
+import subprocess
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+# 생성된 WAV를 압축 포맷(Ogg/Opus, AAC)으로 변환
+# 변환은 ffmpeg를 별도 프로세스 풀에서 돌리므로 이벤트 루프(다른 요청)를 막지 않습니다.
+
+# 포맷 이름 -> (확장자, ffmpeg 인코더 옵션, media type)
+CODECS = {
+    "wav": (".wav", None, "audio/wav"),
+    "opus": (".ogg", ["-c:a", "libopus", "-b:a", "48k"], "audio/ogg"),
+    "aac": (".m4a", ["-c:a", "aac", "-b:a", "96k"], "audio/mp4"),
+}
+
+DEFAULT_AUDIO_FORMAT = os.getenv("AUDIO_FORMAT", "wav")       # 배포 기본 포맷
+KEEP_WAV = os.getenv("KEEP_WAV", "false").lower() == "true"   # 변환 후 원본 WAV 보관 여부
+TRANSCODE_WORKERS = int(os.getenv("TRANSCODE_WORKERS", 2))
+
+
+def resolve_format(audio_format: str | None) -> str:
+    audio_format = (audio_format or DEFAULT_AUDIO_FORMAT).lower()
+    if audio_format not in CODECS:
+        raise ValueError(f"지원하지 않는 오디오 포맷입니다: {audio_format} (가능: {', '.join(CODECS)})")
+    return audio_format
+
+
+def extension(audio_format: str) -> str:
+    return CODECS[audio_format][0]
+
+
+def _run_ffmpeg(src: str, dest: str, encoder_args: list[str]):
+    # 프로세스 풀 워커에서 실행됨 (피클 가능하도록 모듈 최상위 함수)
+    tmp_path = f"{dest}.tmp{os.path.splitext(dest)[1]}"
+    subprocess.run(
+        ["ffmpeg", "-y", "-loglevel", "error", "-i", src, *encoder_args, tmp_path],
+        check=True,
+        capture_output=True,
+    )
+    os.replace(tmp_path, dest)
+
+
+class AudioTranscoder:
+    def __init__(self, workers: int):
+        self.workers = workers
+        self.pool = None
+        self.stats = {"transcoded": 0, "failed": 0, "wav_bytes": 0, "output_bytes": 0}
+        self.lock = threading.Lock()
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        if self.pool is None:
+            self.pool = ProcessPoolExecutor(max_workers=self.workers)
+        return self.pool
+
+    async def transcode(self, wav_path: str, dest_path: str, audio_format: str):
+        """wav_path -> dest_path 변환 (원본 삭제 여부는 KEEP_WAV 설정에 따름)"""
+        encoder_args = CODECS[audio_format][1]
+        loop = asyncio.get_running_loop()
+        try:
+            await loop.run_in_executor(self._get_pool(), _run_ffmpeg, wav_path, dest_path, encoder_args)
+        except Exception:
+            with self.lock:
+                self.stats["failed"] += 1
+            raise
+
+        with self.lock:
+            self.stats["transcoded"] += 1
+            self.stats["wav_bytes"] += os.path.getsize(wav_path)
+            self.stats["output_bytes"] += os.path.getsize(dest_path)
+        if not KEEP_WAV:
+            os.remove(wav_path)
+
+    def report(self) -> dict:
+        with self.lock:
+            return {
+                **self.stats,
+                "saved_bytes": self.stats["wav_bytes"] - self.stats["output_bytes"],
+                "default_format": DEFAULT_AUDIO_FORMAT,
+                "keep_wav": KEEP_WAV,
+            }
+
+    def shutdown(self):
+        if self.pool is not None:
+            self.pool.shutdown(wait=False, cancel_futures=True)
+
+
+transcoder = AudioTranscoder(TRANSCODE_WORKERS)
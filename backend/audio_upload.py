@@ -0,0 +1,152 @@
+import os
+import json
+import struct
+import subprocess
+from fastapi import UploadFile
+from starlette.concurrency import run_in_threadpool
+
+# 목소리 업로드 파이프라인
+# 업로드를 청크 단위로 한 번만 디스크에 쓰고(이벤트 루프 밖에서), 크기 제한을 넘으면 즉시 중단합니다.
+# WAV는 헤더를 받는 즉시 샘플레이트/길이를 확인하고, 그 외 포맷은 저장 직후 ffprobe로 확인합니다.
+# 이후 단계(원본 보관, AI 서버 학습 폴더)는 복사 대신 하드링크나 경로로 이 파일을 참조합니다.
+
+MAX_UPLOAD_BYTES = int(os.getenv("MAX_UPLOAD_BYTES", 20 * 1024 * 1024))  # 20MB
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+MIN_DURATION = float(os.getenv("MIN_VOICE_SECONDS", 3))
+MAX_DURATION = float(os.getenv("MAX_VOICE_SECONDS", 60))
+MIN_SAMPLE_RATE = 16000
+
+# 첫 바이트로 알아볼 수 있는 오디오 컨테이너 (녹음 파일은 보통 webm/ogg)
+AUDIO_MAGIC = (
+    (0, b"RIFF"),              # wav
+    (0, b"OggS"),              # ogg/opus
+    (0, b"\x1a\x45\xdf\xa3"),  # webm/mkv
+    (0, b"fLaC"),              # flac
+    (0, b"ID3"),               # mp3 (태그)
+    (0, b"\xff\xfb"),          # mp3 (프레임)
+    (0, b"\xff\xf3"),
+    (4, b"ftyp"),              # m4a/mp4
+)
+
+
+class UploadRejected(Exception):
+    def __init__(self, status_code: int, detail: str):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+
+
+class WavHeaderProbe:
+    """들어오는 청크에서 WAV 헤더(fmt/data)를 읽어 샘플레이트와 길이를 계산"""
+
+    def __init__(self):
+        self.head = b""
+        self.sample_rate = None
+        self.byte_rate = None
+        self.data_offset = None
+
+    def feed(self, chunk: bytes):
+        if self.data_offset is not None or len(self.head) > 64 * 1024:
+            return
+        self.head += chunk
+        if self.head[:4] != b"RIFF" or self.head[8:12] != b"WAVE":
+            return
+        pos = 12
+        while pos + 8 <= len(self.head):
+            chunk_id = self.head[pos:pos + 4]
+            chunk_size = struct.unpack("<I", self.head[pos + 4:pos + 8])[0]
+            if chunk_id == b"fmt " and pos + 24 <= len(self.head):
+                _, _, self.sample_rate, self.byte_rate = struct.unpack("<HHII", self.head[pos + 8:pos + 20])
+            elif chunk_id == b"data":
+                self.data_offset = pos + 8
+                return
+            pos += 8 + chunk_size + (chunk_size & 1)
+
+    def result(self, total_bytes: int) -> dict | None:
+        if self.data_offset is None or not self.byte_rate:
+            return None
+        # 스트리밍으로 만든 WAV는 data 크기가 비어 있을 수 있으므로 실제 받은 바이트로 계산
+        return {
+            "sample_rate": self.sample_rate,
+            "duration": (total_bytes - self.data_offset) / self.byte_rate,
+        }
+
+
+def _looks_like_audio(head: bytes) -> bool:
+    return any(head[offset:offset + len(magic)] == magic for offset, magic in AUDIO_MAGIC)
+
+
+def _ffprobe(path: str) -> dict | None:
+    try:
+        result = subprocess.run(
+            ["ffprobe", "-v", "error", "-select_streams", "a:0",
+             "-show_entries", "stream=sample_rate:format=duration", "-of", "json", path],
+            check=True, capture_output=True, timeout=30,
+        )
+    except FileNotFoundError:
+        print("경고: ffprobe가 없어 업로드 오디오 검증을 건너뜁니다.")
+        return None
+    except subprocess.SubprocessError:
+        raise UploadRejected(400, "오디오 파일을 읽을 수 없습니다.")
+
+    info = json.loads(result.stdout or b"{}")
+    streams = info.get("streams") or []
+    duration = (info.get("format") or {}).get("duration")
+    if not streams or duration in (None, "N/A"):
+        # webm 녹음 파일은 컨테이너에 길이가 없을 수 있음 -> 샘플레이트만 확인
+        if streams:
+            return {"sample_rate": int(streams[0].get("sample_rate", 0)), "duration": None}
+        raise UploadRejected(400, "오디오 스트림이 없는 파일입니다.")
+    return {"sample_rate": int(streams[0].get("sample_rate", 0)), "duration": float(duration)}
+
+
+def _validate(info: dict):
+    if info["sample_rate"] and info["sample_rate"] < MIN_SAMPLE_RATE:
+        raise UploadRejected(400, f"샘플레이트가 너무 낮습니다. ({info['sample_rate']}Hz, 최소 {MIN_SAMPLE_RATE}Hz)")
+    duration = info["duration"]
+    if duration is not None and not (MIN_DURATION <= duration <= MAX_DURATION):
+        raise UploadRejected(400, f"음성 길이는 {MIN_DURATION:g}~{MAX_DURATION:g}초여야 합니다. (현재 {duration:.1f}초)")
+
+
+async def save_upload(upload: UploadFile, dest_path: str) -> dict:
+    """업로드를 dest_path에 한 번만 쓰고 {"size", "sample_rate", "duration"} 반환 (거절 시 UploadRejected)"""
+    tmp_path = f"{dest_path}.part"
+    probe = WavHeaderProbe()
+    written = 0
+    f = await run_in_threadpool(open, tmp_path, "wb")
+    try:
+        while True:
+            chunk = await upload.read(UPLOAD_CHUNK_SIZE)
+            if not chunk:
+                break
+            if written == 0 and not _looks_like_audio(chunk[:16]):
+                raise UploadRejected(400, "오디오 파일이 아닙니다.")
+            written += len(chunk)
+            if written > MAX_UPLOAD_BYTES:
+                raise UploadRejected(413, f"파일이 너무 큽니다. (최대 {MAX_UPLOAD_BYTES // (1024 * 1024)}MB)")
+            probe.feed(chunk)
+            await run_in_threadpool(f.write, chunk)
+        await run_in_threadpool(f.close)
+
+        if written == 0:
+            raise UploadRejected(400, "빈 파일입니다.")
+        info = probe.result(written) or await run_in_threadpool(_ffprobe, tmp_path)
+        if info:
+            _validate(info)
+    except BaseException:
+        f.close()
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+    os.replace(tmp_path, dest_path)
+    return {"size": written, **(info or {"sample_rate": None, "duration": None})}
+
+
+def link_or_reference(src_path: str, link_path: str) -> str:
+    """src_path를 link_path에 하드링크하고 그 경로를 반환. 다른 마운트라 안 되면 원본 경로를 그대로 참조"""
+    try:
+        os.link(src_path, link_path)
+        return link_path
+    except OSError:
+        return src_path
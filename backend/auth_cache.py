@@ -0,0 +1,83 @@
+import os
+import time
+import threading
+
+# 인증된 사용자(principal) 캐시
+# 보호된 API마다 JWT를 푼 뒤 users 테이블을 username으로 조회하던 것을,
+# (토큰 subject, 세션 버전) 기준으로 짧은 TTL 동안 메모리에서 재사용합니다.
+# - 아이디(username)가 바뀌거나 권한(role)이 바뀌면 invalidate()로 즉시 비움
+# - 세션 버전(users.session_version)이 올라가면 예전 토큰은 키가 달라져 캐시에 걸리지 않고, DB 확인에서 거절됨
+
+AUTH_CACHE_TTL = float(os.getenv("AUTH_CACHE_TTL", 30))               # 초
+AUTH_CACHE_MAX_ENTRIES = int(os.getenv("AUTH_CACHE_MAX_ENTRIES", 10000))
+
+
+class Principal:
+    """핸들러가 DB 조회 없이 쓸 수 있는 최소 사용자 정보 (행 전체가 필요하면 get_current_user 사용)"""
+
+    __slots__ = ("id", "username", "role", "session_version")
+
+    def __init__(self, id: int, username: str, role: str, session_version: int):
+        self.id = id
+        self.username = username
+        self.role = role
+        self.session_version = session_version
+
+    @classmethod
+    def from_user(cls, user) -> "Principal":
+        return cls(user.id, user.username, user.role, user.session_version or 0)
+
+
+class PrincipalCache:
+    def __init__(self, ttl: float, max_entries: int):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.entries = {}   # (username, session_version) -> (expires_at, Principal)
+        self.lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "invalidations": 0}
+
+    def get(self, username: str, session_version: int) -> Principal | None:
+        key = (username, session_version)
+        now = time.monotonic()
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry and entry[0] > now:
+                self.stats["hits"] += 1
+                return entry[1]
+            if entry:
+                del self.entries[key]
+            self.stats["misses"] += 1
+            return None
+
+    def put(self, principal: Principal):
+        with self.lock:
+            if len(self.entries) >= self.max_entries:
+                self._evict(time.monotonic())
+            self.entries[(principal.username, principal.session_version)] = (time.monotonic() + self.ttl, principal)
+
+    def _evict(self, now: float):
+        # 만료된 것부터 정리하고, 그래도 가득 차 있으면 가장 먼저 만료될 항목을 버림
+        for key in [k for k, (expires_at, _) in self.entries.items() if expires_at <= now]:
+            del self.entries[key]
+        if len(self.entries) >= self.max_entries:
+            del self.entries[min(self.entries, key=lambda k: self.entries[k][0])]
+
+    def invalidate(self, username: str):
+        """해당 아이디의 모든 세션 버전 항목 삭제"""
+        with self.lock:
+            for key in [k for k in self.entries if k[0] == username]:
+                del self.entries[key]
+            self.stats["invalidations"] += 1
+
+    def report(self) -> dict:
+        with self.lock:
+            lookups = self.stats["hits"] + self.stats["misses"]
+            return {
+                **self.stats,
+                "entries": len(self.entries),
+                "hit_rate": round(self.stats["hits"] / lookups, 3) if lookups else None,
+                "ttl_seconds": self.ttl,
+            }
+
+
+principal_cache = PrincipalCache(AUTH_CACHE_TTL, AUTH_CACHE_MAX_ENTRIES)
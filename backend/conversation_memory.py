@@ -0,0 +1,229 @@
+import os
+import json
+import asyncio
+from collections import OrderedDict, deque
+from starlette.concurrency import run_in_threadpool
+import models
+from database import SessionLocal
+from llm_client import llm_client, MODEL_FAST
+
+# 캐릭터 대화 기억 (유저 x 목소리별)
+# - 최근 대화는 고정 크기 링(deque)에, 링에서 밀려난 대화는 LLM으로 짧은 요약에 접어 넣음
+# - LLM 호출 전에는 요약 + 최근 대화를 토큰 예산 안으로 잘라서 프롬프트에 넣음
+#   -> 대화가 길어져도 프롬프트 크기와 요청당 비용이 일정
+# - 메모리에 두고 주기적으로(변경된 것만) DB에 저장, 처음 접근할 때 DB에서 읽어 옴
+
+MEMORY_TURNS = int(os.getenv("MEMORY_TURNS", 8))                       # 링에 보관할 최근 발화 수 (유저+캐릭터)
+MEMORY_TOKEN_BUDGET = int(os.getenv("MEMORY_TOKEN_BUDGET", 600))       # 프롬프트에 넣을 기억의 토큰 예산
+MEMORY_SUMMARY_BATCH = 4                                               # 밀려난 발화가 이만큼 모이면 요약 갱신
+MEMORY_SUMMARY_MAX_CHARS = 400
+MEMORY_MAX_CONVERSATIONS = int(os.getenv("MEMORY_MAX_CONVERSATIONS", 10000))  # 메모리에 올려 둘 대화 수
+MEMORY_FLUSH_INTERVAL = float(os.getenv("MEMORY_FLUSH_INTERVAL", 30))  # DB 저장 주기 (초)
+
+
+def estimate_tokens(text: str) -> int:
+    # 한국어는 대략 글자 2개당 1토큰 (정확할 필요는 없고 상한 관리용)
+    return len(text) // 2 + 1
+
+
+class Conversation:
+    __slots__ = ("turns", "summary", "pending", "dirty", "summarizing")
+
+    def __init__(self, turns=(), summary: str = ""):
+        self.turns = deque(turns, maxlen=MEMORY_TURNS)  # (role, text), role: "user" / "bot"
+        self.summary = summary
+        self.pending = []       # 링에서 밀려났지만 아직 요약에 반영 안 된 발화
+        self.dirty = False
+        self.summarizing = False
+
+
+class ConversationStore:
+    def __init__(self):
+        self.conversations = OrderedDict()  # (user_id, voice_model_id) -> Conversation (LRU)
+        self.flush_task = None
+        # [NEW] 저장(주기적 저장/내보내기 저장)과 삭제를 한 번에 하나씩만 진행
+        # 저장 중인 대화를 다른 쪽이 먼저 내보내거나 지워서, DB의 예전 기억이 다시 읽히거나 되살아나지 않도록 함
+        self.save_lock = asyncio.Lock()
+        self.stats = {"loaded": 0, "evicted": 0, "summaries": 0, "summary_failures": 0, "flushed": 0, "trimmed_turns": 0}
+
+    async def get(self, user_id: int, voice_model_id: int) -> Conversation:
+        key = (user_id, voice_model_id)
+        conversation = self.conversations.get(key)
+        if conversation is None:
+            conversation = await run_in_threadpool(_load, user_id, voice_model_id)
+            # 읽어 오는 동안 다른 요청이 먼저 올렸으면 그쪽을 사용
+            conversation = self.conversations.setdefault(key, conversation)
+            self.stats["loaded"] += 1
+            # [MOD] 내보내기는 저장을 기다리는 동안 순서가 바뀔 수 있으므로, 방금 올린 대화를 먼저 최신으로 표시
+            self.conversations.move_to_end(key)
+            await self._evict()
+            return conversation
+        self.conversations.move_to_end(key)
+        return conversation
+
+    async def context(self, user_id: int, voice_model_id: int, persona: str) -> str:
+        """토큰 예산 안에 들어가는 '요약 + 최근 대화' 텍스트 (기억이 없으면 빈 문자열)"""
+        conversation = await self.get(user_id, voice_model_id)
+        budget = MEMORY_TOKEN_BUDGET
+        parts = []
+        if conversation.summary:
+            summary = conversation.summary[:MEMORY_SUMMARY_MAX_CHARS]
+            parts.append(f"이전 대화 요약: {summary}")
+            budget -= estimate_tokens(summary)
+
+        recent = []
+        for role, text in reversed(conversation.turns):
+            line = f"{'사용자' if role == 'user' else persona}: {text}"
+            cost = estimate_tokens(line)
+            if cost > budget:
+                self.stats["trimmed_turns"] += 1
+                break
+            recent.append(line)
+            budget -= cost
+        if recent:
+            parts.append("최근 대화:\n" + "\n".join(reversed(recent)))
+        return "\n".join(parts)
+
+    async def add_exchange(self, user_id: int, voice_model_id: int, user_text: str, reply_text: str):
+        conversation = await self.get(user_id, voice_model_id)
+        for turn in (("user", user_text), ("bot", reply_text)):
+            if len(conversation.turns) == conversation.turns.maxlen:
+                conversation.pending.append(conversation.turns[0])
+            conversation.turns.append(turn)
+        conversation.dirty = True
+        if len(conversation.pending) >= MEMORY_SUMMARY_BATCH and not conversation.summarizing:
+            conversation.summarizing = True
+            asyncio.create_task(self._summarize(conversation))
+
+    async def reset(self, user_id: int, voice_model_id: int):
+        async with self.save_lock:
+            self.conversations.pop((user_id, voice_model_id), None)
+            await run_in_threadpool(_delete, user_id, voice_model_id)
+
+    async def _summarize(self, conversation: Conversation):
+        pending = conversation.pending
+        conversation.pending = []
+        lines = "\n".join(f"{'사용자' if role == 'user' else '캐릭터'}: {text}" for role, text in pending)
+        prompt = (
+            "다음은 사용자와 캐릭터의 대화 기록입니다. 기존 요약과 새 대화를 합쳐, "
+            "이후 대화에 필요한 사실(이름, 취향, 약속 등) 위주로 한국어 3문장 이내로 요약해주세요.\n"
+            f"기존 요약: {conversation.summary or '(없음)'}\n새 대화:\n{lines}"
+        )
+        try:
+            summary = await llm_client.generate(prompt, MODEL_FAST)
+            self.stats["summaries"] += 1
+        except Exception as e:
+            # 요약 실패 시 밀려난 발화를 잘라 붙여 두기만 함 (다음 요약 때 함께 접힘)
+            print(f"대화 요약 실패 (간단 요약으로 대체): {e}")
+            self.stats["summary_failures"] += 1
+            summary = f"{conversation.summary} {lines.replace(chr(10), ' / ')}".strip()
+        conversation.summary = summary.strip()[-MEMORY_SUMMARY_MAX_CHARS:]
+        conversation.dirty = True
+        conversation.summarizing = False
+
+    async def _evict(self):
+        async with self.save_lock:
+            while len(self.conversations) > MEMORY_MAX_CONVERSATIONS:
+                key, conversation = next(iter(self.conversations.items()))
+                if conversation.dirty:
+                    # [MOD] 저장이 끝날 때까지 항목을 메모리에 남겨 둠
+                    # (먼저 빼 버리면 저장 중에 들어온 같은 대화 요청이 DB의 예전 기억을 읽어 감)
+                    conversation.dirty = False
+                    try:
+                        await run_in_threadpool(_save, [(key, conversation.summary, list(conversation.turns))])
+                    except Exception:
+                        conversation.dirty = True
+                        raise
+                    # 저장하는 동안 다시 바뀌었거나 사용돼 뒤로 밀렸을 수 있으므로 가장 오래된 항목부터 다시 확인
+                    continue
+                del self.conversations[key]
+                self.stats["evicted"] += 1
+
+    # --- 주기적 저장 ---
+    def start(self):
+        if self.flush_task is None or self.flush_task.done():
+            self.flush_task = asyncio.create_task(self._flush_loop())
+
+    async def stop(self):
+        if self.flush_task is not None:
+            self.flush_task.cancel()
+            await asyncio.gather(self.flush_task, return_exceptions=True)
+        await self.flush()
+
+    async def _flush_loop(self):
+        while True:
+            await asyncio.sleep(MEMORY_FLUSH_INTERVAL)
+            try:
+                await self.flush()
+            except Exception as e:
+                print(f"대화 기억 저장 실패: {e}")
+
+    async def flush(self):
+        async with self.save_lock:
+            batch = []
+            for key, conversation in list(self.conversations.items()):
+                if conversation.dirty:
+                    conversation.dirty = False
+                    batch.append((key, conversation.summary, list(conversation.turns)))
+            if batch:
+                try:
+                    await run_in_threadpool(_save, batch)
+                except Exception:
+                    for key, _, _ in batch:
+                        if key in self.conversations:
+                            self.conversations[key].dirty = True  # 다음 주기에 다시 저장
+                    raise
+                self.stats["flushed"] += len(batch)
+
+    def report(self) -> dict:
+        return {
+            **self.stats,
+            "conversations": len(self.conversations),
+            "max_conversations": MEMORY_MAX_CONVERSATIONS,
+            "turns": MEMORY_TURNS,
+            "token_budget": MEMORY_TOKEN_BUDGET,
+        }
+
+
+def _load(user_id: int, voice_model_id: int) -> Conversation:
+    db = SessionLocal()
+    try:
+        row = db.query(models.ConversationMemory).filter(
+            models.ConversationMemory.user_id == user_id,
+            models.ConversationMemory.voice_model_id == voice_model_id
+        ).first()
+        if not row:
+            return Conversation()
+        return Conversation([tuple(t) for t in json.loads(row.turns or "[]")], row.summary or "")
+    finally:
+        db.close()
+
+
+def _save(batch: list):
+    db = SessionLocal()
+    try:
+        for (user_id, voice_model_id), summary, turns in batch:
+            db.merge(models.ConversationMemory(
+                user_id=user_id,
+                voice_model_id=voice_model_id,
+                summary=summary,
+                turns=json.dumps(turns, ensure_ascii=False),
+            ))
+        db.commit()
+    finally:
+        db.close()
+
+
+def _delete(user_id: int, voice_model_id: int):
+    db = SessionLocal()
+    try:
+        db.query(models.ConversationMemory).filter(
+            models.ConversationMemory.user_id == user_id,
+            models.ConversationMemory.voice_model_id == voice_model_id
+        ).delete()
+        db.commit()
+    finally:
+        db.close()
+
+
+conversation_memory = ConversationStore()
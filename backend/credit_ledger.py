@@ -0,0 +1,188 @@
+import os
+import asyncio
+from datetime import datetime, timedelta
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+import models
+from database import SessionLocal
+
+# 크레딧 입출금
+# 잔액을 파이썬에서 읽고-비교하고-더해서 커밋하면, 같은 유저의 요청이 동시에 들어올 때 둘 다 잔액 확인을 통과해 초과 사용이 생깁니다.
+# 여기서는 잔액 확인과 차감을 조건부 UPDATE 한 문장으로 처리하고(영향받은 행이 0이면 잔액 부족),
+# 같은 트랜잭션에 CreditLog 행을 추가합니다. 커밋은 호출한 쪽에서 합니다.
+# UPDATE는 ORM 객체를 거치지 않으므로, 세션에 올라와 있는 User.credit_balance는 커밋 후(expire_on_commit) 다시 읽힙니다.
+#
+# 오래 걸리는 AI 작업(TTS/대화)은 2단계로 결제합니다.
+# hold()가 잔액을 먼저 빼 두고 바로 커밋한 뒤, 작업 중에는 DB 커넥션을 잡지 않고,
+# 성공하면 capture()로 확정(CreditLog 기록), 실패하면 release()로 환불합니다.
+# 서버가 죽는 등으로 남은 예약은 스위퍼가 CREDIT_HOLD_TTL이 지나면 환불(EXPIRED)합니다.
+
+CREDIT_HOLD_TTL = float(os.getenv("CREDIT_HOLD_TTL", 600))               # 예약 유효 시간 (초)
+CREDIT_HOLD_SWEEP_INTERVAL = float(os.getenv("CREDIT_HOLD_SWEEP_INTERVAL", 60))
+
+
+def _log(db: Session, user_id: int, amount: int, transaction_type: str, description: str, reference_id: int | None):
+    db.add(models.CreditLog(
+        user_id=user_id,
+        amount=amount,
+        transaction_type=transaction_type,
+        description=description,
+        reference_id=reference_id
+    ))
+
+
+def adjust(db: Session, user_id: int, delta: int, transaction_type: str, description: str,
+           reference_id: int | None = None, min_balance: int = 0) -> bool:
+    """
+    UPDATE users SET credit_balance = credit_balance + :delta
+     WHERE id = :user_id AND credit_balance >= :min_balance
+    성공하면 CreditLog(amount=delta)를 추가하고 True, 잔액이 min_balance 미만이거나 유저가 없으면 False
+    """
+    updated = db.query(models.User).filter(
+        models.User.id == user_id,
+        models.User.credit_balance >= min_balance
+    ).update({"credit_balance": models.User.credit_balance + delta}, synchronize_session=False)
+    if updated != 1:
+        return False
+    _log(db, user_id, delta, transaction_type, description, reference_id)
+    return True
+
+
+def debit(db: Session, user_id: int, amount: int, transaction_type: str, description: str,
+          reference_id: int | None = None) -> bool:
+    """잔액이 amount 이상일 때만 차감"""
+    return adjust(db, user_id, -amount, transaction_type, description, reference_id, min_balance=amount)
+
+
+def credit(db: Session, user_id: int, amount: int, transaction_type: str, description: str,
+           reference_id: int | None = None) -> bool:
+    """입금 (유저가 없으면 False)"""
+    updated = db.query(models.User).filter(models.User.id == user_id).update(
+        {"credit_balance": models.User.credit_balance + amount}, synchronize_session=False
+    )
+    if updated != 1:
+        return False
+    _log(db, user_id, amount, transaction_type, description, reference_id)
+    return True
+
+
+def settle_bet(db: Session, user_id: int, stake: int, delta: int, transaction_type: str, description: str,
+               reference_id: int | None = None) -> bool:
+    """게임 결과 반영: 판돈(stake)만큼 잔액이 남아 있을 때만 승패 금액(delta)을 더함"""
+    return adjust(db, user_id, delta, transaction_type, description, reference_id, min_balance=stake)
+
+
+# --- 2단계 결제 (예약 -> 확정/환불) ---
+def hold(user_id: int, amount: int, purpose: str, reference_id: int | None = None) -> int | None:
+    """잔액을 amount만큼 예약(차감)하고 바로 커밋. 예약 id 반환, 잔액 부족이면 None"""
+    db = SessionLocal()
+    try:
+        updated = db.query(models.User).filter(
+            models.User.id == user_id,
+            models.User.credit_balance >= amount
+        ).update({"credit_balance": models.User.credit_balance - amount}, synchronize_session=False)
+        if updated != 1:
+            db.rollback()
+            return None
+        credit_hold = models.CreditHold(
+            user_id=user_id,
+            amount=amount,
+            purpose=purpose,
+            reference_id=reference_id,
+            status="HELD",
+            expires_at=datetime.now() + timedelta(seconds=CREDIT_HOLD_TTL)
+        )
+        db.add(credit_hold)
+        db.flush()
+        hold_id = credit_hold.id
+        db.commit()
+        return hold_id
+    finally:
+        db.close()
+
+
+def capture(db: Session, hold_id: int, transaction_type: str, description: str, reference_id: int | None = None) -> bool:
+    """예약 확정 + CreditLog 추가 (커밋은 호출한 쪽에서). 이미 만료돼 환불됐으면 일반 차감으로 다시 시도"""
+    credit_hold = db.query(models.CreditHold).filter(models.CreditHold.id == hold_id).first()
+    if credit_hold is None:
+        return False
+    updated = db.query(models.CreditHold).filter(
+        models.CreditHold.id == hold_id,
+        models.CreditHold.status == "HELD"
+    ).update({"status": "CAPTURED"}, synchronize_session=False)
+    if updated == 1:
+        _log(db, credit_hold.user_id, -credit_hold.amount, transaction_type, description, reference_id)
+        return True
+    return debit(db, credit_hold.user_id, credit_hold.amount, transaction_type, description, reference_id)
+
+
+def _refund(db: Session, credit_hold: models.CreditHold, status: str) -> bool:
+    # 확정과 동시에 일어나도 상태 전환(HELD -> ...)은 한쪽만 성공
+    updated = db.query(models.CreditHold).filter(
+        models.CreditHold.id == credit_hold.id,
+        models.CreditHold.status == "HELD"
+    ).update({"status": status}, synchronize_session=False)
+    if updated != 1:
+        return False
+    db.query(models.User).filter(models.User.id == credit_hold.user_id).update(
+        {"credit_balance": models.User.credit_balance + credit_hold.amount}, synchronize_session=False
+    )
+    return True
+
+
+def release(hold_id: int) -> bool:
+    """예약 취소 (작업 실패 시 환불)"""
+    db = SessionLocal()
+    try:
+        credit_hold = db.query(models.CreditHold).filter(models.CreditHold.id == hold_id).first()
+        if credit_hold is None or not _refund(db, credit_hold, "RELEASED"):
+            db.rollback()
+            return False
+        db.commit()
+        return True
+    finally:
+        db.close()
+
+
+def expire_stale_holds() -> int:
+    db = SessionLocal()
+    try:
+        stale = db.query(models.CreditHold).filter(
+            models.CreditHold.status == "HELD",
+            models.CreditHold.expires_at < datetime.now()
+        ).all()
+        expired = sum(1 for credit_hold in stale if _refund(db, credit_hold, "EXPIRED"))
+        db.commit()
+        return expired
+    finally:
+        db.close()
+
+
+class HoldSweeper:
+    def __init__(self):
+        self.task = None
+        self.stats = {"sweeps": 0, "expired": 0}
+
+    def start(self):
+        if self.task is None or self.task.done():
+            self.task = asyncio.create_task(self._loop())
+
+    async def stop(self):
+        if self.task is not None:
+            self.task.cancel()
+            await asyncio.gather(self.task, return_exceptions=True)
+
+    async def _loop(self):
+        while True:
+            try:
+                expired = await run_in_threadpool(expire_stale_holds)
+                self.stats["sweeps"] += 1
+                self.stats["expired"] += expired
+                if expired:
+                    print(f"만료된 크레딧 예약 {expired}건 환불")
+            except Exception as e:
+                print(f"크레딧 예약 정리 실패: {e}")
+            await asyncio.sleep(CREDIT_HOLD_SWEEP_INTERVAL)
+
+
+hold_sweeper = HoldSweeper()
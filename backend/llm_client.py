@@ -0,0 +1,257 @@
+import os
+import re
+import time
+import asyncio
+import hashlib
+import random
+import unicodedata
+from collections import OrderedDict
+import google.generativeai as genai
+
+# 채팅 엔드포인트용 공용 LLM 클라이언트
+# - 모델 핸들(GenerativeModel)은 모델 이름별로 한 번만 만들어 재사용
+# - Gemini의 비동기 API를 사용하므로 LLM 왕복 동안 이벤트 루프를 막지 않음
+# - 동시 호출 수 제한 + 타임아웃
+# - 똑같은 프롬프트가 동시에 여러 번 들어오면 업스트림 호출은 한 번만 하고 결과를 나눠 씀
+# - 캐릭터(페르소나)+모델+정규화한 사용자 문장이 같으면 캐시된 답변을 재사용 (TTL, 크기 제한, 답변 여러 개 중 랜덤)
+# LLM_PROVIDER=stub 이면 외부 호출 없이 가짜 답변을 돌려주는 로컬 제공자를 사용 (개발/부하 테스트용)
+
+LLM_PROVIDER = os.getenv("LLM_PROVIDER", "gemini")
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", 20))                 # 답변 전체(스트리밍은 조각 사이) 타임아웃 (초)
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", 16))   # 동시에 보내는 업스트림 요청 수
+
+REPLY_CACHE_TTL = float(os.getenv("REPLY_CACHE_TTL", 3600))              # 캐시된 답변 유효 시간 (초)
+REPLY_CACHE_MAX_ENTRIES = int(os.getenv("REPLY_CACHE_MAX_ENTRIES", 5000))
+REPLY_CACHE_VARIANTS = int(os.getenv("REPLY_CACHE_VARIANTS", 3))         # 같은 질문에 모아 둘 답변 수
+REPLY_CACHE_REFRESH_PROB = float(os.getenv("REPLY_CACHE_REFRESH_PROB", 0.2))  # 답변이 덜 모였을 때 새로 받아 올 확률
+REPLY_CACHE_MAX_TEXT = 40  # 이보다 긴 문장은 반복될 일이 드물어 캐시하지 않음
+# [NEW] 대화 기억이 있어도 캐시를 쓰는 메시지 길이 ("안녕", "뭐해?", "고마워" 같은 인사/맞장구는 맥락과 무관)
+# 기억이 있을 때는 캐시에서 읽기만 하고 저장하지 않음 (기억을 넣어 만든 답변에는 그 유저만의 내용이 섞일 수 있음)
+REPLY_CACHE_CONTEXT_FREE_MAX = int(os.getenv("REPLY_CACHE_CONTEXT_FREE_MAX", 10))
+
+# 용도별 모델
+MODEL_FAST = "gemini-2.5-flash-lite"   # 텍스트 채팅
+MODEL_DEFAULT = "gemini-2.5-flash"     # 음성 채팅
+
+
+class LLMError(Exception):
+    pass
+
+
+class GeminiProvider:
+    def __init__(self, api_key: str | None):
+        self.api_key = api_key
+        self.models = {}  # 모델 이름 -> GenerativeModel
+        if api_key:
+            genai.configure(api_key=api_key)
+
+    def available(self) -> bool:
+        return bool(self.api_key)
+
+    def _model(self, model_name: str):
+        model = self.models.get(model_name)
+        if model is None:
+            model = self.models[model_name] = genai.GenerativeModel(model_name)
+        return model
+
+    async def generate(self, model_name: str, prompt: str) -> str:
+        response = await self._model(model_name).generate_content_async(prompt)
+        return response.text
+
+    async def stream(self, model_name: str, prompt: str):
+        response = await self._model(model_name).generate_content_async(prompt, stream=True)
+        async for chunk in response:
+            if chunk.text:
+                yield chunk.text
+
+
+class StubProvider:
+    """외부 호출 없는 가짜 LLM: 프롬프트로 정해지는 답변을 LLM_STUB_DELAY초 뒤에 돌려줌"""
+
+    REPLIES = (
+        "안녕하세요! 만나서 반가워요.",
+        "좋은 질문이네요. 잠깐 생각해 볼게요.",
+        "오늘 하루는 어땠나요? 저는 즐거웠어요.",
+        "그 이야기 더 들려주세요. 정말 궁금해요.",
+    )
+
+    def __init__(self, delay: float):
+        self.delay = delay
+
+    def available(self) -> bool:
+        return True
+
+    def _reply(self, prompt: str) -> str:
+        digest = int(hashlib.md5(prompt.encode("utf-8")).hexdigest(), 16)
+        return self.REPLIES[digest % len(self.REPLIES)]
+
+    async def generate(self, model_name: str, prompt: str) -> str:
+        await asyncio.sleep(self.delay)
+        return self._reply(prompt)
+
+    async def stream(self, model_name: str, prompt: str):
+        words = self._reply(prompt).split(" ")
+        for i, word in enumerate(words):
+            await asyncio.sleep(self.delay / len(words) * random.uniform(0.5, 1.5))
+            yield word if i == 0 else " " + word
+
+
+_TRAILING_NOISE = " .,!?~…ㅋㅎㅠㅜ^"
+
+
+def normalize_message(text: str) -> str:
+    """"안녕~", " 안녕!! " -> "안녕" 처럼 표기만 다른 짧은 메시지를 같은 키로"""
+    # 자모(ㅋ, ㅎ...)는 NFKC에서 다른 코드로 바뀌므로 정규화 전에 한 번 더 떼어냄
+    text = re.sub(r"\s+", " ", text.lower()).strip(_TRAILING_NOISE)
+    return unicodedata.normalize("NFKC", text).strip(_TRAILING_NOISE)
+
+
+class ReplyCache:
+    def __init__(self, ttl: float, max_entries: int, variants: int, refresh_prob: float):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.variants = variants
+        self.refresh_prob = refresh_prob
+        self.entries = OrderedDict()  # (페르소나, 모델, 정규화 문장) -> {"replies": [...], "expires_at"}
+        self.stats = {"hits": 0, "misses": 0, "refreshes": 0, "expired": 0, "evictions": 0}
+
+    def key(self, persona: str, model_name: str, text: str, has_context: bool = False) -> tuple | None:
+        """캐시 키 (캐시하지 않을 메시지면 None). 대화 기억이 있으면 아주 짧은 메시지만 캐시 대상"""
+        normalized = normalize_message(text)
+        if not normalized or len(normalized) > REPLY_CACHE_MAX_TEXT:
+            return None
+        if has_context and len(normalized) > REPLY_CACHE_CONTEXT_FREE_MAX:
+            return None
+        return (persona, model_name, normalized)
+
+    def get(self, key: tuple) -> str | None:
+        entry = self.entries.get(key)
+        if entry is not None and entry["expires_at"] < time.monotonic():
+            del self.entries[key]
+            self.stats["expired"] += 1
+            entry = None
+        if entry is None:
+            self.stats["misses"] += 1
+            return None
+        # 답변이 아직 덜 모였으면 가끔은 새로 받아서 다양하게
+        if len(entry["replies"]) < self.variants and random.random() < self.refresh_prob:
+            self.stats["refreshes"] += 1
+            return None
+        self.entries.move_to_end(key)
+        self.stats["hits"] += 1
+        return random.choice(entry["replies"])
+
+    def put(self, key: tuple, reply: str):
+        entry = self.entries.get(key)
+        if entry is None:
+            entry = self.entries[key] = {"replies": [], "expires_at": time.monotonic() + self.ttl}
+        if reply not in entry["replies"] and len(entry["replies"]) < self.variants:
+            entry["replies"].append(reply)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+            self.stats["evictions"] += 1
+
+    def report(self) -> dict:
+        lookups = self.stats["hits"] + self.stats["misses"] + self.stats["refreshes"]
+        return {
+            **self.stats,
+            "hit_rate": round(self.stats["hits"] / lookups, 4) if lookups else 0.0,
+            "entries": len(self.entries),
+            "max_entries": self.max_entries,
+            "ttl": self.ttl,
+            "variants": self.variants,
+        }
+
+
+class LLMClient:
+    def __init__(self, provider, timeout: float, max_concurrency: int):
+        self.provider = provider
+        self.timeout = timeout
+        self.semaphore = asyncio.Semaphore(max_concurrency)
+        self.in_flight = {}  # (모델, 프롬프트) -> 진행 중인 업스트림 호출 Task
+        self.stats = {"requests": 0, "upstream_calls": 0, "coalesced": 0, "timeouts": 0, "errors": 0}
+        self.replies = ReplyCache(REPLY_CACHE_TTL, REPLY_CACHE_MAX_ENTRIES, REPLY_CACHE_VARIANTS, REPLY_CACHE_REFRESH_PROB)
+
+    def available(self) -> bool:
+        return self.provider.available()
+
+    async def chat(self, persona: str, user_text: str, prompt: str, model_name: str = MODEL_DEFAULT, has_context: bool = False) -> str:
+        """캐릭터 대화용 generate: 짧고 흔한 메시지는 답변 캐시를 먼저 확인 (has_context: 프롬프트에 대화 기억이 들어 있음)"""
+        key = self.replies.key(persona, model_name, user_text, has_context)
+        if key is not None:
+            cached = self.replies.get(key)
+            if cached is not None:
+                return cached
+        reply = await self.generate(prompt, model_name)
+        if key is not None and not has_context:
+            self.replies.put(key, reply)
+        return reply
+
+    async def generate(self, prompt: str, model_name: str = MODEL_DEFAULT) -> str:
+        self.stats["requests"] += 1
+        key = (model_name, prompt)
+        task = self.in_flight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._call(model_name, prompt))
+            self.in_flight[key] = task
+            task.add_done_callback(lambda _: self.in_flight.pop(key, None))
+        else:
+            self.stats["coalesced"] += 1
+        # 기다리던 요청 하나가 취소돼도 공유 호출은 계속 진행
+        return await asyncio.shield(task)
+
+    async def _call(self, model_name: str, prompt: str) -> str:
+        async with self.semaphore:
+            self.stats["upstream_calls"] += 1
+            try:
+                return await asyncio.wait_for(self.provider.generate(model_name, prompt), self.timeout)
+            except asyncio.TimeoutError:
+                self.stats["timeouts"] += 1
+                raise LLMError(f"LLM 응답 시간 초과 ({self.timeout:g}초)")
+            except Exception as e:
+                self.stats["errors"] += 1
+                raise LLMError(str(e)) from e
+
+    async def stream(self, prompt: str, model_name: str = MODEL_DEFAULT):
+        """답변 조각을 받는 대로 yield (조각 사이 간격에 타임아웃 적용, 합치기 없음)"""
+        self.stats["requests"] += 1
+        async with self.semaphore:
+            self.stats["upstream_calls"] += 1
+            chunks = self.provider.stream(model_name, prompt).__aiter__()
+            try:
+                while True:
+                    try:
+                        chunk = await asyncio.wait_for(chunks.__anext__(), self.timeout)
+                    except StopAsyncIteration:
+                        break
+                    yield chunk
+            except asyncio.TimeoutError:
+                self.stats["timeouts"] += 1
+                raise LLMError(f"LLM 응답 시간 초과 ({self.timeout:g}초)")
+            except LLMError:
+                raise
+            except Exception as e:
+                self.stats["errors"] += 1
+                raise LLMError(str(e)) from e
+            finally:
+                await chunks.aclose()
+
+    def report(self) -> dict:
+        return {
+            **self.stats,
+            "provider": LLM_PROVIDER,
+            "in_flight": len(self.in_flight),
+            "timeout": self.timeout,
+            "reply_cache": self.replies.report(),
+        }
+
+
+def _make_provider():
+    if LLM_PROVIDER == "stub":
+        return StubProvider(float(os.getenv("LLM_STUB_DELAY", 0.5)))
+    # 키는 만들 때 읽음 (import 순서와 상관없이 load_dotenv() 이후 값 사용)
+    return GeminiProvider(os.getenv("GEMINI_API_KEY"))
+
+
+llm_client = LLMClient(_make_provider(), LLM_TIMEOUT, LLM_MAX_CONCURRENCY)
@@ -1,35 +1,110 @@
 import shutil
 import os
 import uuid
-import requests
+import time
+import asyncio
+import re
+import io
+import json
+import wave
+import base64
+import httpx
+from contextlib import AsyncExitStack
 from sqlalchemy.orm import Session
-from sqlalchemy import or_
-from passlib.context import CryptContext
+from sqlalchemy import or_, inspect, text
+from dotenv import load_dotenv
+# .env는 아래 모듈들이 import 시점에 환경 변수(GEMINI_API_KEY 등)를 읽기 전에 불러와야 함
+load_dotenv()
 import models, schemas
-from database import engine, get_db
+import tts_cache
+import audio_upload
+import metrics
+from audio_transcode import transcoder
+import audio_transcode
+from ai_client import ai_client
+from admission import tts_admission, train_admission
+from training_jobs import training_runner, FINAL_STATUSES
+from database import engine, get_db, SessionLocal
 from datetime import datetime, timedelta
 from jose import JWTError, jwt
-from fastapi import FastAPI, Depends, HTTPException, status, UploadFile, File, Form
-from fastapi.responses import FileResponse
+from fastapi import FastAPI, Depends, HTTPException, status, UploadFile, File, Form, Request
+from fastapi.responses import FileResponse, StreamingResponse, PlainTextResponse
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
 from fastapi.staticfiles import StaticFiles
+from starlette.concurrency import run_in_threadpool
 from typing import Optional
-from dotenv import load_dotenv
-import google.generativeai as genai # [NEW] Gemini 연동
+from llm_client import llm_client, MODEL_FAST, MODEL_DEFAULT # [NEW] Gemini 연동 (공용 비동기 클라이언트)
+from conversation_memory import conversation_memory
+from auth_cache import Principal, principal_cache
+from password_hasher import password_hasher # [NEW] bcrypt는 별도 프로세스 풀에서
+import credit_ledger # [NEW] 조건부 UPDATE 한 번으로 잔액 확인 + 차감
+from platform_ledger import platform_ledger # [NEW] 수수료는 저널에 쌓고 주기적으로 admin 잔액에 합산
 
 # DB 테이블 생성
 models.Base.metadata.create_all(bind=engine)
 
+# [NEW] create_all은 이미 있는 테이블에 컬럼을 추가하지 않으므로, 새로 생긴 컬럼은 여기서 보충
+def _ensure_user_columns():
+    columns = {c["name"] for c in inspect(engine).get_columns("users")}
+    if "session_version" not in columns:
+        with engine.begin() as conn:
+            conn.execute(text("ALTER TABLE users ADD COLUMN session_version INTEGER DEFAULT 0"))
+
+_ensure_user_columns()
+
 app = FastAPI()
-load_dotenv()
+
+# [NEW] 요청별 상관 ID와 단계별 지연 시간 기록
+# X-Request-ID는 AI 서버 호출에도 그대로 전달되고, 응답에는 Server-Timing 헤더로 단계별 시간을 붙입니다.
+@app.middleware("http")
+async def correlate_and_time_requests(request: Request, call_next):
+    request_id = metrics.new_request_id(request.headers.get("X-Request-ID"))
+    timings = {}
+    metrics.request_id_var.set(request_id)
+    metrics.stage_timings_var.set(timings)
+    started = time.perf_counter()
+    response = await call_next(request)
+    route = request.scope.get("route")
+    metrics.REQUEST_SECONDS.observe(
+        (request.method, route.path if route else "unmatched", str(response.status_code)),
+        time.perf_counter() - started,
+    )
+    response.headers["X-Request-ID"] = request_id
+    if timings:
+        response.headers["Server-Timing"] = metrics.server_timing_header(timings)
+        print(f"[{request_id}] {request.method} {request.url.path} " + " ".join(f"{k}={v * 1000:.0f}ms" for k, v in timings.items()))
+    return response
+
+# [NEW] 음성 학습 워커 시작 (대기 중이던 작업도 다시 큐에 올림)
+@app.on_event("startup")
+async def start_training_runner():
+    await training_runner.start(render_demo=_internal_tts_process)
+    conversation_memory.start()  # [NEW] 대화 기억 주기적 저장
+    platform_ledger.start()      # [NEW] 수수료 저널 -> admin 잔액 주기적 합산
+    credit_ledger.hold_sweeper.start()  # [NEW] 오래된 크레딧 예약 환불
+
+# [NEW] AI 서버 풀 헬스 체크 시작 + 인기 목소리 순위를 AI 서버에 보내 미리 로드
+# (AI 서버가 늦게 떠도 백엔드 기동은 막지 않음)
+@app.on_event("startup")
+async def schedule_model_warmup():
+    ai_client.start_health_checks()
+    asyncio.create_task(push_model_warmup(retries=5))
+
+# [NEW] 앱 종료 시 학습 워커와 AI 서버 커넥션 풀 정리
+@app.on_event("shutdown")
+async def close_ai_client():
+    await training_runner.stop()
+    await conversation_memory.stop()
+    await platform_ledger.stop()
+    await credit_ledger.hold_sweeper.stop()
+    await ai_client.aclose()
+    transcoder.shutdown()
+    password_hasher.shutdown()
 
 # --- [설정] ---
 SECRET_KEY = os.getenv("SECRET_KEY")
 ALGORITHM = os.getenv("ALGORITHM")
 ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", 1440))
-GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
-if GEMINI_API_KEY:
-    genai.configure(api_key=GEMINI_API_KEY)
 
 # 경로 설정
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
@@ -37,13 +112,26 @@ STATIC_DIR = os.path.join(BASE_DIR, "static")
 VOICE_DIR = os.path.join(STATIC_DIR, "voices")    # 원본 목소리
 GEN_DIR = os.path.join(STATIC_DIR, "generated")   # 결과물
 SHARED_DIR = os.getenv("SHARED_DIR", "/shared")   # 도커 공유 폴더
+# [NEW] AI 서버가 합성 결과를 직접 써 주는 폴더 (GEN_DIR과 같은 마운트면 복사 없이 rename)
+# 다른 유저의 아직 안 가져간 음성이 URL로 노출되지 않도록 STATIC_DIR(/static) 밖에 두어야 함
+HANDOFF_DIR = os.getenv("HANDOFF_DIR", os.path.join(SHARED_DIR, "handoff"))
+if os.path.commonpath([os.path.abspath(HANDOFF_DIR), STATIC_DIR]) == STATIC_DIR:
+    raise RuntimeError(f"HANDOFF_DIR({HANDOFF_DIR})는 공개 폴더 {STATIC_DIR} 밖이어야 합니다.")
+TTS_HANDOFF = os.getenv("TTS_HANDOFF", "true").lower() == "true"
 
 os.makedirs(VOICE_DIR, exist_ok=True)
 os.makedirs(GEN_DIR, exist_ok=True)
 
+# [NEW] TTS 결과물 캐시 (같은 목소리/문장/옵션이면 재사용)
+TTS_CACHE_DIR = os.path.join(GEN_DIR, "cache")
+TTS_CACHE_MAX_BYTES = int(os.getenv("TTS_CACHE_MAX_BYTES", 2 * 1024 ** 3))
+tts_output_cache = tts_cache.TTSOutputCache(TTS_CACHE_DIR, TTS_CACHE_MAX_BYTES)
+
+# [NEW] 기동 시 AI 서버에 미리 올려둘 인기 목소리 수 (usage_count 순)
+WARMUP_MODEL_COUNT = int(os.getenv("WARMUP_MODEL_COUNT", 4))
+
 app.mount("/static", StaticFiles(directory="static"), name="static")
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="login")
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
 # --- [인증 로직] ---
 def create_access_token(data: dict, expires_delta: timedelta | None = None):
@@ -52,45 +140,81 @@ def create_access_token(data: dict, expires_delta: timedelta | None = None):
     to_encode.update({"exp": expire})
     return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
 
-def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
-    credentials_exception = HTTPException(
-        status_code=status.HTTP_401_UNAUTHORIZED,
-        detail="자격 증명 실패",
-        headers={"WWW-Authenticate": "Bearer"},
-    )
+# [NEW] 토큰에 넣을 클레임 (sv: 세션 버전, 올라가면 예전 토큰은 거절됨)
+def _token_claims(user: models.User) -> dict:
+    return {"sub": user.username, "role": user.role, "sv": user.session_version or 0}
+
+def _load_principal(username: str, session_version: int) -> Principal | None:
+    # 캐시에 없을 때만 DB 조회 (요청 세션과 별개로 짧게 열고 닫음)
+    principal = principal_cache.get(username, session_version)
+    if principal is not None:
+        return principal
+    with metrics.stage("auth_lookup"):
+        db = SessionLocal()
+        try:
+            user = db.query(models.User).filter(models.User.username == username).first()
+        finally:
+            db.close()
+    if user is None or (user.session_version or 0) != session_version:
+        return None
+    principal = Principal.from_user(user)
+    principal_cache.put(principal)
+    return principal
+
+def _decode_principal(token: str) -> Principal | None:
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        username: str = payload.get("sub")
-        if username is None: raise credentials_exception
     except JWTError:
-        raise credentials_exception
-    user = db.query(models.User).filter(models.User.username == username).first()
-    if user is None: raise credentials_exception
-    if user is None: raise credentials_exception
+        return None
+    username: str = payload.get("sub")
+    if username is None:
+        return None
+    return _load_principal(username, payload.get("sv", 0))
+
+# [NEW] 토큰의 사용자 id/role만 필요한 API용 (캐시 적중 시 DB 조회 없음)
+def get_current_principal(token: str = Depends(oauth2_scheme)) -> Principal:
+    principal = _decode_principal(token)
+    if principal is None:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="자격 증명 실패",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    return principal
+
+# [MOD] 잔액 등 사용자 행을 수정하는 API용 - 인증은 캐시로 하고, 행은 기본키로 한 번만 조회
+def get_current_user(principal: Principal = Depends(get_current_principal), db: Session = Depends(get_db)):
+    user = db.query(models.User).filter(models.User.id == principal.id).first()
+    if user is None:
+        principal_cache.invalidate(principal.username)
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="자격 증명 실패",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
     return user
 
 # [NEW] 선택적 인증 (로그인 안 해도 접근 가능, 하면 유저 정보 반환)
 oauth2_scheme_optional = OAuth2PasswordBearer(tokenUrl="token", auto_error=False)
 
-def get_current_user_optional(token: str = Depends(oauth2_scheme_optional), db: Session = Depends(get_db)):
+def get_current_user_optional(token: str = Depends(oauth2_scheme_optional)) -> Principal | None:
     if not token:
         return None
-    try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        username: str = payload.get("sub")
-        if username is None: return None
-    except JWTError:
-        return None
-    
-    user = db.query(models.User).filter(models.User.username == username).first()
-    return user
+    return _decode_principal(token)
 
 # 관리자 체크용 의존성
-def get_admin_user(current_user: models.User = Depends(get_current_user)):
+def get_admin_user(current_user: Principal = Depends(get_current_principal)):
     if current_user.role != "ADMIN":
         raise HTTPException(status_code=403, detail="관리자 권한이 필요합니다.")
     return current_user
 
+# [NEW] 권한 변경 - 세션 버전을 올려 기존 토큰(이전 권한이 담긴)을 무효화하고 캐시도 비움
+def change_user_role(db: Session, user: models.User, role: str):
+    user.role = role
+    user.session_version = (user.session_version or 0) + 1
+    db.commit()
+    principal_cache.invalidate(user.username)
+
 # =========================================================
 # 1. 회원가입 / 로그인 / 정보 조회
 # =========================================================
@@ -108,7 +232,7 @@ async def signup(
     # 1. 유저 먼저 생성 (ID 확보를 위해)
     new_user = models.User(
         username=username,
-        password=pwd_context.hash(password),
+        password=await password_hasher.hash(password),
         nickname=nickname,
         role="USER",
         credit_balance=1000, # 가입 축하금
@@ -144,13 +268,20 @@ async def signup(
     return new_user
 
 @app.post("/login", response_model=schemas.Token)
-def login(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
+async def login(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
     user = db.query(models.User).filter(models.User.username == form_data.username).first()
-    if not user or not pwd_context.verify(form_data.password, user.password):
+    if not user:
         raise HTTPException(status_code=401, detail="로그인 실패")
+    verified, new_hash = await password_hasher.verify(form_data.password, user.password)
+    if not verified:
+        raise HTTPException(status_code=401, detail="로그인 실패")
+    if new_hash:
+        # [NEW] 해시 cost 설정이 바뀌었으면 로그인한 김에 새 cost로 교체
+        user.password = new_hash
+        db.commit()
     
     token = create_access_token(
-        data={"sub": user.username, "role": user.role},
+        data=_token_claims(user),
         expires_delta=timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
     )
     return {"access_token": token, "token_type": "bearer"}
@@ -163,6 +294,23 @@ import random # [NEW]
 def read_users_me(current_user: models.User = Depends(get_current_user)):
     return current_user
 
+# [NEW] 권한 변경 (관리자 전용) - 대상 유저의 기존 토큰은 무효화되어 다시 로그인해야 함
+@app.put("/users/{user_id}/role", response_model=schemas.UserResponse)
+def update_user_role(
+    user_id: int,
+    update: schemas.RoleUpdate,
+    admin: Principal = Depends(get_admin_user),
+    db: Session = Depends(get_db)
+):
+    if update.role not in ("USER", "ADMIN"):
+        raise HTTPException(status_code=400, detail="권한은 USER 또는 ADMIN만 가능합니다.")
+    user = db.query(models.User).filter(models.User.id == user_id).first()
+    if not user:
+        raise HTTPException(status_code=404, detail="유저를 찾을 수 없습니다.")
+    if user.role != update.role:
+        change_user_role(db, user, update.role)
+    return user
+
 # [NEW] 유저 정보 수정 (프로필 사진 포함)
 @app.put("/users/me", response_model=schemas.UserUpdateResponse)
 async def update_users_me(
@@ -174,11 +322,12 @@ async def update_users_me(
     db: Session = Depends(get_db)
 ):
     is_username_changed = False
+    old_username = current_user.username
 
     # 1. 아이디(이메일) 변경 시 비밀번호 검증 및 중복 체크
     if username and username != current_user.username:
         # 비밀번호 확인
-        if not password or not pwd_context.verify(password, current_user.password):
+        if not password or not (await password_hasher.verify(password, current_user.password))[0]:
             raise HTTPException(status_code=401, detail="이메일 변경을 위해서는 현재 비밀번호 확인이 필요합니다.")
 
         existing = db.query(models.User).filter(models.User.username == username).first()
@@ -216,8 +365,9 @@ async def update_users_me(
     new_token = None
     token_type = None
     if is_username_changed:
+        principal_cache.invalidate(old_username) # [NEW] 예전 아이디로 캐시된 인증 정보 제거
         new_token = create_access_token(
-            data={"sub": current_user.username, "role": current_user.role},
+            data=_token_claims(current_user),
             expires_delta=timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
         )
         token_type = "bearer"
@@ -275,35 +425,18 @@ def play_rps_game(
         winnings = total_win - fee
         
         # 관리자에게 수수료 입금
-        if fee > 0:
-            system_admin = db.query(models.User).filter(models.User.username == "admin").first()
-            if system_admin:
-                system_admin.credit_balance += fee
-                db.add(models.CreditLog(
-                    user_id=system_admin.id,
-                    amount=fee,
-                    transaction_type="RPS_FEE_IN",
-                    description=f"RPS 수수료 (User {current_user.username})",
-                    reference_id=None
-                ))
+        platform_ledger.record(db, fee, "RPS_FEE_IN", f"RPS 수수료 (User {current_user.username})")
 
     else:
         result = "LOSE"
         winnings = -game_req.bet_amount # 배팅액만큼 차감 (100% 잃음)
 
-    # 3. 결과 반영
+    # 3. 결과 반영 (+ 로그 기록) - 그 사이 잔액이 판돈 밑으로 줄었으면 거절
     if result != "DRAW":
-        current_user.credit_balance += winnings
-        
-        # 로그 기록
-        log = models.CreditLog(
-            user_id=current_user.id,
-            amount=winnings,
-            transaction_type=f"RPS_{result}",
-            description=f"가위바위보: {user_choice} vs {server_choice}",
-            reference_id=None
-        )
-        db.add(log)
+        if not credit_ledger.settle_bet(db, current_user.id, game_req.bet_amount, winnings,
+                                        f"RPS_{result}", f"가위바위보: {user_choice} vs {server_choice}"):
+            db.rollback()
+            raise HTTPException(400, "크레딧이 부족합니다.")
         db.commit()
 
     return {
@@ -364,33 +497,16 @@ def play_oddeven_game(
         winnings = total_win - fee
         
         # 관리자에게 수수료 입금
-        if fee > 0:
-            system_admin = db.query(models.User).filter(models.User.username == "admin").first()
-            if system_admin:
-                system_admin.credit_balance += fee
-                db.add(models.CreditLog(
-                    user_id=system_admin.id,
-                    amount=fee,
-                    transaction_type="ODDEVEN_FEE_IN",
-                    description=f"홀짝 수수료 (User {current_user.username})",
-                    reference_id=None
-                ))
+        platform_ledger.record(db, fee, "ODDEVEN_FEE_IN", f"홀짝 수수료 (User {current_user.username})")
     else:
         result = "LOSE"
         winnings = -game_req.bet_amount # 배팅액만큼 차감
 
-    # 3. 결과 반영
-    current_user.credit_balance += winnings
-    
-    # 로그 기록
-    log = models.CreditLog(
-        user_id=current_user.id,
-        amount=winnings,
-        transaction_type=f"ODDEVEN_{result}",
-        description=f"홀짝: {user_choice} vs {server_result} ({random_num})",
-        reference_id=None
-    )
-    db.add(log)
+    # 3. 결과 반영 (+ 로그 기록)
+    if not credit_ledger.settle_bet(db, current_user.id, game_req.bet_amount, winnings,
+                                    f"ODDEVEN_{result}", f"홀짝: {user_choice} vs {server_result} ({random_num})"):
+        db.rollback()
+        raise HTTPException(400, "크레딧이 부족합니다.")
     db.commit()
 
     return {
@@ -506,36 +622,16 @@ def play_ladder_game(
         theory_payout = int(game_req.bet_amount * fair_odds)
         fee = theory_payout - payout
         
-        if fee > 0:
-            system_admin = db.query(models.User).filter(models.User.username == "admin").first()
-            if system_admin:
-                system_admin.credit_balance += fee
-                db.add(models.CreditLog(
-                    user_id=system_admin.id,
-                    amount=fee,
-                    transaction_type="LADDER_FEE_IN",
-                    description=f"사다리 수수료 (User {current_user.username}, {match_count} Combo)",
-                    reference_id=None
-                ))
+        platform_ledger.record(db, fee, "LADDER_FEE_IN", f"사다리 수수료 (User {current_user.username}, {match_count} Combo)")
     else:
         # 패배 시: 배팅액만큼 차감
         profit = -game_req.bet_amount
         
-    # 4. 결과 반영
-    current_user.credit_balance += profit
-    
-    # 0 미만 방지 (빚쟁이 방지)
-    if current_user.credit_balance < 0:
-        current_user.credit_balance = 0
-
-    # 로그
-    db.add(models.CreditLog(
-        user_id=current_user.id,
-        amount=profit,
-        transaction_type=f"LADDER_{result_status}",
-        description=f"사다리: {start_str}/{line_count}/{end_str} (Bet:{game_req.bet_amount})",
-        reference_id=None
-    ))
+    # 4. 결과 반영 (+ 로그) - 판돈만큼 잔액이 있을 때만 반영하므로 0 미만으로 내려가지 않음
+    if not credit_ledger.settle_bet(db, current_user.id, game_req.bet_amount, profit,
+                                    f"LADDER_{result_status}", f"사다리: {start_str}/{line_count}/{end_str} (Bet:{game_req.bet_amount})"):
+        db.rollback()
+        raise HTTPException(400, "크레딧이 부족합니다.")
     db.commit()
     
     return {
@@ -561,7 +657,7 @@ def play_ladder_game(
 def create_team(
     team: schemas.TeamCreate, 
     db: Session = Depends(get_db),
-    admin: models.User = Depends(get_admin_user)
+    admin: Principal = Depends(get_admin_user)
 ):
     new_team = models.Team(name=team.name, description=team.description)
     db.add(new_team)
@@ -573,7 +669,7 @@ def create_team(
 def create_match(
     match: schemas.MatchCreate, 
     db: Session = Depends(get_db),
-    admin: models.User = Depends(get_admin_user)
+    admin: Principal = Depends(get_admin_user)
 ):
     new_match = models.Match(
         title=match.title,
@@ -615,8 +711,10 @@ def vote_match(
         raise HTTPException(status_code=400, detail="해당 경기에 참여하는 팀이 아닙니다.")
 
     try:
-        # A. 돈 차감
-        current_user.credit_balance -= vote.bet_amount
+        # A. 돈 차감 (+ C. 로그 기록)
+        if not credit_ledger.debit(db, current_user.id, vote.bet_amount, "BET_ENTRY", f"경기 #{match.id} 투표", match.id):
+            db.rollback()
+            raise HTTPException(status_code=400, detail="크레딧이 부족합니다!")
 
         # B. 투표 기록
         new_vote = models.MatchVote(
@@ -628,19 +726,11 @@ def vote_match(
         )
         db.add(new_vote)
 
-        # C. 로그 기록
-        new_log = models.CreditLog(
-            user_id=current_user.id,
-            amount=-vote.bet_amount,
-            transaction_type="BET_ENTRY",
-            description=f"경기 #{match.id} 투표",
-            reference_id=match.id
-        )
-        db.add(new_log)
-
         db.commit()
         return {"msg": "투표 성공", "remaining_credit": current_user.credit_balance}
 
+    except HTTPException:
+        raise
     except Exception as e:
         db.rollback()
         raise HTTPException(status_code=500, detail=str(e))
@@ -650,7 +740,7 @@ def vote_match(
 def decide_match_result(
     data: schemas.MatchResultDecide, 
     db: Session = Depends(get_db),
-    admin: models.User = Depends(get_admin_user)
+    admin: Principal = Depends(get_admin_user)
 ):
     # 1. 경기 확인
     match = db.query(models.Match).filter(models.Match.id == data.match_id).first()
@@ -672,22 +762,8 @@ def decide_match_result(
         fee_amount = int(total_pot * FEE_PERCENT) # 관리자가 가져갈 돈
         prize_pot = total_pot - fee_amount        # 우승자들이 나눠가질 돈
         
-        # 'admin' 계정 찾기
-        system_admin = db.query(models.User).filter(models.User.username == "admin").first()
-        
-        if system_admin and fee_amount > 0:
-            system_admin.credit_balance += fee_amount
-            
-            # 관리자 수입 로그 기록
-            log_fee = models.CreditLog(
-                user_id=system_admin.id,
-                amount=fee_amount,
-                transaction_type="FEE_IN",
-                description=f"경기 #{match.id} 운영 수수료",
-                reference_id=match.id
-            )
-            db.add(log_fee)
-        else:
+        # 관리자 수입 기록 (admin 잔액에는 주기적으로 합산)
+        if not platform_ledger.record(db, fee_amount, "FEE_IN", f"경기 #{match.id} 운영 수수료", match.id):
             # admin 계정이 없으면 수수료 없이 전액 배당 (혹은 에러 처리)
             prize_pot = total_pot 
     else:
@@ -705,42 +781,20 @@ def decide_match_result(
             share_ratio = vote.bet_amount / winner_pot
             prize = int(share_ratio * prize_pot)
             
-            # 유저에게 입금
-            user = db.query(models.User).filter(models.User.id == vote.user_id).first()
-            user.credit_balance += prize
+            # 유저에게 입금 (+ 로그)
+            credit_ledger.credit(db, vote.user_id, prize, "BET_WIN", f"경기 #{match.id} 배당금", match.id)
             vote.result_status = "WON"
             
             # [NEW] 나눠준 돈 기록
             actual_distributed_amount += prize 
             
-            log = models.CreditLog(
-                user_id=user.id,
-                amount=prize,
-                transaction_type="BET_WIN",
-                description=f"경기 #{match.id} 배당금",
-                reference_id=match.id
-            )
-            db.add(log)
-            
     # --- [NEW] 자투리 돈(Dust) 처리 ---
     # (배당해야 할 총액) - (실제로 나눠준 돈) = 남은 찌꺼기 돈
     dust_amount = prize_pot - actual_distributed_amount
     
     if dust_amount > 0:
-        # admin 계정 다시 조회 (위에서 이미 조회했지만 명확성을 위해)
-        system_admin = db.query(models.User).filter(models.User.username == "admin").first()
-        if system_admin:
-            system_admin.credit_balance += dust_amount
-            
-            # 자투리 수입 로그
-            log_dust = models.CreditLog(
-                user_id=system_admin.id,
-                amount=dust_amount,
-                transaction_type="FEE_DUST",
-                description=f"경기 #{match.id} 자투리 정산",
-                reference_id=match.id
-            )
-            db.add(log_dust)
+        # 자투리 수입 기록
+        platform_ledger.record(db, dust_amount, "FEE_DUST", f"경기 #{match.id} 자투리 정산", match.id)
             
     # 5. 패배자 처리
     for vote in total_bets:
@@ -760,7 +814,7 @@ def decide_match_result(
 @app.get("/matches", response_model=list[schemas.MatchResponse])
 def list_matches(
     status: Optional[str] = None,
-    current_user: Optional[models.User] = Depends(get_current_user_optional), # [MOD] 선택적 유저
+    current_user: Optional[Principal] = Depends(get_current_user_optional), # [MOD] 선택적 유저
     db: Session = Depends(get_db)
 ):
     query = db.query(models.Match)
@@ -803,6 +857,8 @@ def list_matches(
 # =========================================================
 
 # 목소리 등록 (Fine-tuning 요청)
+# [MOD] 학습은 백그라운드 작업으로 처리하고 job_id를 바로 반환합니다.
+#       진행 상황은 /voice/train/jobs/{job_id} (폴링) 또는 .../events (SSE)로 확인
 @app.post("/voice/train")
 async def create_voice_model(
     name: str = Form(...),
@@ -811,97 +867,110 @@ async def create_voice_model(
     is_public: bool = Form(False),
     ref_text: str = Form(...),
     audio_file: UploadFile = File(...),
-    current_user: models.User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_principal),
     db: Session = Depends(get_db)
 ):
-    # ... (파일 저장 및 AI 요청 로직 생략, 위와 동일) ...
-    # 실제로는 diff가 너무 길어지므로 model 생성 부분만 대체합니다.
-    # 하지만 replace_file_content는 context가 필요하므로 전체 함수 헤더를 수정해야 함.
-    # 여기서는 "VoiceModel 객체 생성" 부분과 "함수 헤더"를 나눠서 수정하는게 나을듯 하지만
-    # 한 번에 하는게 안전함.
-
-    # 1. 파일 저장
+    # [NEW] 입장 제어: 학습 대기열이 가득 찼거나 이미 학습 중이면 업로드를 받기 전에 거절
+    pending_jobs = db.query(models.TrainingJob).filter(
+        models.TrainingJob.user_id == current_user.id,
+        models.TrainingJob.status.in_(["QUEUED", "RUNNING"])
+    ).count()
+    train_admission.check(training_runner.queue_depth(), pending_jobs)
+
+    # 1. 파일 저장 (AI 서버가 읽는 공유 폴더에 한 번만, 청크 단위로 기록 + 크기/길이/샘플레이트 검증)
     user_voice_dir = os.path.join(VOICE_DIR, str(current_user.id))
     os.makedirs(user_voice_dir, exist_ok=True)
 
     file_ext = os.path.splitext(audio_file.filename)[1] or ".wav"
     filename = f"{uuid.uuid4()}{file_ext}"
-    save_path = os.path.join(user_voice_dir, filename)
+    shared_path = os.path.join(SHARED_DIR, f"train_{filename}")
 
-    with open(save_path, "wb") as buffer:
-        shutil.copyfileobj(audio_file.file, buffer)
-        
     try:
-        # 2. AI 서버에 학습 요청
-        ai_url = "http://gpt-sovits:9880"
-        
-        shared_filename = f"train_{uuid.uuid4()}{file_ext}"
-        shared_path = os.path.join(SHARED_DIR, shared_filename)
-        shutil.copy(save_path, shared_path)
-
-        payload = {
-            "user_id": str(current_user.id),
-            "model_name": name,
-            "ref_audio_path": shared_path,
-            "ref_text": ref_text
-        }
-        
-        response = requests.post(f"{ai_url}/train_model", json=payload, timeout=600)
-        
-        if response.status_code != 200:
-            raise HTTPException(status_code=500, detail=f"AI 학습 실패: {response.text}")
-            
-        result = response.json()
-        model_path = result.get("model_path")
-        
-        if not model_path:
-            raise HTTPException(status_code=500, detail="AI 서버가 모델 경로를 반환하지 않았습니다.")
+        audio_info = await audio_upload.save_upload(audio_file, shared_path)
+    except audio_upload.UploadRejected as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
+    print(f"목소리 업로드 저장: {shared_path} ({audio_info})")
 
-        # 3. DB 저장
-        new_model = models.VoiceModel(
+    # 2. 원본 보관용 VOICE_DIR에는 복사 대신 하드링크 (다른 마운트면 공유 폴더 경로를 그대로 참조)
+    save_path = audio_upload.link_or_reference(shared_path, os.path.join(user_voice_dir, filename))
+
+    try:
+        # 3. 학습 작업 등록
+        job = models.TrainingJob(
             user_id=current_user.id,
             model_name=name,
             description=description,
             price=price, # [NEW]
-            model_path=model_path,
             is_public=is_public,
-            usage_count=0
+            ref_text=ref_text,
+            upload_path=save_path,
+            shared_path=shared_path,
+            status="QUEUED"
         )
-
-        db.add(new_model)
+        db.add(job)
         db.commit()
-        db.refresh(new_model)
-
-        # [NEW] 샘플 오디오 자동 생성 (비동기 처리 권장이지만 여기선 동기 처리)
-        try:
-            sample_text = "안녕하세요. 제 목소리를 들어보세요."
-            demo_url = _internal_tts_process(
-                text=sample_text,
-                voice_model_path=model_path,
-                user_id=current_user.id,
-                ref_audio_path=shared_path, # 학습 시 사용한 파일 재사용
-                prompt_text=ref_text        # 학습 시 사용한 텍스트 재사용
-            )
-            new_model.demo_audio_url = demo_url
-            db.commit()
-        except Exception as e:
-            print(f"샘플 생성 실패 (무시됨): {e}")
-            # 샘플 생성 실패해도 모델 생성은 성공으로 간주
-        
-        return {"msg": "목소리 모델 학습 완료", "model_id": new_model.id}
+        db.refresh(job)
 
-    except requests.exceptions.Timeout:
-         raise HTTPException(status_code=504, detail="AI 서버 응답 시간 초과 (학습이 너무 오래 걸립니다)")
     except Exception as e:
-        print(f"Error during training: {e}")
+        print(f"Error during training request: {e}")
         # 실패 시 업로드한 파일 삭제 (선택)
-        if os.path.exists(save_path): os.remove(save_path)
+        for path in {save_path, shared_path}:
+            if os.path.exists(path): os.remove(path)
         raise HTTPException(status_code=500, detail=str(e))
 
+    await training_runner.submit(job.id)
+    return {"msg": "목소리 학습 요청이 접수되었습니다.", "job_id": job.id, "status": job.status}
+
+def _get_my_training_job(job_id: int, current_user: Principal, db: Session) -> models.TrainingJob:
+    job = db.query(models.TrainingJob).filter(models.TrainingJob.id == job_id).first()
+    if not job or job.user_id != current_user.id:
+        raise HTTPException(status_code=404, detail="학습 작업을 찾을 수 없습니다.")
+    return job
+
+# [NEW] 학습 작업 상태 조회 (폴링용)
+@app.get("/voice/train/jobs/{job_id}", response_model=schemas.TrainingJobResponse)
+def get_training_job(
+    job_id: int,
+    current_user: Principal = Depends(get_current_principal),
+    db: Session = Depends(get_db)
+):
+    return _get_my_training_job(job_id, current_user, db)
+
+# [NEW] 학습 작업 상태 구독 (SSE) - 상태가 바뀔 때마다 이벤트 전송, 완료/실패 시 종료
+@app.get("/voice/train/jobs/{job_id}/events")
+async def stream_training_job(
+    job_id: int,
+    current_user: Principal = Depends(get_current_principal),
+    db: Session = Depends(get_db)
+):
+    _get_my_training_job(job_id, current_user, db)
+
+    def read_job():
+        session = SessionLocal()
+        try:
+            job = session.query(models.TrainingJob).filter(models.TrainingJob.id == job_id).first()
+            return schemas.TrainingJobResponse.from_orm(job)
+        finally:
+            session.close()
+
+    async def events():
+        last_status = None
+        while True:
+            job = await run_in_threadpool(read_job)
+            if job.status != last_status:
+                last_status = job.status
+                yield f"data: {job.json()}\n\n"
+            if job.status in FINAL_STATUSES:
+                break
+            # 상태 변경 알림을 기다리되, 다른 프로세스 변경도 잡도록 주기적으로 다시 읽음
+            await training_runner.wait_for_change(job_id, timeout=15)
+
+    return StreamingResponse(events(), media_type="text/event-stream")
+
 # 목소리 마켓 목록
 @app.get("/voice/list", response_model=list[schemas.VoiceModelResponse])
 async def list_available_voices(
-    current_user: models.User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_principal),
     db: Session = Depends(get_db)
 ):
     # 1. 공개된 모델만 조회 (내꺼라도 비공개면 안 보여줌)
@@ -972,46 +1041,21 @@ async def buy_voice_model(
 
     # 4. 결제 로직 (70% 판매자, 30% 수수료)
     try:
-        # 구매자 차감
-        current_user.credit_balance -= price
-        
-        # 로그: 구매
-        db.add(models.CreditLog(
-            user_id=current_user.id,
-            amount=-price,
-            transaction_type="BUY_MODEL",
-            description=f"모델 구매: {model.model_name}",
-            reference_id=model.id
-        ))
+        # 구매자 차감 (+ 로그: 구매)
+        if not credit_ledger.debit(db, current_user.id, price, "BUY_MODEL", f"모델 구매: {model.model_name}", model.id):
+            db.rollback()
+            raise HTTPException(400, "잔액이 부족합니다.")
 
         # 수익 계산
         creator_share = int(price * 0.70)
         fee_share = price - creator_share
 
         # 판매자 입금
-        creator = db.query(models.User).filter(models.User.id == model.user_id).first()
-        if creator:
-            creator.credit_balance += creator_share
-            db.add(models.CreditLog(
-                user_id=creator.id,
-                amount=creator_share,
-                transaction_type="SELL_MODEL",
-                description=f"모델 판매 수익: {model.model_name}",
-                reference_id=model.id
-            ))
+        credit_ledger.credit(db, model.user_id, creator_share, "SELL_MODEL", f"모델 판매 수익: {model.model_name}", model.id)
 
         # 관리자 수수료 입금
         if fee_share > 0:
-            system_admin = db.query(models.User).filter(models.User.username == "admin").first()
-            if system_admin:
-                system_admin.credit_balance += fee_share
-                db.add(models.CreditLog(
-                    user_id=system_admin.id,
-                    amount=fee_share,
-                    transaction_type="FEE_SELL_MODEL",
-                    description=f"모델 판매 수수료: {model.model_name}",
-                    reference_id=model.id
-                ))
+            platform_ledger.record(db, fee_share, "FEE_SELL_MODEL", f"모델 판매 수수료: {model.model_name}", model.id)
 
         # 5. 라이브러리에 추가
         saved = models.UserSavedVoice(user_id=current_user.id, voice_model_id=model_id)
@@ -1022,6 +1066,8 @@ async def buy_voice_model(
         
         return {"msg": f"모델을 구매했습니다. (가격: {price} 크레딧)"}
 
+    except HTTPException:
+        raise
     except Exception as e:
         db.rollback()
         raise HTTPException(500, f"결제 실패: {str(e)}")
@@ -1035,7 +1081,7 @@ async def buy_voice_model(
 async def update_voice_model_visibility(
     model_id: int,
     update_data: schemas.VoiceModelUpdate,
-    current_user: models.User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_principal),
     db: Session = Depends(get_db)
 ):
     # 1. 모델 조회
@@ -1057,7 +1103,7 @@ async def update_voice_model_visibility(
 @app.delete("/voice/save/{model_id}")
 async def unsave_voice_model(
     model_id: int,
-    current_user: models.User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_principal),
     db: Session = Depends(get_db)
 ):
     saved = db.query(models.UserSavedVoice).filter(
@@ -1099,7 +1145,7 @@ async def list_my_created_voices(
 # [NEW] 저장한 목록 조회 (내가 만든 것 제외)
 @app.get("/voice/saved_list", response_model=list[schemas.VoiceModelResponse])
 async def list_saved_voices_only(
-    current_user: models.User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_principal),
     db: Session = Depends(get_db)
 ):
     # UserSavedVoice 중 내가 만든 모델은 제외하고 조회
@@ -1126,18 +1172,10 @@ async def list_saved_voices_only(
     return results
 
 
-# TTS 생성 (비용 차감 + 수익 분배 로직 적용)
-@app.post("/tts/generate")
-async def generate_tts(
-    request: schemas.TTSRequest,
-    current_user: models.User = Depends(get_current_user),
-    db: Session = Depends(get_db)
-):
-    COST = 10           # [수정] 1회 생성 비용 10 (고정)
-    
-    # ... (모델, 권한, 학습 여부 확인 로직 동일 - 생략 불가하므로 반복)
+# [NEW] TTS 사용 가능 여부 확인 (모델 존재, 권한, 학습 여부) - 일반/스트리밍 생성 공용
+def _get_usable_voice_model(voice_model_id: int, current_user: models.User, db: Session) -> models.VoiceModel:
     # 1. 모델 확인
-    voice_model = db.query(models.VoiceModel).filter(models.VoiceModel.id == request.voice_model_id).first()
+    voice_model = db.query(models.VoiceModel).filter(models.VoiceModel.id == voice_model_id).first()
     if not voice_model:
         raise HTTPException(status_code=404, detail="모델이 없습니다.")
 
@@ -1155,66 +1193,202 @@ async def generate_tts(
     if not voice_model.model_path:
          raise HTTPException(status_code=400, detail="학습이 완료되지 않은 모델입니다.")
 
-    # 3. 잔액 확인
-    if current_user.credit_balance < COST:
-        raise HTTPException(status_code=400, detail="잔액 부족")
+    return voice_model
 
-    # --- [결제 및 정산 (트랜잭션)] ---
-    # 먼저 결제 처리를 하고, AI 생성을 시도합니다.
-    # 만약 AI 생성이 실패하면 롤백 여부를 고민해야 하지만, 여기선 단순화합니다.
-    
-    current_user.credit_balance -= COST
+# [NEW] TTS 결제 및 정산 (유저 차감 + 관리자 수익) - 커밋은 호출한 쪽에서, 잔액 부족이면 False
+# hold_id가 있으면 미리 잡아 둔 예약을 확정, 없으면 바로 차감
+def _apply_tts_charge(db: Session, current_user: models.User, voice_model: models.VoiceModel, cost: int, hold_id: int | None = None) -> bool:
+    description = f"TTS 생성 (모델: {voice_model.model_name})"
+    if hold_id is not None:
+        charged = credit_ledger.capture(db, hold_id, "TTS_USE", description, voice_model.id)
+    else:
+        charged = credit_ledger.debit(db, current_user.id, cost, "TTS_USE", description, voice_model.id)
+    if not charged:
+        return False
     voice_model.usage_count += 1
+
+    platform_ledger.record(db, cost, "FEE_TTS", f"TTS 수익 (User {current_user.username} -> Model {voice_model.id})", voice_model.id)
+    return True
+
+# TTS 생성 (비용 차감 + 수익 분배 로직 적용)
+@app.post("/tts/generate")
+async def generate_tts(
+    request: schemas.TTSRequest,
+    current_user: models.User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    COST = 10           # [수정] 1회 생성 비용 10 (고정)
     
-    log_use = models.CreditLog(
-        user_id=current_user.id,
-        amount=-COST,
-        transaction_type="TTS_USE",
-        description=f"TTS 생성 (모델: {voice_model.model_name})",
-        reference_id=voice_model.id
-    )
-    db.add(log_use)
+    # 1~2. 모델, 권한, 학습 여부 확인
+    with metrics.stage("db_checks"):
+        voice_model = _get_usable_voice_model(request.voice_model_id, current_user, db)
+    audio_format = _resolve_audio_format(request.audio_format)
 
-    system_admin = db.query(models.User).filter(models.User.username == "admin").first()
-    if system_admin:
-        system_admin.credit_balance += COST
-        log_admin = models.CreditLog(
-            user_id=system_admin.id,
-            amount=COST,
-            transaction_type="FEE_TTS",
-            description=f"TTS 수익 (User {current_user.username} -> Model {voice_model.id})",
-            reference_id=voice_model.id
-        )
-        db.add(log_admin)
+    # 3. 잔액 확인
+    if current_user.credit_balance < COST:
+        raise HTTPException(status_code=400, detail="잔액 부족")
 
-    # 내부 로직 호출
-    try:
-        audio_url = _internal_tts_process(
-            text=request.text, 
-            voice_model_path=voice_model.model_path, 
-            user_id=current_user.id
-        )
-    except Exception as e:
-        # 실패 시 롤백 (간단히 예외 던지기, 실제론 transaction rollback 필)
-        raise HTTPException(status_code=500, detail=f"AI 생성 실패: {str(e)}")
+    # [NEW] 필요한 값만 들고 요청 세션은 닫음 (AI 생성 중에는 DB 커넥션을 잡지 않음)
+    user_id = current_user.id
+    voice_model_id = voice_model.id
+    model_path = voice_model.model_path
+    db.close()
+
+    # [NEW] 입장 제어: 동시 처리/사용자별 한도를 넘으면 바로 429/503 (Retry-After)
+    async with tts_admission.slot(user_id):
+        # --- [결제 1단계: 예약] --- 잔액을 먼저 잡아 두고 바로 커밋
+        with metrics.stage("db_commit"):
+            hold_id = await run_in_threadpool(credit_ledger.hold, user_id, COST, "TTS", voice_model_id)
+        if hold_id is None:
+            raise HTTPException(status_code=400, detail="잔액 부족")
+
+        # 내부 로직 호출
+        try:
+            audio_url = await _internal_tts_process(
+                text=request.text, 
+                voice_model_path=model_path, 
+                user_id=user_id,
+                audio_format=audio_format
+            )
+        except HTTPException:
+            # 입장 제어/AI 서버 풀의 429/503 등은 상태 코드와 Retry-After를 그대로 전달 (예약은 환불)
+            await run_in_threadpool(credit_ledger.release, hold_id)
+            raise
+        except Exception as e:
+            # 실패 시 예약 취소 (환불)
+            await run_in_threadpool(credit_ledger.release, hold_id)
+            raise HTTPException(status_code=500, detail=f"AI 생성 실패: {str(e)}")
 
-    # 히스토리 저장
-    history = models.TTSHistory(
-        user_id=current_user.id,
-        voice_model_id=voice_model.id,
-        text_content=request.text,
-        audio_url=audio_url,
-        cost_credit=COST
-    )
-    db.add(history)
-    db.commit()
+    # --- [결제 2단계: 확정 + 정산 + 히스토리 저장] ---
+    with metrics.stage("db_commit"):
+        try:
+            remaining = await run_in_threadpool(_record_tts, user_id, voice_model_id, request.text, audio_url, COST, hold_id)
+        except Exception as e:
+            await run_in_threadpool(credit_ledger.release, hold_id)
+            raise HTTPException(status_code=500, detail=f"결제 실패: {str(e)}")
 
     return {
         "msg": "생성 성공",
         "audio_url": audio_url,
-        "remaining_credits": current_user.credit_balance
+        "remaining_credits": remaining
     }
 
+# [NEW] TTS 스트리밍 생성
+# AI 서버의 청크를 그대로 흘려보내 첫 음성부터 바로 재생되게 하고, 동시에 GEN_DIR에 파일로 저장(tee)합니다.
+# 저장될 파일 주소는 X-Audio-Url 헤더로 먼저 알려주고, 결제는 스트림 전에 예약해 두었다가 끝까지 성공했을 때만 확정합니다.
+@app.post("/tts/generate/stream")
+async def generate_tts_stream(
+    request: schemas.TTSRequest,
+    current_user: models.User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    COST = 10
+
+    with metrics.stage("db_checks"):
+        voice_model = _get_usable_voice_model(request.voice_model_id, current_user, db)
+
+    if current_user.credit_balance < COST:
+        raise HTTPException(status_code=400, detail="잔액 부족")
+
+    output_path, audio_url = _new_tts_output(current_user.id)
+
+    # [NEW] 캐시 히트면 스트리밍 없이 저장된 파일을 바로 내려줌 (결제/히스토리는 동일하게 기록)
+    # 스트리밍은 항상 WAV (청크 단위로 바로 재생 가능한 포맷)
+    cache_key = await _tts_cache_key(_tts_payload(request.text, voice_model.model_path), "wav")
+    if cache_key and tts_output_cache.link_into(cache_key, output_path):
+        if not await run_in_threadpool(_record_streamed_tts, current_user.id, voice_model.id, request.text, audio_url, COST):
+            os.remove(output_path)
+            raise HTTPException(status_code=400, detail="잔액 부족")
+        return FileResponse(output_path, media_type="audio/wav", headers={"X-Audio-Url": audio_url})
+
+    # 응답이 나가는 동안 요청 세션은 닫힐 수 있으므로 필요한 값만 들고 가고, 세션은 지금 닫습니다.
+    user_id = current_user.id
+    voice_model_id = voice_model.id
+    model_path = voice_model.model_path
+    text = request.text
+    db.close()
+
+    # [NEW] 결제 1단계: 스트림을 열기 전에 잔액 예약 (끝까지 보내면 확정, 아니면 환불)
+    with metrics.stage("db_commit"):
+        hold_id = await run_in_threadpool(credit_ledger.hold, user_id, COST, "TTS", voice_model_id)
+    if hold_id is None:
+        raise HTTPException(status_code=400, detail="잔액 부족")
+
+    # [NEW] 입장 제어 (자리는 스트림이 끝날 때 반납)
+    try:
+        admitted_at = await tts_admission.acquire(user_id)
+    except HTTPException:
+        await run_in_threadpool(credit_ledger.release, hold_id)
+        raise
+
+    # 스트림은 응답이 끝날 때까지 열어 두어야 하므로 직접 닫습니다.
+    stream_ctx = AsyncExitStack()
+    stream_ctx.callback(tts_admission.release, user_id, admitted_at)
+    try:
+        # 첫 응답(헤더)까지의 시간
+        with metrics.stage("ai_http"):
+            ai_response = await stream_ctx.enter_async_context(
+                ai_client.stream("/tts", _tts_payload(text, model_path, streaming_mode=True))
+            )
+    except Exception as e:
+        await stream_ctx.aclose()
+        await run_in_threadpool(credit_ledger.release, hold_id)
+        raise HTTPException(status_code=500, detail=f"AI 생성 실패: {str(e)}")
+
+    async def relay():
+        completed = False
+        try:
+            with open(output_path, "wb") as f:
+                async for chunk in ai_response.aiter_bytes():
+                    if not chunk:
+                        continue
+                    f.write(chunk)
+                    yield chunk
+            _finalize_wav_header(output_path)
+            if cache_key:
+                tts_output_cache.store(cache_key, output_path)
+            completed = True
+        finally:
+            await stream_ctx.aclose()
+            # 결제 2단계: 끝까지 보냈으면 예약 확정, 중간에 끊기거나 실패했으면 환불
+            if not (completed and await run_in_threadpool(_record_streamed_tts, user_id, voice_model_id, text, audio_url, COST, hold_id)):
+                await run_in_threadpool(credit_ledger.release, hold_id)
+            if not completed and os.path.exists(output_path):
+                os.remove(output_path)
+
+    return StreamingResponse(relay(), media_type="audio/wav", headers={"X-Audio-Url": audio_url})
+
+# [NEW] TTS 결제(또는 예약 확정) + 히스토리를 짧은 세션 하나로 기록하고 남은 잔액 반환
+def _record_tts(user_id: int, voice_model_id: int, text: str, audio_url: str, cost: int, hold_id: int | None = None) -> int:
+    db = SessionLocal()
+    try:
+        user = db.query(models.User).filter(models.User.id == user_id).first()
+        voice_model = db.query(models.VoiceModel).filter(models.VoiceModel.id == voice_model_id).first()
+        if not _apply_tts_charge(db, user, voice_model, cost, hold_id):
+            raise Exception("잔액 부족")
+        db.add(models.TTSHistory(
+            user_id=user_id,
+            voice_model_id=voice_model_id,
+            text_content=text,
+            audio_url=audio_url,
+            cost_credit=cost
+        ))
+        db.commit()
+        return user.credit_balance
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+def _record_streamed_tts(user_id: int, voice_model_id: int, text: str, audio_url: str, cost: int, hold_id: int | None = None) -> bool:
+    try:
+        _record_tts(user_id, voice_model_id, text, audio_url, cost, hold_id)
+        return True
+    except Exception as e:
+        print(f"스트리밍 TTS 기록 실패: {e}")
+        return False
+
 # [NEW] 텍스트 채팅만 (빠른 응답용, 무료)
 @app.post("/chat/text", response_model=schemas.ChatTextResponse)
 async def chat_text_only(
@@ -1228,15 +1402,16 @@ async def chat_text_only(
         raise HTTPException(status_code=404, detail="보이스 모델을 찾을 수 없습니다.")
 
     # 2. Gemini에게 답변 받기
-    if not GEMINI_API_KEY:
+    if not llm_client.available():
          raise HTTPException(status_code=500, detail="서버에 Gemini API 키가 설정되지 않았습니다.")
     
     try:
-        model = genai.GenerativeModel('gemini-2.5-flash-lite')
-        prompt = f"당신은 '{voice_model.model_name}'라는 캐릭터입니다. 캐릭터의 말투를 사용하여 사용자의 말에 대해 50자 이내로 짧고 자연스럽게 한국어로 대답해주세요.\n사용자: {request.text}"
+        # [NEW] 이전 대화 기억 (요약 + 최근 대화, 토큰 예산 안으로)
+        memory = await conversation_memory.context(current_user.id, voice_model.id, voice_model.model_name)
+        prompt = f"당신은 '{voice_model.model_name}'라는 캐릭터입니다. 캐릭터의 말투를 사용하여 사용자의 말에 대해 50자 이내로 짧고 자연스럽게 한국어로 대답해주세요.\n{_memory_block(memory)}사용자: {request.text}"
         
-        response = model.generate_content(prompt)
-        reply_text = response.text
+        with metrics.stage("llm"):
+            reply_text = await llm_client.chat(voice_model.model_name, request.text, prompt, MODEL_FAST, has_context=bool(memory))
     except Exception as e:
         print(f"Gemini Error: {e}")
         raise HTTPException(status_code=500, detail=f"Gemini 오류: {str(e)}")
@@ -1253,6 +1428,7 @@ async def chat_text_only(
     )
     db.add(log_use)
     db.commit()
+    await conversation_memory.add_exchange(current_user.id, voice_model.id, request.text, reply_text)
 
     return {
         "reply_text": reply_text,
@@ -1260,15 +1436,14 @@ async def chat_text_only(
     }
 
 # [NEW] 내부 전용 TTS 처리 함수 (채팅에서도 쓰려고 분리)
-# [NEW] 내부 전용 TTS 처리 함수 (채팅에서도 쓰려고 분리)
-def _internal_tts_process(
+def _tts_payload(
     text: str, 
     voice_model_path: str, 
-    user_id: int, 
     ref_audio_path: str = None, 
-    prompt_text: str = ""
-) -> str:
-    payload = {
+    prompt_text: str = "",
+    streaming_mode: bool = False
+) -> dict:
+    return {
         "text": text,
         "text_lang": "ko",
         "model_path": voice_model_path,
@@ -1276,24 +1451,138 @@ def _internal_tts_process(
         "prompt_text": prompt_text,       # [NEW]
         "prompt_lang": "ko",
         "text_split_method": "cut5",
-        "speed_factor": 1.0
+        "speed_factor": 1.0,
+        "streaming_mode": streaming_mode
     }
-    ai_url = "http://gpt-sovits:9880"
-    response = requests.post(f"{ai_url}/tts", json=payload)
-    
-    if response.status_code != 200:
-        raise Exception(f"AI Server Error: {response.text}")
 
+# [NEW] 요청별 출력 포맷 확인 (없으면 배포 기본값 AUDIO_FORMAT)
+def _resolve_audio_format(audio_format: Optional[str]) -> str:
+    try:
+        return audio_transcode.resolve_format(audio_format)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+# [NEW] 생성 결과 파일 경로와 URL 발급
+def _new_tts_output(user_id: int, ext: str = ".wav") -> tuple[str, str]:
     user_gen_dir = os.path.join(GEN_DIR, str(user_id))
     os.makedirs(user_gen_dir, exist_ok=True)
     
-    output_filename = f"tts_{uuid.uuid4()}.wav"
+    output_filename = f"tts_{uuid.uuid4()}{ext}"
     output_path = os.path.join(user_gen_dir, output_filename)
+    return output_path, f"/static/generated/{user_id}/{output_filename}"
 
-    with open(output_path, "wb") as f:
-        f.write(response.content)
+async def _internal_tts_process(
+    text: str, 
+    voice_model_path: str, 
+    user_id: int, 
+    ref_audio_path: str = None, 
+    prompt_text: str = "",
+    audio_format: str = None
+) -> str:
+    audio_format = audio_transcode.resolve_format(audio_format)
+    payload = _tts_payload(text, voice_model_path, ref_audio_path, prompt_text)
+    output_path, audio_url = _new_tts_output(user_id, audio_transcode.extension(audio_format))
+
+    # [NEW] 이미 같은 목소리로 같은 문장을 만든 적이 있으면 캐시에서 링크만 걸고 끝
+    with metrics.stage("cache_lookup"):
+        cache_key = await _tts_cache_key(payload, audio_format)
+        if cache_key and tts_output_cache.link_into(cache_key, output_path):
+            return audio_url
+
+    # [NEW] 압축 포맷이면 WAV를 임시로 저장한 뒤 프로세스 풀에서 변환 (audio_url은 압축 파일)
+    wav_path = output_path if audio_format == "wav" else _new_tts_output(user_id)[0]
+    if TTS_HANDOFF:
+        # [NEW] 오디오 바이트는 HTTP로 받지 않고, AI 서버가 공유 폴더에 쓴 파일을 옮겨 옴
+        with metrics.stage("ai_http"):
+            response = await ai_client.post("/tts", {**payload, "handoff": True})
+        with metrics.stage("file_write"):
+            _adopt_handoff_file(response.json()["filename"], wav_path)
+    else:
+        with metrics.stage("ai_http"):
+            response = await ai_client.post("/tts", payload)
+        with metrics.stage("file_write"):
+            with open(wav_path, "wb") as f:
+                f.write(response.content)
+    # [NEW] AI 서버의 단계별 시간도 같은 요청 기록에 합침
+    metrics.merge_server_timing(response.headers.get("Server-Timing"))
+    if audio_format != "wav":
+        with metrics.stage("transcode"):
+            await transcoder.transcode(wav_path, output_path, audio_format)
+
+    if cache_key:
+        tts_output_cache.store(cache_key, output_path)
         
-    return f"/static/generated/{user_id}/{output_filename}"
+    return audio_url
+
+# [NEW] 공유 폴더의 합성 결과를 결과물 위치로 이동 (같은 마운트면 rename, 아니면 스트리밍 복사)
+def _adopt_handoff_file(filename: str, dest_path: str):
+    src_path = os.path.join(HANDOFF_DIR, os.path.basename(filename))
+    try:
+        os.replace(src_path, dest_path)
+    except OSError:
+        # 다른 마운트(EXDEV) - 메모리에 올리지 않고 청크 단위로 복사
+        shutil.copyfile(src_path, dest_path)
+        os.remove(src_path)
+
+# [NEW] 체크포인트 버전 조회 (재학습/핀 변경 시 캐시가 자동으로 갈리도록 캐시 키에 포함)
+# AI 서버 왕복을 줄이려고 짧게(30초) 기억해 둡니다.
+CHECKPOINT_VERSION_TTL = 30
+_checkpoint_versions = {}  # model_path -> (조회 시각, version)
+
+async def _get_checkpoint_version(voice_model_path: str) -> Optional[str]:
+    cached = _checkpoint_versions.get(voice_model_path)
+    if cached and time.monotonic() - cached[0] < CHECKPOINT_VERSION_TTL:
+        return cached[1]
+    try:
+        manifest = await ai_client.get_json("/models/manifest", params={"model_path": voice_model_path})
+        version = manifest["version"]
+    except Exception as e:
+        print(f"체크포인트 버전 조회 실패 (캐시 건너뜀): {e}")
+        return None
+    _checkpoint_versions[voice_model_path] = (time.monotonic(), version)
+    return version
+
+async def _tts_cache_key(payload: dict, audio_format: str) -> Optional[str]:
+    version = await _get_checkpoint_version(payload["model_path"])
+    if version is None:
+        return None
+    params = {k: payload[k] for k in ("text_lang", "text_split_method", "speed_factor", "prompt_lang", "prompt_text", "ref_audio_path")}
+    params["audio_format"] = audio_format
+    return tts_cache.make_key(payload["model_path"], version, payload["text"], params)
+
+# [NEW] 스트리밍 WAV 헤더는 길이를 모른 채 나가므로, 저장이 끝난 뒤 RIFF/data 크기를 채워 넣습니다.
+def _finalize_wav_header(path: str):
+    size = os.path.getsize(path)
+    with open(path, "r+b") as f:
+        header = f.read(44)
+        if len(header) < 44 or header[:4] != b"RIFF" or header[36:40] != b"data":
+            return
+        f.seek(4)
+        f.write((size - 8).to_bytes(4, "little"))
+        f.seek(40)
+        f.write((size - 44).to_bytes(4, "little"))
+
+def _memory_block(memory: str) -> str:
+    return f"{memory}\n" if memory else ""
+
+def _chat_prompt(model_name: str, text: str, memory: str = "") -> str:
+    return f"당신은 '{model_name}'라는 캐릭터입니다. 사용자의 말에 대해 50자 이내로 짧고 자연스럽게 한국어로 대답해주세요.\n{_memory_block(memory)}사용자: {text}"
+
+# [NEW] 대화 결제 및 정산 (유저 차감 + 관리자 수익) - 커밋은 호출한 쪽에서, 잔액 부족이면 False
+# hold_id가 있으면 미리 잡아 둔 예약을 확정, 없으면 바로 차감
+def _apply_chat_charge(db: Session, current_user: models.User, voice_model: models.VoiceModel, cost: int, hold_id: int | None = None) -> bool:
+    description = f"AI 대화 (모델: {voice_model.model_name})"
+    if hold_id is not None:
+        charged = credit_ledger.capture(db, hold_id, "CHAT_USE", description, voice_model.id)
+    else:
+        charged = credit_ledger.debit(db, current_user.id, cost, "CHAT_USE", description, voice_model.id)
+    if not charged:
+        return False
+    voice_model.usage_count += 1
+
+    # 관리자 수익
+    platform_ledger.record(db, cost, "FEE_CHAT", "대화 수익", voice_model.id)
+    return True
 
 # [NEW] Gemini Chat + TTS 통합 엔드포인트
 @app.post("/chat/voice", response_model=schemas.ChatResponse)
@@ -1312,96 +1601,398 @@ async def chat_with_voice(
     if not voice_model.model_path:
         raise HTTPException(status_code=400, detail="학습되지 않은 모델입니다.")
 
+    audio_format = _resolve_audio_format(request.audio_format)
+
     # 2. 잔액 확인
     if current_user.credit_balance < COST:
         raise HTTPException(status_code=400, detail="크래딧이 부족합니다.")
 
     # 3. Gemini에게 답변 받기
-    if not GEMINI_API_KEY:
+    if not llm_client.available():
          raise HTTPException(status_code=500, detail="서버에 Gemini API 키가 설정되지 않았습니다.")
+
+    # [NEW] 필요한 값만 들고 요청 세션은 닫음 (LLM/음성 합성 중에는 DB 커넥션을 잡지 않음)
+    user_id = current_user.id
+    voice_model_id = voice_model.id
+    model_path = voice_model.model_path
+    persona = voice_model.model_name
+    db.close()
+
+    # [NEW] 결제 1단계: 잔액 예약 (바로 커밋, 실패하면 아래에서 환불)
+    hold_id = await run_in_threadpool(credit_ledger.hold, user_id, COST, "CHAT", voice_model_id)
+    if hold_id is None:
+        raise HTTPException(status_code=400, detail="크래딧이 부족합니다.")
     
     try:
-        model = genai.GenerativeModel('gemini-2.5-flash')
-        # 간단한 프롬프트 설정
-        prompt = f"당신은 '{voice_model.model_name}'라는 캐릭터입니다. 사용자의 말에 대해 50자 이내로 짧고 자연스럽게 한국어로 대답해주세요.\n사용자: {request.text}"
+        # 간단한 프롬프트 설정 (+ [NEW] 이전 대화 기억)
+        memory = await conversation_memory.context(user_id, voice_model_id, persona)
+        prompt = _chat_prompt(persona, request.text, memory)
         
-        response = model.generate_content(prompt)
-        reply_text = response.text
+        with metrics.stage("llm"):
+            reply_text = await llm_client.chat(persona, request.text, prompt, MODEL_DEFAULT, has_context=bool(memory))
     except Exception as e:
         print(f"Gemini Error: {e}")
+        await run_in_threadpool(credit_ledger.release, hold_id)
         # 실패 시 봇의 기본 응답으로 대체할 수도 있음
         raise HTTPException(status_code=500, detail=f"Gemini 오류: {str(e)}")
 
-    # 4. 결제 처리 (성공 시 차감)
-    current_user.credit_balance -= COST
-    voice_model.usage_count += 1
-    
-    log_use = models.CreditLog(
-        user_id=current_user.id,
-        amount=-COST,
-        transaction_type="CHAT_USE",
-        description=f"AI 대화 (모델: {voice_model.model_name})",
-        reference_id=voice_model.id
-    )
-    db.add(log_use)
-
-    # 관리자 수익
-    system_admin = db.query(models.User).filter(models.User.username == "admin").first()
-    if system_admin:
-        system_admin.credit_balance += COST
-        log_admin = models.CreditLog(
-            user_id=system_admin.id,
-            amount=COST,
-            transaction_type="FEE_CHAT",
-            description=f"대화 수익",
-            reference_id=voice_model.id
-        )
-        db.add(log_admin)
-
-    # 5. 응답 텍스트를 오디오로 변환
+    # 4. 응답 텍스트를 오디오로 변환
+    # [NEW] 입장 제어: 한도를 넘으면 429/503 (예약은 환불)
     try:
-        audio_url = _internal_tts_process(
-            text=reply_text,
-            voice_model_path=voice_model.model_path,
-            user_id=current_user.id
-        )
+        async with tts_admission.slot(user_id):
+            audio_url = await _internal_tts_process(
+                text=reply_text,
+                voice_model_path=model_path,
+                user_id=user_id,
+                audio_format=audio_format
+            )
+    except HTTPException:
+        await run_in_threadpool(credit_ledger.release, hold_id)
+        raise
     except Exception as e:
-        db.rollback() # TTS 실패 시 돈 돌려주기 위해 롤백
+        await run_in_threadpool(credit_ledger.release, hold_id) # TTS 실패 시 돈 돌려주기
         raise HTTPException(status_code=500, detail=f"음성 합성 실패: {str(e)}")
 
-    # 히스토리 저장 (Chat 타입으로 따로 저장할 수도 있지만, 우선 TTS 히스토리에 남김)
-    history = models.TTSHistory(
-        user_id=current_user.id,
-        voice_model_id=voice_model.id,
-        text_content=f"[Q] {request.text} -> [A] {reply_text}",
-        audio_url=audio_url,
-        cost_credit=COST
-    )
-    db.add(history)
-    db.commit()
+    # 5. 결제 2단계: 예약 확정 + 히스토리 저장 (Chat 타입으로 따로 저장할 수도 있지만, 우선 TTS 히스토리에 남김)
+    try:
+        remaining = await run_in_threadpool(_record_chat, user_id, voice_model_id, request.text, reply_text, audio_url, COST, hold_id)
+    except Exception as e:
+        await run_in_threadpool(credit_ledger.release, hold_id)
+        raise HTTPException(status_code=500, detail=f"결제 실패: {str(e)}")
+    await conversation_memory.add_exchange(user_id, voice_model_id, request.text, reply_text)
 
     return {
         "reply_text": reply_text,
         "audio_url": audio_url,
-        "remaining_credits": current_user.credit_balance
+        "remaining_credits": remaining
     }
 
 
+# [NEW] 파이프라인 대화: Gemini 답변을 스트리밍으로 받으면서 문장이 끝날 때마다 바로 음성 합성
+# 응답은 SSE(text/event-stream)로 보냄
+#   {"type": "text", "index", "text"}            문장이 완성되는 즉시
+#   {"type": "audio", "index", "audio"(base64 WAV)} 해당 문장 합성이 끝나면 (index 순서대로)
+#   {"type": "done", "reply_text", "audio_url", "remaining_credits"}  합친 음성을 저장하고 결제/히스토리 기록 후
+#   {"type": "error", "detail"}                  실패 시 (예약한 크레딧은 환불)
+# 지연 시간이 "LLM 전체 + TTS 전체" 대신 "첫 문장까지의 LLM + 첫 문장 TTS"가 됩니다.
+_SENTENCE_END = re.compile(r"[.!?。！？…~]+[\"')\]]*(?=\s)|\n+")
+MIN_SENTENCE_CHARS = 4  # 이보다 짧은 조각은 다음 문장과 합쳐서 합성
+
+def _cut_sentences(buffer: str) -> tuple[list[str], str]:
+    """buffer에서 끝난 문장들을 잘라내고 (문장 목록, 남은 조각) 반환"""
+    sentences = []
+    start = 0
+    for match in _SENTENCE_END.finditer(buffer):
+        sentence = buffer[start:match.end()].strip()
+        if len(sentence) >= MIN_SENTENCE_CHARS:
+            sentences.append(sentence)
+            start = match.end()
+    return sentences, buffer[start:]
+
+async def _single_chunk(text: str):
+    yield text
+
+def _concat_wavs(segments: list[bytes], dest_path: str):
+    with wave.open(dest_path, "wb") as out:
+        for i, segment in enumerate(segments):
+            with wave.open(io.BytesIO(segment)) as w:
+                if i == 0:
+                    out.setparams(w.getparams())
+                out.writeframes(w.readframes(w.getnframes()))
+
+def _record_chat(user_id: int, voice_model_id: int, question: str, reply_text: str, audio_url: str, cost: int, hold_id: int | None = None) -> int:
+    db = SessionLocal()
+    try:
+        user = db.query(models.User).filter(models.User.id == user_id).first()
+        voice_model = db.query(models.VoiceModel).filter(models.VoiceModel.id == voice_model_id).first()
+        if not _apply_chat_charge(db, user, voice_model, cost, hold_id):
+            raise Exception("크래딧이 부족합니다.")
+        db.add(models.TTSHistory(
+            user_id=user_id,
+            voice_model_id=voice_model_id,
+            text_content=f"[Q] {question} -> [A] {reply_text}",
+            audio_url=audio_url,
+            cost_credit=cost
+        ))
+        db.commit()
+        return user.credit_balance
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+@app.post("/chat/voice/stream")
+async def chat_with_voice_stream(
+    request: schemas.ChatRequest,
+    current_user: models.User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    COST = 10
+
+    with metrics.stage("db_checks"):
+        voice_model = db.query(models.VoiceModel).filter(models.VoiceModel.id == request.voice_model_id).first()
+    if not voice_model:
+        raise HTTPException(status_code=404, detail="보이스 모델을 찾을 수 없습니다.")
+    if not voice_model.model_path:
+        raise HTTPException(status_code=400, detail="학습되지 않은 모델입니다.")
+    audio_format = _resolve_audio_format(request.audio_format)
+    if current_user.credit_balance < COST:
+        raise HTTPException(status_code=400, detail="크래딧이 부족합니다.")
+    if not llm_client.available():
+        raise HTTPException(status_code=500, detail="서버에 Gemini API 키가 설정되지 않았습니다.")
+
+    # 응답이 나가는 동안 요청 세션은 닫힐 수 있으므로 필요한 값만 들고 가고, 세션은 지금 닫습니다.
+    # (LLM + 합성 스트림 내내 DB 커넥션을 잡지 않음)
+    user_id = current_user.id
+    voice_model_id = voice_model.id
+    model_path = voice_model.model_path
+    persona = voice_model.model_name
+    question = request.text
+    db.close()
+
+    memory = await conversation_memory.context(user_id, voice_model_id, persona)
+    prompt = _chat_prompt(persona, question, memory)
+
+    # [NEW] 결제 1단계: 음성을 보내기 전에 잔액 예약 (끝까지 성공하면 확정, 아니면 환불)
+    # 예약과 입장 제어 자리는 stream()의 finally에서 정리하므로, 그 전에 실패할 수 있는 준비(대화 기억 로드 등)를 모두 끝낸 뒤 잡습니다.
+    with metrics.stage("db_commit"):
+        hold_id = await run_in_threadpool(credit_ledger.hold, user_id, COST, "CHAT", voice_model_id)
+    if hold_id is None:
+        raise HTTPException(status_code=400, detail="크래딧이 부족합니다.")
+    try:
+        admitted_at = await tts_admission.acquire(user_id)
+    except HTTPException:
+        await run_in_threadpool(credit_ledger.release, hold_id)
+        raise
+
+    events = asyncio.Queue()
+    completed = False
+
+    # 문장 합성은 _internal_tts_process를 거치지 않고 /tts를 바로 호출합니다.
+    # - 문장 음성은 base64로 SSE에 실어 보내고 마지막에 이어 붙여야 하므로 바이트가 어차피 메모리에 있어야 함
+    #   (handoff는 바이트를 HTTP로 받지 않으려는 것이라 여기선 이득이 없음)
+    # - 결과물 캐시(tts_output_cache)는 요청 전체 = 파일 하나 단위라 문장 조각과 맞지 않음.
+    #   문장 단위 재사용은 AI 서버의 문장 캐시(sentence_cache)가 /tts 안에서 처리
+    async def synthesize(index: int, sentence: str, previous: asyncio.Task | None) -> bytes:
+        response = await ai_client.post("/tts", _tts_payload(sentence, model_path))
+        if previous is not None:
+            await previous  # 오디오 이벤트는 문장 순서대로
+        events.put_nowait({"type": "audio", "index": index, "audio": base64.b64encode(response.content).decode("ascii")})
+        return response.content
+
+    async def pipeline():
+        nonlocal completed
+        tasks = []
+        reply_parts = []
+
+        def start(sentence: str):
+            index = len(tasks)
+            reply_parts.append(sentence)
+            events.put_nowait({"type": "text", "index": index, "text": sentence})
+            tasks.append(asyncio.create_task(synthesize(index, sentence, tasks[-1] if tasks else None)))
+
+        try:
+            # [NEW] 캐시된 답변이 있으면 LLM 없이 바로 문장 단위로 합성 시작
+            # (대화 기억이 있으면 짧은 인사 등만 캐시에서 읽고, 저장은 기억 없이 만든 답변만 - llm_client.chat과 같은 규칙)
+            reply_key = llm_client.replies.key(persona, MODEL_DEFAULT, question, has_context=bool(memory))
+            cached_reply = llm_client.replies.get(reply_key) if reply_key else None
+            with metrics.stage("llm"):
+                buffer = ""
+                chunks = _single_chunk(cached_reply) if cached_reply else llm_client.stream(prompt, MODEL_DEFAULT)
+                async for chunk in chunks:
+                    buffer += chunk
+                    sentences, buffer = _cut_sentences(buffer)
+                    for sentence in sentences:
+                        start(sentence)
+                if buffer.strip():
+                    start(buffer.strip())
+            if reply_key and not memory and not cached_reply and reply_parts:
+                llm_client.replies.put(reply_key, " ".join(reply_parts))
+            if not tasks:
+                raise Exception("빈 답변")
+
+            with metrics.stage("tts_pipeline"):
+                segments = await asyncio.gather(*tasks)
+
+            # 합친 음성을 한 파일로 저장 (압축 포맷이면 변환)
+            output_path, audio_url = _new_tts_output(user_id, audio_transcode.extension(audio_format))
+            wav_path = output_path if audio_format == "wav" else _new_tts_output(user_id)[0]
+            with metrics.stage("file_write"):
+                await run_in_threadpool(_concat_wavs, segments, wav_path)
+            if audio_format != "wav":
+                with metrics.stage("transcode"):
+                    await transcoder.transcode(wav_path, output_path, audio_format)
+
+            reply_text = " ".join(reply_parts)
+            # 결제 2단계: 예약 확정 + 히스토리
+            remaining = await run_in_threadpool(_record_chat, user_id, voice_model_id, question, reply_text, audio_url, COST, hold_id)
+            completed = True
+            await conversation_memory.add_exchange(user_id, voice_model_id, question, reply_text)
+            events.put_nowait({"type": "done", "reply_text": reply_text, "audio_url": audio_url, "remaining_credits": remaining})
+        except Exception as e:
+            print(f"파이프라인 대화 실패: {e}")
+            if not completed:
+                await run_in_threadpool(credit_ledger.release, hold_id)
+            events.put_nowait({"type": "error", "detail": str(e)})
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            events.put_nowait(None)
+
+    async def stream():
+        worker = asyncio.create_task(pipeline())
+        try:
+            while True:
+                event = await events.get()
+                if event is None:
+                    break
+                yield f"data: {json.dumps(event, ensure_ascii=False)}\n\n"
+        finally:
+            # 클라이언트가 끊기면 남은 LLM/합성 작업도 정리
+            worker.cancel()
+            await asyncio.gather(worker, return_exceptions=True)
+            tts_admission.release(user_id, admitted_at)
+            # 확정까지 가지 못했으면 예약 환불 (이미 환불됐으면 아무 일도 없음)
+            if not completed:
+                await run_in_threadpool(credit_ledger.release, hold_id)
+
+    return StreamingResponse(stream(), media_type="text/event-stream")
+
+
+# [NEW] 대화 기억 초기화 (해당 목소리와의 대화를 처음부터)
+@app.delete("/chat/memory/{voice_model_id}")
+async def reset_chat_memory(voice_model_id: int, current_user: Principal = Depends(get_current_principal)):
+    await conversation_memory.reset(current_user.id, voice_model_id)
+    return {"msg": "대화 기억을 초기화했습니다."}
+
 # 충전 (테스트용)
 @app.post("/charge")
 def charge_credit(req: schemas.ChargeRequest, current_user: models.User = Depends(get_current_user), db: Session = Depends(get_db)):
-    current_user.credit_balance += req.amount
-    
-    log = models.CreditLog(
-        user_id=current_user.id,
-        amount=req.amount,
-        transaction_type="CHARGE",
-        description="테스트 충전"
-    )
-    db.add(log)
+    credit_ledger.credit(db, current_user.id, req.amount, "CHARGE", "테스트 충전")
     db.commit()
     return {"msg": "충전 완료", "balance": current_user.credit_balance}
 
+# [NEW] TTS 결과물 캐시 현황 (관리자 전용)
+@app.get("/tts/cache/stats")
+def tts_cache_stats(admin: Principal = Depends(get_admin_user)):
+    return tts_output_cache.report()
+
+# [NEW] Prometheus 수집용 지표 (단계별/요청별 지연 히스토그램 + 대기열 게이지)
+metrics.register_gauge("backend_tts_admission_in_flight", "TTS requests currently admitted", lambda: tts_admission.in_flight)
+metrics.register_gauge("backend_tts_admission_queue_depth", "TTS requests waiting for admission", lambda: len(tts_admission.waiters))
+metrics.register_gauge("backend_training_queue_depth", "Training jobs waiting for a worker", training_runner.queue_depth)
+metrics.register_gauge("backend_auth_cache_entries", "Authenticated principals currently cached", lambda: len(principal_cache.entries))
+metrics.register_gauge("backend_password_hash_pending", "Password hash/verify jobs running or queued", lambda: password_hasher.pending)
+metrics.register_gauge("backend_db_pool_checked_out", "DB connections currently checked out of the pool", lambda: engine.pool.checkedout())
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def prometheus_metrics():
+    return metrics.render()
+
+# [NEW] LLM 호출 현황: 업스트림 호출 수/합쳐진 요청 수/타임아웃 + 대화 기억 현황 (관리자 전용)
+@app.get("/llm/stats")
+def llm_stats(admin: Principal = Depends(get_admin_user)):
+    return {**llm_client.report(), "conversation_memory": conversation_memory.report()}
+
+# [NEW] 플랫폼 수익: 유형별 수수료 합계(CreditLog 기준) + 아직 admin 잔액에 합산되지 않은 금액 (관리자 전용)
+@app.get("/platform/revenue")
+def platform_revenue(admin: Principal = Depends(get_admin_user), db: Session = Depends(get_db)):
+    return platform_ledger.report(db)
+
+# [NEW] 인증 현황: 인증 캐시 적중/미스/무효화 수 + 비밀번호 해시 풀 대기/지연 (관리자 전용)
+@app.get("/auth/cache/stats")
+def auth_cache_stats(admin: Principal = Depends(get_admin_user)):
+    return {**principal_cache.report(), "password_hasher": password_hasher.report()}
+
+# [NEW] 입장 제어 현황: 처리 중/대기열 길이/대기 시간/거절 수 (관리자 전용)
+@app.get("/admission/stats")
+def admission_stats(admin: Principal = Depends(get_admin_user)):
+    return {"tts": tts_admission.report(), "train": train_admission.report()}
+
+# [NEW] 오디오 압축 변환 현황 (절약한 용량 포함, 관리자 전용)
+@app.get("/audio/transcode/stats")
+def audio_transcode_stats(admin: Principal = Depends(get_admin_user)):
+    return transcoder.report()
+
+# [NEW] 모델 워밍업: usage_count 상위 목소리를 AI 서버에 순위대로 전달
+def _popular_model_paths(limit: int) -> list[str]:
+    db = SessionLocal()
+    try:
+        rows = db.query(models.VoiceModel.model_path).filter(
+            models.VoiceModel.model_path.isnot(None)
+        ).order_by(models.VoiceModel.usage_count.desc()).limit(limit).all()
+        return [row.model_path for row in rows]
+    finally:
+        db.close()
+
+async def push_model_warmup(retries: int = 0, only_node: str | None = None) -> dict | None:
+    """인기 목소리를 해시 링의 담당 AI 서버별로 나눠 /warmup 요청. {서버 URL: 결과} 반환"""
+    model_paths = await run_in_threadpool(_popular_model_paths, WARMUP_MODEL_COUNT * max(len(ai_client.nodes), 1))
+    if not model_paths:
+        return None
+    by_node = {}
+    for model_path in model_paths:
+        owner = ai_client.owner(model_path)
+        if owner and (only_node is None or owner == only_node):
+            by_node.setdefault(owner, []).append(model_path)
+
+    results = {}
+    for url, paths in by_node.items():
+        for attempt in range(retries + 1):
+            try:
+                response = await ai_client.node(url).post("/warmup", {"model_paths": paths[:WARMUP_MODEL_COUNT]}, idempotent=True)
+                print(f"모델 워밍업 요청: {url} {len(paths[:WARMUP_MODEL_COUNT])}개")
+                results[url] = response.json()
+                break
+            except Exception as e:
+                print(f"모델 워밍업 요청 실패 {url} ({attempt + 1}/{retries + 1}): {e}")
+                if attempt < retries:
+                    await asyncio.sleep(10)
+    return results or None
+
+# [NEW] 워밍업 다시 실행 (관리자 전용) - 진행 상황은 AI 서버 /ready 로 확인
+@app.post("/tts/warmup")
+async def trigger_model_warmup(admin: Principal = Depends(get_admin_user)):
+    result = await push_model_warmup()
+    if result is None:
+        raise HTTPException(status_code=503, detail="워밍업 요청에 실패했거나 대상 모델이 없습니다.")
+    return result
+
+# [NEW] AI 서버별 워밍업 상태 (관리자 전용)
+@app.get("/tts/warmup")
+async def model_warmup_status(admin: Principal = Depends(get_admin_user)):
+    statuses = {}
+    for url, client in list(ai_client.nodes.items()):
+        try:
+            statuses[url] = (await client.http.get("/ready", timeout=5)).json()
+        except (httpx.HTTPError, ValueError) as e:
+            statuses[url] = {"ready": False, "error": str(e)}
+    return statuses
+
+# [NEW] AI 서버 풀 현황: 서버별 상태/처리 중 요청/지연/큐 길이/해시 링 점유율 (관리자 전용)
+@app.get("/ai/nodes")
+def ai_node_stats(admin: Principal = Depends(get_admin_user)):
+    return ai_client.report()
+
+# [NEW] AI 서버 추가 (관리자 전용) - 옮겨온 목소리만 새 서버에서 워밍업
+@app.post("/ai/nodes")
+async def add_ai_node(request: schemas.AINodeRequest, admin: Principal = Depends(get_admin_user)):
+    if not ai_client.add_node(request.url):
+        raise HTTPException(status_code=400, detail="이미 등록된 AI 서버입니다.")
+    asyncio.create_task(push_model_warmup(only_node=request.url))
+    return ai_client.report()
+
+# [NEW] AI 서버 제거 (관리자 전용) - 그 서버가 맡던 목소리는 링의 다음 서버로 넘어감
+@app.delete("/ai/nodes")
+async def remove_ai_node(url: str, admin: Principal = Depends(get_admin_user)):
+    if len(ai_client.nodes) <= 1:
+        raise HTTPException(status_code=400, detail="마지막 AI 서버는 제거할 수 없습니다.")
+    if not await ai_client.remove_node(url):
+        raise HTTPException(status_code=404, detail="등록되지 않은 AI 서버입니다.")
+    return ai_client.report()
+
 # [NEW] 프론트엔드 정적 파일 서빙 (React + Vite)
 FRONTEND_DIR = os.path.join(BASE_DIR, "../frontend/dist")
 
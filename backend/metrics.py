@@ -0,0 +1,105 @@
+import time
+import uuid
+import bisect
+import threading
+import contextvars
+from contextlib import contextmanager
+
+# 단계별 지연 시간 측정 + Prometheus 텍스트 형식(/metrics) 내보내기
+# - 요청마다 상관 ID(X-Request-ID)를 정해 AI 서버 호출에도 그대로 실어 보냄 -> 두 서비스 로그/지표를 한 요청으로 묶기
+# - stage("이름") 블록의 소요 시간을 히스토그램에 쌓고, 응답의 Server-Timing 헤더로도 돌려줌
+# (외부 라이브러리 없이 필요한 만큼만 구현)
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+request_id_var = contextvars.ContextVar("request_id", default=None)
+stage_timings_var = contextvars.ContextVar("stage_timings", default=None)
+
+
+class Histogram:
+    def __init__(self, name: str, help_text: str, labelnames: tuple, buckets: tuple = DEFAULT_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.labelnames = labelnames
+        self.buckets = buckets
+        self.series = {}  # label 값 tuple -> [버킷별 개수..., 합계, 총 개수]
+        self.lock = threading.Lock()
+
+    def observe(self, labels: tuple, value: float):
+        with self.lock:
+            series = self.series.setdefault(labels, [0] * len(self.buckets) + [0.0, 0])
+            idx = bisect.bisect_left(self.buckets, value)
+            if idx < len(self.buckets):
+                series[idx] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self.lock:
+            for labels, series in sorted(self.series.items()):
+                label_text = ",".join(f'{k}="{v}"' for k, v in zip(self.labelnames, labels))
+                prefix = f"{label_text}," if label_text else ""
+                cumulative = 0
+                for bound, count in zip(self.buckets, series):
+                    cumulative += count
+                    lines.append(f'{self.name}_bucket{{{prefix}le="{bound}"}} {cumulative}')
+                lines.append(f'{self.name}_bucket{{{prefix}le="+Inf"}} {series[-1]}')
+                lines.append(f"{self.name}_sum{{{label_text}}} {series[-2]:.6f}")
+                lines.append(f"{self.name}_count{{{label_text}}} {series[-1]}")
+        return lines
+
+
+STAGE_SECONDS = Histogram("backend_stage_seconds", "Time spent in each backend stage of a request", ("stage",))
+REQUEST_SECONDS = Histogram("backend_request_seconds", "End-to-end backend request latency", ("method", "route", "status"))
+
+_gauges = []  # (name, help, 값을 돌려주는 함수)
+
+
+def register_gauge(name: str, help_text: str, fn):
+    _gauges.append((name, help_text, fn))
+
+
+def new_request_id(incoming: str | None) -> str:
+    # 클라이언트(또는 프록시)가 준 ID가 있으면 이어서 사용
+    if incoming and len(incoming) <= 64:
+        return incoming
+    return uuid.uuid4().hex
+
+
+@contextmanager
+def stage(name: str):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        STAGE_SECONDS.observe((name,), elapsed)
+        timings = stage_timings_var.get()
+        if timings is not None:
+            timings[name] = timings.get(name, 0.0) + elapsed
+
+
+def merge_server_timing(header: str | None, prefix: str = "ai_"):
+    """AI 서버 응답의 Server-Timing 헤더를 현재 요청의 단계 기록에 합침 (지표 히스토그램은 AI 서버 쪽에 있음)"""
+    timings = stage_timings_var.get()
+    if not header or timings is None:
+        return
+    for part in header.split(","):
+        name, _, rest = part.strip().partition(";")
+        if rest.startswith("dur="):
+            try:
+                timings[prefix + name] = timings.get(prefix + name, 0.0) + float(rest[4:]) / 1000
+            except ValueError:
+                pass
+
+
+def server_timing_header(timings: dict) -> str:
+    return ", ".join(f"{name};dur={seconds * 1000:.1f}" for name, seconds in timings.items())
+
+
+def render() -> str:
+    lines = STAGE_SECONDS.render() + REQUEST_SECONDS.render()
+    for name, help_text, fn in _gauges:
+        lines += [f"# HELP {name} {help_text}", f"# TYPE {name} gauge", f"{name} {fn()}"]
+    return "\n".join(lines) + "\n"
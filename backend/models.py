@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Boolean, ForeignKey, DateTime
+from sqlalchemy import Column, Integer, String, Boolean, ForeignKey, DateTime, Text
 from database import Base
 from datetime import datetime
 
@@ -13,6 +13,7 @@ class User(Base):
     role = Column(String(20), default="USER")
     credit_balance = Column(Integer, default=0)
     profile_image = Column(String(255), default="/static/default_profile.png") # [NEW]
+    session_version = Column(Integer, default=0) # [NEW] 올리면 이전에 발급한 토큰이 모두 무효화됨
     created_at = Column(DateTime, default=datetime.now)
 
 # 2. 보이스 모델
@@ -101,4 +102,64 @@ class UserSavedVoice(Base):
     # 복합 키 (Composite Key)
     user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
     voice_model_id = Column(Integer, ForeignKey("voice_models.id"), primary_key=True)
-    created_at = Column(DateTime, default=datetime.now)
\ No newline at end of file
+    created_at = Column(DateTime, default=datetime.now)
+
+# 9. 음성 학습 작업 (비동기 학습 큐)
+# 상태: QUEUED -> RUNNING -> RENDERING_DEMO -> DONE / FAILED
+class TrainingJob(Base):
+    __tablename__ = "training_jobs"
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), index=True)
+    voice_model_id = Column(Integer, ForeignKey("voice_models.id"), nullable=True) # 학습 완료 후 생성된 모델
+
+    # 학습 요청 내용 (모델 생성에 필요한 값 그대로 보관)
+    model_name = Column(String(100), nullable=False)
+    description = Column(String(255), nullable=True)
+    price = Column(Integer, default=0)
+    is_public = Column(Boolean, default=False)
+    ref_text = Column(String(1000))
+    upload_path = Column(String(255))   # 업로드 원본 (static/voices/...)
+    shared_path = Column(String(255))   # AI 서버가 읽는 공유 폴더 경로
+
+    status = Column(String(20), default="QUEUED", index=True)
+    error = Column(String(1000), nullable=True)
+    created_at = Column(DateTime, default=datetime.now)
+    started_at = Column(DateTime, nullable=True)
+    finished_at = Column(DateTime, nullable=True)
+    updated_at = Column(DateTime, default=datetime.now, onupdate=datetime.now)
+
+# 10. 대화 기억 (유저 x 목소리별 최근 대화 + 요약, 메모리에서 주기적으로 저장)
+class ConversationMemory(Base):
+    __tablename__ = "conversation_memories"
+
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    voice_model_id = Column(Integer, ForeignKey("voice_models.id"), primary_key=True)
+    summary = Column(Text, default="")        # 오래된 대화 요약
+    turns = Column(Text, default="[]")        # 최근 대화 JSON [[role, text], ...]
+    updated_at = Column(DateTime, default=datetime.now, onupdate=datetime.now)
+
+# 11. 플랫폼 수수료 장부 (추가만 하는 저널, 주기적으로 admin 잔액에 합산)
+class PlatformFee(Base):
+    __tablename__ = "platform_fees"
+
+    id = Column(Integer, primary_key=True, index=True)
+    amount = Column(Integer)
+    transaction_type = Column(String(50))     # CreditLog와 같은 FEE_* 구분
+    reference_id = Column(Integer, nullable=True)
+    settled = Column(Boolean, default=False, index=True)  # admin 잔액에 합산했는지
+    created_at = Column(DateTime, default=datetime.now)
+
+# 12. 크레딧 예약 (결제 2단계: 먼저 잡아 두고, 생성 성공 시 확정 / 실패 시 환불)
+class CreditHold(Base):
+    __tablename__ = "credit_holds"
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), index=True)
+    amount = Column(Integer)
+    purpose = Column(String(50))              # TTS / CHAT
+    reference_id = Column(Integer, nullable=True)
+    status = Column(String(20), default="HELD", index=True)  # HELD, CAPTURED, RELEASED, EXPIRED
+    created_at = Column(DateTime, default=datetime.now)
+    expires_at = Column(DateTime)
+    updated_at = Column(DateTime, default=datetime.now, onupdate=datetime.now)
@@ -0,0 +1,112 @@
+import os
+import time
+import math
+import asyncio
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from fastapi import HTTPException
+from passlib.context import CryptContext
+
+# 비밀번호 해시/검증 (bcrypt)
+# bcrypt는 한 번에 수십~수백 ms의 CPU를 쓰므로 이벤트 루프에서 직접 돌리면 로그인이 몰릴 때 다른 요청까지 멈춥니다.
+# 별도 프로세스 풀에서 돌려 코어 수만큼 병렬로 처리하고, 대기열이 한도를 넘으면 바로 503으로 거절합니다.
+# 로그인 시 저장된 해시의 cost가 현재 설정(BCRYPT_ROUNDS)과 다르면 새 cost로 다시 해시해 돌려줍니다.
+
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", 12))
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", os.cpu_count() or 2))
+PASSWORD_HASH_MAX_QUEUE = int(os.getenv("PASSWORD_HASH_MAX_QUEUE", 64))   # 워커가 바쁠 때 기다릴 수 있는 요청 수
+
+RECENT_SAMPLES = 200
+
+# 프로세스 풀 워커에서도 import 시점에 같은 설정으로 만들어짐
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=BCRYPT_ROUNDS)
+
+
+def hash_cost(hashed: str) -> int | None:
+    """bcrypt 해시($2b$12$...)에 기록된 cost"""
+    try:
+        return int(hashed.split("$")[2])
+    except (AttributeError, IndexError, ValueError):
+        return None
+
+
+def _hash(password: str) -> str:
+    # 프로세스 풀 워커에서 실행됨 (피클 가능하도록 모듈 최상위 함수)
+    return pwd_context.hash(password)
+
+
+def _verify(password: str, hashed: str) -> tuple[bool, str | None]:
+    if not pwd_context.verify(password, hashed):
+        return False, None
+    if hash_cost(hashed) != BCRYPT_ROUNDS or pwd_context.needs_update(hashed):
+        return True, pwd_context.hash(password)
+    return True, None
+
+
+class PasswordHasher:
+    def __init__(self, workers: int, max_queue: int):
+        self.workers = workers
+        self.max_queue = max_queue
+        self.pool = None
+        self.pending = 0     # 풀에서 실행 중 + 대기 중인 작업 수 (이벤트 루프에서만 변경)
+        self.durations = deque(maxlen=RECENT_SAMPLES)
+        self.stats = {"hashed": 0, "verified": 0, "rehashed": 0, "rejected": 0}
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        if self.pool is None:
+            self.pool = ProcessPoolExecutor(max_workers=self.workers)
+        return self.pool
+
+    def _retry_after(self) -> int:
+        avg = sum(self.durations) / len(self.durations) if self.durations else 0.3
+        return max(1, math.ceil(avg * self.pending / self.workers))
+
+    async def _submit(self, fn, *args):
+        if self.pending >= self.workers + self.max_queue:
+            self.stats["rejected"] += 1
+            raise HTTPException(
+                status_code=503,
+                detail="로그인 요청이 많아 잠시 후 다시 시도해주세요.",
+                headers={"Retry-After": str(self._retry_after())},
+            )
+        self.pending += 1
+        started = time.monotonic()
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._get_pool(), fn, *args)
+        finally:
+            self.pending -= 1
+            self.durations.append(time.monotonic() - started)
+
+    async def hash(self, password: str) -> str:
+        hashed = await self._submit(_hash, password)
+        self.stats["hashed"] += 1
+        return hashed
+
+    async def verify(self, password: str, hashed: str) -> tuple[bool, str | None]:
+        """(일치 여부, 새 해시) 반환. 새 해시는 cost가 바뀌어 다시 저장해야 할 때만 있음"""
+        if not hashed:
+            return False, None
+        ok, new_hash = await self._submit(_verify, password, hashed)
+        self.stats["verified"] += 1
+        if new_hash:
+            self.stats["rehashed"] += 1
+        return ok, new_hash
+
+    def report(self) -> dict:
+        ordered = sorted(self.durations)
+        return {
+            **self.stats,
+            "pending": self.pending,
+            "workers": self.workers,
+            "max_queue": self.max_queue,
+            "bcrypt_rounds": BCRYPT_ROUNDS,
+            "p50_ms": round(ordered[len(ordered) // 2] * 1000, 1) if ordered else None,
+            "p95_ms": round(ordered[min(int(len(ordered) * 0.95), len(ordered) - 1)] * 1000, 1) if ordered else None,
+        }
+
+    def shutdown(self):
+        if self.pool is not None:
+            self.pool.shutdown(wait=False, cancel_futures=True)
+
+
+password_hasher = PasswordHasher(PASSWORD_HASH_WORKERS, PASSWORD_HASH_MAX_QUEUE)
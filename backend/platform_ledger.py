@@ -0,0 +1,134 @@
+import os
+import asyncio
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+import models
+from database import SessionLocal
+
+# 플랫폼 수수료 장부
+# 게임/베팅/모델 판매/TTS/대화의 수수료를 admin 유저 행에 바로 더하면 모든 거래가 그 한 행의 락을 두고 줄을 섭니다.
+# 대신 거래 트랜잭션에서는 CreditLog(FEE_*)와 platform_fees 저널 행을 INSERT만 하고,
+# 백그라운드 작업이 주기적으로 정산되지 않은 저널을 모아 admin 잔액에 한 번에 더합니다.
+# admin 잔액은 최대 FEE_FOLD_INTERVAL 만큼 늦게 반영되며, 수수료 합계는 지금처럼 CreditLog 기준으로 조회됩니다.
+
+ADMIN_USERNAME = "admin"
+FEE_FOLD_INTERVAL = float(os.getenv("FEE_FOLD_INTERVAL", 10))  # admin 잔액 합산 주기 (초)
+FEE_FOLD_BATCH = 5000                                            # 한 트랜잭션에서 합산할 저널 행 수
+
+
+class PlatformLedger:
+    def __init__(self):
+        self.admin_id = None
+        self.fold_task = None
+        self.stats = {"folds": 0, "folded_rows": 0, "folded_amount": 0}
+
+    def get_admin_id(self, db: Session) -> int | None:
+        # admin 계정 id는 바뀌지 않으므로 한 번 찾으면 재사용 (아이디 변경과도 무관)
+        if self.admin_id is None:
+            row = db.query(models.User.id).filter(models.User.username == ADMIN_USERNAME).first()
+            if row:
+                self.admin_id = row[0]
+        return self.admin_id
+
+    def record(self, db: Session, amount: int, transaction_type: str, description: str, reference_id: int | None = None) -> bool:
+        """수수료 기록 (커밋은 호출한 쪽에서). admin 계정이 없거나 금액이 0 이하면 False"""
+        admin_id = self.get_admin_id(db)
+        if admin_id is None or amount <= 0:
+            return False
+        db.add(models.CreditLog(
+            user_id=admin_id,
+            amount=amount,
+            transaction_type=transaction_type,
+            description=description,
+            reference_id=reference_id
+        ))
+        db.add(models.PlatformFee(amount=amount, transaction_type=transaction_type, reference_id=reference_id))
+        return True
+
+    # --- 주기적 합산 ---
+    def start(self):
+        if self.fold_task is None or self.fold_task.done():
+            self.fold_task = asyncio.create_task(self._fold_loop())
+
+    async def stop(self):
+        if self.fold_task is not None:
+            self.fold_task.cancel()
+            await asyncio.gather(self.fold_task, return_exceptions=True)
+        await self.fold()
+
+    async def _fold_loop(self):
+        while True:
+            await asyncio.sleep(FEE_FOLD_INTERVAL)
+            try:
+                await self.fold()
+            except Exception as e:
+                print(f"수수료 정산 실패: {e}")
+
+    async def fold(self):
+        while True:
+            rows, amount = await run_in_threadpool(self._fold_batch)
+            if rows:
+                self.stats["folds"] += 1
+                self.stats["folded_rows"] += rows
+                self.stats["folded_amount"] += amount
+            if rows < FEE_FOLD_BATCH:
+                return
+
+    def _fold_batch(self) -> tuple[int, int]:
+        db = SessionLocal()
+        try:
+            admin_id = self.get_admin_id(db)
+            if admin_id is None:
+                return 0, 0
+            # 다른 백엔드 프로세스가 같은 행을 합산 중이면 건너뜀
+            fees = db.query(models.PlatformFee.id, models.PlatformFee.amount).filter(
+                models.PlatformFee.settled == False
+            ).order_by(models.PlatformFee.id).limit(FEE_FOLD_BATCH).with_for_update(skip_locked=True).all()
+            if not fees:
+                return 0, 0
+            total = sum(fee.amount for fee in fees)
+            # [MOD] 행 잠금이 없는 DB(SQLite 등)에서는 다른 정산이 먼저 가져갔을 수 있으므로,
+            # 아직 정산 안 된 행만 바꾸고 개수가 맞지 않으면 이번 묶음은 통째로 포기 (중복 합산 방지)
+            updated = db.query(models.PlatformFee).filter(
+                models.PlatformFee.id.in_([fee.id for fee in fees]),
+                models.PlatformFee.settled == False
+            ).update({"settled": True}, synchronize_session=False)
+            if updated != len(fees):
+                db.rollback()
+                return 0, 0
+            db.query(models.User).filter(models.User.id == admin_id).update(
+                {"credit_balance": models.User.credit_balance + total}, synchronize_session=False
+            )
+            db.commit()
+            return len(fees), total
+        finally:
+            db.close()
+
+    def report(self, db: Session) -> dict:
+        admin_id = self.get_admin_id(db)
+        if admin_id is None:
+            return {"by_type": {}, "total": 0, "pending_fold": 0, **self.stats}
+        # 유형별 합계는 기존과 같은 CreditLog(admin, *FEE*) 기준
+        rows = db.query(
+            models.CreditLog.transaction_type, func.sum(models.CreditLog.amount), func.count(models.CreditLog.id)
+        ).filter(
+            models.CreditLog.user_id == admin_id,
+            models.CreditLog.transaction_type.like("%FEE%")
+        ).group_by(models.CreditLog.transaction_type).all()
+        by_type = {t: {"amount": int(amount or 0), "count": count} for t, amount, count in rows}
+        pending = db.query(func.coalesce(func.sum(models.PlatformFee.amount), 0)).filter(
+            models.PlatformFee.settled == False
+        ).scalar()
+        balance = db.query(models.User.credit_balance).filter(models.User.id == admin_id).scalar() or 0
+        return {
+            "by_type": by_type,
+            "total": sum(v["amount"] for v in by_type.values()),
+            "pending_fold": int(pending),
+            "admin_balance": balance,
+            "admin_balance_with_pending": balance + int(pending),
+            **self.stats,
+        }
+
+
+platform_ledger = PlatformLedger()
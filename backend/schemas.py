@@ -42,6 +42,10 @@ class Token(BaseModel):
     access_token: str
     token_type: str
 
+# [NEW] 권한 변경 (관리자 전용)
+class RoleUpdate(BaseModel):
+    role: str  # USER / ADMIN
+
 # --- 베팅 관련 ---
 class TeamCreate(BaseModel):
     name: str
@@ -133,6 +137,7 @@ class VoiceModelUpdate(BaseModel):
 class TTSRequest(BaseModel):
     voice_model_id: int
     text: str
+    audio_format: Optional[str] = None # [NEW] "wav" / "opus" / "aac" (없으면 서버 기본값)
 
 # [NEW] 이게 없어서 에러가 났었습니다! (DB 모델 필드와 일치시킴)
 class VoiceModelResponse(BaseModel):
@@ -159,6 +164,7 @@ class VoiceModelResponse(BaseModel):
 class ChatRequest(BaseModel):
     text: str
     voice_model_id: int
+    audio_format: Optional[str] = None # [NEW] "wav" / "opus" / "aac" (없으면 서버 기본값)
 
 class ChatResponse(BaseModel):
     reply_text: str
@@ -168,4 +174,22 @@ class ChatResponse(BaseModel):
 # [NEW] 텍스트만 먼저 받는 응답
 class ChatTextResponse(BaseModel):
     reply_text: str
-    remaining_credits: int
\ No newline at end of file
+    remaining_credits: int
+# --- [NEW] 음성 학습 작업 ---
+class TrainingJobResponse(BaseModel):
+    id: int
+    model_name: str
+    status: str  # QUEUED / RUNNING / RENDERING_DEMO / DONE / FAILED
+    voice_model_id: Optional[int] = None
+    error: Optional[str] = None
+    created_at: datetime
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+    updated_at: Optional[datetime] = None
+
+    class Config:
+        from_attributes = True
+
+# --- [NEW] AI 서버 풀 ---
+class AINodeRequest(BaseModel):
+    url: str  # 예: http://gpt-sovits-2:9880
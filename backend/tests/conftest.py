@@ -0,0 +1,77 @@
+import ast
+import os
+import sys
+import random
+import tempfile
+
+import pytest
+
+# 장부 테스트는 실제 DB에서 돌림 (동시 차감/예약/정산)
+# DATABASE_URL이 있으면 그 DB(MySQL 등)를, 없으면 임시 SQLite 파일을 사용
+_TMP_DIR = tempfile.mkdtemp()
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(_TMP_DIR, 'ledger.db')}")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import create_engine  # noqa: E402
+from sqlalchemy.orm import sessionmaker  # noqa: E402
+
+THREADS = 16
+START_BALANCE = 1000
+
+
+@pytest.fixture(scope="session")
+def session_factory():
+    import models
+
+    url = os.environ["DATABASE_URL"]
+    connect_args = {"timeout": 30, "check_same_thread": False} if url.startswith("sqlite") else {}
+    engine = create_engine(url, connect_args=connect_args, pool_size=THREADS, max_overflow=THREADS)
+    models.Base.metadata.create_all(bind=engine)
+    yield sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    engine.dispose()
+
+
+@pytest.fixture
+def ledger_db(session_factory, monkeypatch):
+    """자체 세션을 여는 장부 함수(hold/release/정산 등)도 스레드에서 쓸 수 있는 테스트 엔진을 쓰도록"""
+    import credit_ledger
+    import platform_ledger
+
+    monkeypatch.setattr(credit_ledger, "SessionLocal", session_factory)
+    monkeypatch.setattr(platform_ledger, "SessionLocal", session_factory)
+    return session_factory
+
+
+def make_user(session_factory, balance: int = START_BALANCE, username: str | None = None) -> int:
+    import models
+
+    db = session_factory()
+    try:
+        user = models.User(username=username or f"ledger_{random.getrandbits(48)}", password="x", credit_balance=balance)
+        db.add(user)
+        db.commit()
+        return user.id
+    finally:
+        db.close()
+
+
+@pytest.fixture
+def user_id(session_factory):
+    return make_user(session_factory)
+
+
+# ai_server.py는 GPT-SoVITS 컨테이너(api_v2, numpy, fastapi) 안에서만 import되므로,
+# 필요한 정의만 소스에서 꺼내 주어진 namespace에서 실행해 검사
+AI_SERVER = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "ai_server.py")
+
+
+def load_ai_server(names: set, namespace: dict) -> dict:
+    with open(AI_SERVER, encoding="utf-8") as f:
+        tree = ast.parse(f.read())
+    nodes = [
+        node for node in tree.body
+        if (isinstance(node, (ast.FunctionDef, ast.ClassDef)) and node.name in names)
+        or (isinstance(node, ast.Assign) and any(getattr(t, "id", None) in names for t in node.targets))
+    ]
+    exec(compile(ast.Module(body=nodes, type_ignores=[]), AI_SERVER, "exec"), namespace)
+    return namespace
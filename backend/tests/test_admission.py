@@ -0,0 +1,134 @@
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+
+from admission import AdmissionController, BacklogGuard
+
+
+def _controller(max_in_flight=1, max_per_user=2, max_queue=8, max_wait=5.0) -> AdmissionController:
+    return AdmissionController("test", max_in_flight, max_per_user, max_queue, max_wait)
+
+
+async def _settle():
+    # 대기 중인 태스크들이 한 번씩 돌 수 있게
+    for _ in range(5):
+        await asyncio.sleep(0)
+
+
+def test_per_user_cap_rejects_with_429():
+    async def run():
+        ctrl = _controller(max_in_flight=4, max_per_user=2)
+        await ctrl.acquire(1)
+        await ctrl.acquire(1)
+        with pytest.raises(HTTPException) as exc:
+            await ctrl.acquire(1)
+        assert exc.value.status_code == 429
+        assert int(exc.value.headers["Retry-After"]) >= 1
+        # 다른 사용자는 영향 없음
+        await ctrl.acquire(2)
+        assert ctrl.stats["rejected_user"] == 1
+        assert ctrl.per_user == {1: 2, 2: 1}
+
+    asyncio.run(run())
+
+
+def test_waiters_are_admitted_in_fifo_order():
+    async def run():
+        ctrl = _controller(max_in_flight=1)
+        started = await ctrl.acquire(0)
+        admitted = []
+
+        async def wait(user_id):
+            started_at = await ctrl.acquire(user_id)
+            admitted.append(user_id)
+            return started_at
+
+        tasks = []
+        for user_id in (1, 2, 3):
+            tasks.append(asyncio.create_task(wait(user_id)))
+            await _settle()
+        assert len(ctrl.waiters) == 3 and ctrl.in_flight == 1
+
+        # 자리는 반납할 때마다 가장 먼저 온 대기자에게 그대로 넘어감
+        ctrl.release(0, started)
+        for i, task in enumerate(tasks):
+            started_at = await task
+            assert admitted == [1, 2, 3][: i + 1]
+            assert ctrl.in_flight == 1
+            ctrl.release(i + 1, started_at)
+        assert ctrl.in_flight == 0 and ctrl.per_user == {} and not ctrl.waiters
+
+    asyncio.run(run())
+
+
+def test_full_queue_rejects_with_503_and_retry_after():
+    async def run():
+        ctrl = _controller(max_in_flight=2, max_per_user=10, max_queue=3)
+        ctrl.service_times.extend([3.0, 5.0])  # 평균 처리 시간 4초
+        await ctrl.acquire(1)
+        await ctrl.acquire(1)
+        waiters = [asyncio.create_task(ctrl.acquire(1)) for _ in range(3)]
+        await _settle()
+
+        with pytest.raises(HTTPException) as exc:
+            await ctrl.acquire(2)
+        assert exc.value.status_code == 503
+        # 평균 4초 x (대기 3 + 1) / 동시 처리 2 = 8초
+        assert exc.value.headers["Retry-After"] == "8"
+        assert ctrl.stats["rejected_queue"] == 1
+
+        for task in waiters:
+            task.cancel()
+        await asyncio.gather(*waiters, return_exceptions=True)
+
+    asyncio.run(run())
+
+
+def test_max_wait_times_out_without_leaking_slots():
+    async def run():
+        ctrl = _controller(max_in_flight=1, max_wait=0.05)
+        started = await ctrl.acquire(1)
+        with pytest.raises(HTTPException) as exc:
+            await ctrl.acquire(2)
+        assert exc.value.status_code == 503
+        assert ctrl.stats["timed_out"] == 1
+        assert not ctrl.waiters and ctrl.per_user == {1: 1}
+
+        ctrl.release(1, started)
+        assert ctrl.in_flight == 0 and ctrl.per_user == {}
+
+    asyncio.run(run())
+
+
+def test_cancelled_waiter_gives_up_its_place():
+    async def run():
+        ctrl = _controller(max_in_flight=1)
+        started = await ctrl.acquire(1)
+        waiter = asyncio.create_task(ctrl.acquire(2))
+        await _settle()
+        waiter.cancel()
+        await asyncio.gather(waiter, return_exceptions=True)
+        assert not ctrl.waiters and ctrl.per_user == {1: 1}
+
+        ctrl.release(1, started)
+        assert ctrl.in_flight == 0
+        # 자리가 새지 않았으므로 바로 다시 받을 수 있음
+        async with ctrl.slot(3):
+            assert ctrl.in_flight == 1
+        assert ctrl.in_flight == 0
+
+    asyncio.run(run())
+
+
+def test_backlog_guard_limits_user_and_queue():
+    guard = BacklogGuard(max_backlog=2, max_per_user=1, retry_after=60)
+    guard.check(backlog=0, user_pending=0)
+    with pytest.raises(HTTPException) as exc:
+        guard.check(backlog=0, user_pending=1)
+    assert exc.value.status_code == 429
+    with pytest.raises(HTTPException) as exc:
+        guard.check(backlog=2, user_pending=0)
+    assert exc.value.status_code == 503
+    assert exc.value.headers["Retry-After"] == "60"
+    assert guard.stats == {"admitted": 1, "rejected_user": 1, "rejected_queue": 1}
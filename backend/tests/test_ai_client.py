@@ -0,0 +1,112 @@
+import asyncio
+
+import httpx
+import pytest
+
+import ai_client
+from ai_client import AIWorkerPool, HashRing
+
+URLS = ["http://ai-a:9880", "http://ai-b:9880", "http://ai-c:9880"]
+KEYS = [f"/workspace/logs/{i}_voice" for i in range(300)]
+
+
+def test_ring_lists_every_node_owner_first():
+    ring = HashRing(vnodes=50)
+    for url in URLS:
+        ring.add(url)
+    for key in KEYS[:20]:
+        candidates = ring.candidates(key)
+        assert sorted(candidates) == sorted(URLS)
+        assert candidates == ring.candidates(key)  # 같은 키는 항상 같은 순서
+    assert sum(ring.share().values()) == pytest.approx(1.0, abs=1e-3)
+
+
+def test_removing_a_node_only_moves_its_keys():
+    ring = HashRing(vnodes=50)
+    for url in URLS:
+        ring.add(url)
+    before = {key: ring.candidates(key)[0] for key in KEYS}
+
+    ring.remove(URLS[1])
+    after = {key: ring.candidates(key)[0] for key in KEYS}
+    for key in KEYS:
+        if before[key] != URLS[1]:
+            assert after[key] == before[key]
+        else:
+            # 빠진 서버의 키는 링에서 그 다음 서버로
+            assert after[key] != URLS[1]
+
+    ring.add(URLS[1])
+    assert {key: ring.candidates(key)[0] for key in KEYS} == before
+
+
+def _pool(handlers: dict) -> AIWorkerPool:
+    """서버별 응답을 httpx.MockTransport로 정한 풀 (실제 네트워크 없음)"""
+    pool = AIWorkerPool(list(handlers))
+    for url, handler in handlers.items():
+        pool.nodes[url].http = httpx.AsyncClient(base_url=url, transport=httpx.MockTransport(handler))
+    return pool
+
+
+def _ok(url):
+    def handler(request):
+        return httpx.Response(200, json={"served_by": url})
+    return handler
+
+
+def _refuse(request):
+    raise httpx.ConnectError("connection refused", request=request)
+
+
+def test_pool_fails_over_to_next_node_and_marks_dead_one_down(monkeypatch):
+    monkeypatch.setattr(ai_client, "RETRY_BACKOFF", 0)
+    probe = _pool({url: _ok(url) for url in URLS})
+    key = KEYS[0]
+    owner, fallback = probe.ring.candidates(key)[:2]
+
+    pool = _pool({url: (_refuse if url == owner else _ok(url)) for url in URLS})
+
+    async def run():
+        response = await pool.post("/tts", {"model_path": key})
+        assert response.json()["served_by"] == fallback
+        # 죽은 서버는 링에서 빠져 다음 요청은 바로 다음 서버로
+        assert not pool.metrics[owner]["healthy"]
+        assert owner not in pool.ring.nodes()
+        assert pool.owner(key) == fallback
+        assert pool.metrics[owner]["errors"] == 1
+        assert pool.metrics[fallback]["in_flight"] == 0
+
+        # 헬스 체크가 성공하면 복귀 (같은 키는 다시 원래 서버로)
+        pool.nodes[owner].http = httpx.AsyncClient(
+            base_url=owner, transport=httpx.MockTransport(lambda r: httpx.Response(200, json={"queue_depth": 0}))
+        )
+        await pool._check(owner)
+        assert pool.metrics[owner]["healthy"]
+        assert pool.owner(key) == owner
+
+    asyncio.run(run())
+
+
+def test_pool_raises_when_every_node_refuses(monkeypatch):
+    monkeypatch.setattr(ai_client, "RETRY_BACKOFF", 0)
+    pool = _pool({url: _refuse for url in URLS})
+
+    async def run():
+        with pytest.raises(httpx.ConnectError):
+            await pool.post("/tts", {"model_path": KEYS[0]})
+        assert all(not m["healthy"] for m in pool.metrics.values())
+
+    asyncio.run(run())
+
+
+def test_health_check_needs_consecutive_failures():
+    pool = _pool({URLS[0]: lambda r: httpx.Response(500)})
+
+    async def run():
+        for _ in range(ai_client.HEALTH_FAILURE_THRESHOLD - 1):
+            await pool._check(URLS[0])
+        assert pool.metrics[URLS[0]]["healthy"]
+        await pool._check(URLS[0])
+        assert not pool.metrics[URLS[0]]["healthy"]
+
+    asyncio.run(run())
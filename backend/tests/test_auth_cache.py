@@ -0,0 +1,62 @@
+import auth_cache
+from auth_cache import Principal, PrincipalCache
+
+
+class _Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def _cache(monkeypatch, ttl=30, max_entries=100):
+    clock = _Clock()
+    monkeypatch.setattr(auth_cache.time, "monotonic", clock)
+    return PrincipalCache(ttl, max_entries), clock
+
+
+def test_session_version_bump_misses_old_entry(monkeypatch):
+    cache, _ = _cache(monkeypatch)
+    cache.put(Principal(1, "alice", "USER", 0))
+    assert cache.get("alice", 0).id == 1
+
+    # 세션 버전이 오르면 예전 토큰(버전 0)의 키와 새 키가 달라 새 버전은 DB에서 다시 확인
+    assert cache.get("alice", 1) is None
+    cache.put(Principal(1, "alice", "USER", 1))
+    assert cache.get("alice", 1).session_version == 1
+    assert cache.stats["misses"] == 1
+
+
+def test_invalidate_drops_every_session_version(monkeypatch):
+    cache, _ = _cache(monkeypatch)
+    cache.put(Principal(1, "alice", "USER", 0))
+    cache.put(Principal(1, "alice", "USER", 1))
+    cache.put(Principal(2, "bob", "USER", 0))
+
+    cache.invalidate("alice")
+    assert cache.get("alice", 0) is None
+    assert cache.get("alice", 1) is None
+    assert cache.get("bob", 0).id == 2
+
+
+def test_entries_expire_after_ttl(monkeypatch):
+    cache, clock = _cache(monkeypatch, ttl=30)
+    cache.put(Principal(1, "alice", "ADMIN", 0))
+    clock.now += 29
+    assert cache.get("alice", 0).role == "ADMIN"
+    clock.now += 2
+    assert cache.get("alice", 0) is None
+    assert cache.entries == {}
+
+
+def test_full_cache_evicts_expired_then_soonest_to_expire(monkeypatch):
+    cache, clock = _cache(monkeypatch, ttl=30, max_entries=2)
+    cache.put(Principal(1, "alice", "USER", 0))
+    clock.now += 10
+    cache.put(Principal(2, "bob", "USER", 0))
+    clock.now += 10
+    cache.put(Principal(3, "carol", "USER", 0))  # 가장 먼저 만료될 alice가 빠짐
+    assert cache.get("alice", 0) is None
+    assert cache.get("bob", 0) and cache.get("carol", 0)
+    assert len(cache.entries) == 2
@@ -0,0 +1,207 @@
+import random
+import threading
+from datetime import datetime, timedelta
+
+from sqlalchemy import func
+
+import models
+import credit_ledger
+from conftest import THREADS, START_BALANCE, make_user
+
+OPS_PER_THREAD = 25
+
+
+def _run_parallel(session_factory, operation):
+    """THREADS개 스레드가 각자 세션으로 operation(db, rng)을 반복. 성공한 결과 목록 반환"""
+    results = []
+    errors = []
+    lock = threading.Lock()
+    start = threading.Barrier(THREADS)
+
+    def worker(seed: int):
+        rng = random.Random(seed)
+        start.wait()
+        for _ in range(OPS_PER_THREAD):
+            db = session_factory()
+            try:
+                result = operation(db, rng)
+                db.commit()
+                if result is not None:
+                    with lock:
+                        results.append(result)
+            except Exception as e:
+                db.rollback()
+                with lock:
+                    errors.append(e)
+            finally:
+                db.close()
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(THREADS)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert not errors, errors
+    return results
+
+
+def _balance_and_log_sum(session_factory, user_id: int) -> tuple[int, int]:
+    db = session_factory()
+    try:
+        balance = db.query(models.User.credit_balance).filter(models.User.id == user_id).scalar()
+        logged = db.query(func.coalesce(func.sum(models.CreditLog.amount), 0)).filter(
+            models.CreditLog.user_id == user_id
+        ).scalar()
+        return balance, int(logged)
+    finally:
+        db.close()
+
+
+def test_parallel_debits_never_overspend(session_factory, user_id):
+    cost = 30
+
+    def spend(db, rng):
+        return cost if credit_ledger.debit(db, user_id, cost, "TEST_USE", "동시 차감 테스트") else None
+
+    charged = _run_parallel(session_factory, spend)
+    balance, logged = _balance_and_log_sum(session_factory, user_id)
+
+    # 잔액이 허용하는 만큼만 정확히 성공해야 함
+    assert len(charged) == START_BALANCE // cost
+    assert balance == START_BALANCE - sum(charged)
+    assert balance >= 0
+    assert logged == balance - START_BALANCE
+
+
+def test_parallel_debits_and_bets_keep_log_in_sync(session_factory, user_id):
+    def spend_or_bet(db, rng):
+        if rng.random() < 0.5:
+            amount = rng.randint(1, 80)
+            return -amount if credit_ledger.debit(db, user_id, amount, "TEST_USE", "동시 차감 테스트") else None
+        stake = rng.randint(10, 200)
+        delta = stake - stake // 10 if rng.random() < 0.4 else -stake  # 승리 시 10% 수수료 제외
+        return delta if credit_ledger.settle_bet(db, user_id, stake, delta, "TEST_BET", "동시 베팅 테스트") else None
+
+    applied = _run_parallel(session_factory, spend_or_bet)
+    balance, logged = _balance_and_log_sum(session_factory, user_id)
+
+    assert balance >= 0
+    assert balance == START_BALANCE + sum(applied)
+    assert logged == balance - START_BALANCE
+
+
+# --- 2단계 결제 (예약 -> 확정/환불) ---
+def _hold_status(session_factory, hold_id: int) -> str:
+    db = session_factory()
+    try:
+        return db.query(models.CreditHold.status).filter(models.CreditHold.id == hold_id).scalar()
+    finally:
+        db.close()
+
+
+def _capture(session_factory, hold_id: int) -> bool:
+    db = session_factory()
+    try:
+        captured = credit_ledger.capture(db, hold_id, "TEST_USE", "예약 확정 테스트")
+        db.commit()
+        return captured
+    finally:
+        db.close()
+
+
+def test_hold_then_capture_logs_once(ledger_db, user_id):
+    hold_id = credit_ledger.hold(user_id, 30, "TEST")
+    # 예약만으로는 잔액만 빠지고 CreditLog는 아직 없음
+    assert _balance_and_log_sum(ledger_db, user_id) == (START_BALANCE - 30, 0)
+
+    assert _capture(ledger_db, hold_id)
+    assert _hold_status(ledger_db, hold_id) == "CAPTURED"
+    assert _balance_and_log_sum(ledger_db, user_id) == (START_BALANCE - 30, -30)
+
+    # 확정된 예약은 환불되지 않음
+    assert not credit_ledger.release(hold_id)
+    assert _balance_and_log_sum(ledger_db, user_id) == (START_BALANCE - 30, -30)
+
+
+def test_release_refunds_once(ledger_db, user_id):
+    hold_id = credit_ledger.hold(user_id, 30, "TEST")
+    assert credit_ledger.release(hold_id)
+    assert _hold_status(ledger_db, hold_id) == "RELEASED"
+    assert _balance_and_log_sum(ledger_db, user_id) == (START_BALANCE, 0)
+
+    # 두 번 환불되지 않음
+    assert not credit_ledger.release(hold_id)
+    assert _balance_and_log_sum(ledger_db, user_id) == (START_BALANCE, 0)
+
+
+def test_hold_rejects_insufficient_balance(ledger_db, user_id):
+    assert credit_ledger.hold(user_id, START_BALANCE + 1, "TEST") is None
+    assert _balance_and_log_sum(ledger_db, user_id) == (START_BALANCE, 0)
+
+
+def _expire_now(session_factory, hold_id: int):
+    db = session_factory()
+    try:
+        db.query(models.CreditHold).filter(models.CreditHold.id == hold_id).update(
+            {"expires_at": datetime.now() - timedelta(seconds=1)}, synchronize_session=False
+        )
+        db.commit()
+    finally:
+        db.close()
+
+
+def test_expired_hold_is_refunded_and_capture_falls_back_to_debit(ledger_db, user_id):
+    hold_id = credit_ledger.hold(user_id, 30, "TEST")
+    _expire_now(ledger_db, hold_id)
+
+    assert credit_ledger.expire_stale_holds() >= 1
+    assert _hold_status(ledger_db, hold_id) == "EXPIRED"
+    assert _balance_and_log_sum(ledger_db, user_id) == (START_BALANCE, 0)
+
+    # 작업이 늦게 끝나 확정하면 일반 차감으로 다시 시도
+    assert _capture(ledger_db, hold_id)
+    assert _balance_and_log_sum(ledger_db, user_id) == (START_BALANCE - 30, -30)
+
+
+def test_capture_of_expired_hold_fails_without_balance(ledger_db, session_factory):
+    user_id = make_user(session_factory, balance=30)
+    hold_id = credit_ledger.hold(user_id, 30, "TEST")
+    _expire_now(ledger_db, hold_id)
+    credit_ledger.expire_stale_holds()
+
+    # 환불된 사이에 잔액을 다 써 버렸으면 확정 실패 (마이너스 잔액 없음)
+    db = session_factory()
+    try:
+        assert credit_ledger.debit(db, user_id, 30, "TEST_USE", "다른 사용")
+        db.commit()
+    finally:
+        db.close()
+    assert not _capture(ledger_db, hold_id)
+    assert _balance_and_log_sum(ledger_db, user_id) == (0, -30)
+
+
+def test_parallel_holds_settle_consistently(ledger_db, user_id):
+    cost = 30
+
+    def hold_and_settle(db, rng):
+        hold_id = credit_ledger.hold(user_id, cost, "TEST")
+        if hold_id is None:
+            return None
+        if rng.random() < 0.5:
+            return -cost if credit_ledger.capture(db, hold_id, "TEST_USE", "동시 예약 테스트") else None
+        credit_ledger.release(hold_id)
+        return None
+
+    charged = _run_parallel(ledger_db, hold_and_settle)
+    balance, logged = _balance_and_log_sum(ledger_db, user_id)
+
+    assert balance >= 0
+    assert balance == START_BALANCE + sum(charged)
+    assert logged == balance - START_BALANCE
+    db = ledger_db()
+    try:
+        assert db.query(models.CreditHold).filter(
+            models.CreditHold.user_id == user_id, models.CreditHold.status == "HELD"
+        ).count() == 0
+    finally:
+        db.close()
@@ -0,0 +1,103 @@
+import asyncio
+import threading
+
+from sqlalchemy import func
+
+import models
+from platform_ledger import PlatformLedger, ADMIN_USERNAME
+from conftest import THREADS, make_user
+
+
+def _admin_id(session_factory) -> int:
+    db = session_factory()
+    try:
+        row = db.query(models.User.id).filter(models.User.username == ADMIN_USERNAME).first()
+    finally:
+        db.close()
+    return row[0] if row else make_user(session_factory, balance=0, username=ADMIN_USERNAME)
+
+
+def _record_fees(session_factory, ledger: PlatformLedger, amounts: list[int]):
+    db = session_factory()
+    try:
+        for amount in amounts:
+            assert ledger.record(db, amount, "FEE_TEST", "수수료 테스트")
+        db.commit()
+    finally:
+        db.close()
+
+
+def _admin_state(session_factory, admin_id: int) -> tuple[int, int, int]:
+    """(admin 잔액, admin FEE 로그 합계, 정산 안 된 저널 합계)"""
+    db = session_factory()
+    try:
+        balance = db.query(models.User.credit_balance).filter(models.User.id == admin_id).scalar()
+        logged = db.query(func.coalesce(func.sum(models.CreditLog.amount), 0)).filter(
+            models.CreditLog.user_id == admin_id, models.CreditLog.transaction_type == "FEE_TEST"
+        ).scalar()
+        pending = db.query(func.coalesce(func.sum(models.PlatformFee.amount), 0)).filter(
+            models.PlatformFee.settled == False  # noqa: E712
+        ).scalar()
+        return balance, int(logged), int(pending)
+    finally:
+        db.close()
+
+
+def test_record_skips_non_positive_amounts(ledger_db):
+    _admin_id(ledger_db)
+    ledger = PlatformLedger()
+    db = ledger_db()
+    try:
+        assert not ledger.record(db, 0, "FEE_TEST", "0원")
+        assert not ledger.record(db, -5, "FEE_TEST", "음수")
+    finally:
+        db.rollback()
+        db.close()
+
+
+def test_fold_moves_journal_into_admin_balance(ledger_db):
+    admin_id = _admin_id(ledger_db)
+    ledger = PlatformLedger()
+    asyncio.run(ledger.fold())  # 다른 테스트가 남긴 저널 정리
+    balance_before, logged_before, _ = _admin_state(ledger_db, admin_id)
+
+    _record_fees(ledger_db, ledger, [3, 5, 7])
+    # 기록 시점에는 로그와 저널만 생기고 admin 잔액은 그대로
+    balance, logged, pending = _admin_state(ledger_db, admin_id)
+    assert (balance, logged - logged_before, pending) == (balance_before, 15, 15)
+
+    asyncio.run(ledger.fold())
+    balance, logged, pending = _admin_state(ledger_db, admin_id)
+    assert (balance - balance_before, pending) == (15, 0)
+    assert ledger.stats["folded_amount"] >= 15
+
+
+def test_concurrent_folds_never_double_count(ledger_db):
+    admin_id = _admin_id(ledger_db)
+    ledger = PlatformLedger()
+    asyncio.run(ledger.fold())
+    balance_before, _, _ = _admin_state(ledger_db, admin_id)
+    _record_fees(ledger_db, ledger, list(range(1, 201)))
+
+    # 여러 백엔드 프로세스가 동시에 합산하는 상황: 잠긴 행은 건너뛰고(SKIP LOCKED) 각 행은 한 번만 더해져야 함
+    # (SQLite는 행 잠금이 없어 쓰기 충돌을 "database is locked"로 알리므로, 그런 시도는 실패로 치고 넘어감)
+    start = threading.Barrier(THREADS)
+
+    def worker():
+        start.wait()
+        try:
+            PlatformLedger()._fold_batch()
+        except Exception as e:
+            if "locked" not in str(e):
+                raise
+
+    threads = [threading.Thread(target=worker) for _ in range(THREADS)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    asyncio.run(ledger.fold())
+
+    balance, _, pending = _admin_state(ledger_db, admin_id)
+    assert pending == 0
+    assert balance - balance_before == sum(range(1, 201))
@@ -0,0 +1,98 @@
+import os
+import sys
+import asyncio
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import llm_client  # noqa: E402
+from llm_client import LLMClient, ReplyCache, StubProvider  # noqa: E402
+
+PERSONA = "테스트캐릭터"
+MODEL = "test-model"
+
+
+def _client() -> LLMClient:
+    client = LLMClient(StubProvider(0), timeout=5, max_concurrency=4)
+    # 답변이 덜 모였을 때 가끔 새로 받아 오는 동작은 끄고 결과를 고정
+    client.replies = ReplyCache(ttl=60, max_entries=100, variants=3, refresh_prob=0)
+    return client
+
+
+def _chat(client: LLMClient, text: str, has_context: bool) -> str:
+    prompt = f"{'이전 대화 요약: ...' if has_context else ''}사용자: {text}"
+    return asyncio.run(client.chat(PERSONA, text, prompt, MODEL, has_context=has_context))
+
+
+def test_greeting_hits_cache_after_first_turn():
+    client = _client()
+    first = _chat(client, "안녕!", has_context=False)
+    assert client.stats["upstream_calls"] == 1
+
+    # 두 번째 턴부터는 대화 기억이 있지만, 짧은 인사는 그대로 캐시에서
+    assert _chat(client, "안녕~", has_context=True) == first
+    assert _chat(client, " 안녕 ", has_context=True) == first
+    assert client.stats["upstream_calls"] == 1
+    assert client.replies.stats["hits"] == 2
+
+
+def test_longer_message_with_context_skips_cache():
+    client = _client()
+    text = "어제 말한 그 영화 봤어?"
+    assert len(llm_client.normalize_message(text)) > llm_client.REPLY_CACHE_CONTEXT_FREE_MAX
+    _chat(client, text, has_context=False)
+    _chat(client, text, has_context=True)
+    assert client.stats["upstream_calls"] == 2
+
+
+def test_replies_generated_with_context_are_not_stored():
+    client = _client()
+    _chat(client, "고마워", has_context=True)
+    assert client.replies.entries == {}
+    _chat(client, "고마워", has_context=True)
+    assert client.stats["upstream_calls"] == 2
+
+
+# --- ReplyCache 자체 동작 (TTL / 답변 여러 개 / 크기 제한) ---
+def test_reply_cache_expires_after_ttl(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(llm_client.time, "monotonic", lambda: now[0])
+    cache = ReplyCache(ttl=60, max_entries=10, variants=3, refresh_prob=0)
+    key = cache.key(PERSONA, MODEL, "안녕")
+    cache.put(key, "안녕하세요!")
+    now[0] += 59
+    assert cache.get(key) == "안녕하세요!"
+    now[0] += 2
+    assert cache.get(key) is None
+    assert cache.stats["expired"] == 1
+    assert key not in cache.entries
+
+
+def test_reply_cache_collects_distinct_variants_up_to_limit():
+    cache = ReplyCache(ttl=60, max_entries=10, variants=2, refresh_prob=0)
+    key = cache.key(PERSONA, MODEL, "뭐해?")
+    for reply in ("쉬고 있어요.", "쉬고 있어요.", "책 읽어요.", "산책 중이에요."):
+        cache.put(key, reply)
+    assert cache.entries[key]["replies"] == ["쉬고 있어요.", "책 읽어요."]
+    assert {cache.get(key) for _ in range(50)} == {"쉬고 있어요.", "책 읽어요."}
+
+
+def test_reply_cache_refreshes_until_variants_are_collected(monkeypatch):
+    cache = ReplyCache(ttl=60, max_entries=10, variants=2, refresh_prob=0.5)
+    key = cache.key(PERSONA, MODEL, "뭐해?")
+    cache.put(key, "쉬고 있어요.")
+    monkeypatch.setattr(llm_client.random, "random", lambda: 0.1)
+    assert cache.get(key) is None  # 답변이 덜 모였으니 새로 받아 오게
+    cache.put(key, "책 읽어요.")
+    assert cache.get(key) is not None  # 다 모이면 항상 캐시에서
+    assert cache.stats["refreshes"] == 1
+
+
+def test_reply_cache_key_skips_long_messages_and_evicts_lru():
+    cache = ReplyCache(ttl=60, max_entries=2, variants=1, refresh_prob=0)
+    assert cache.key(PERSONA, MODEL, "가" * (llm_client.REPLY_CACHE_MAX_TEXT + 1)) is None
+    assert cache.key(PERSONA, MODEL, " ~~ ") is None
+    keys = [cache.key(PERSONA, MODEL, text) for text in ("안녕", "고마워", "잘자")]
+    for key in keys:
+        cache.put(key, "응!")
+    assert list(cache.entries) == keys[1:]
+    assert cache.stats["evictions"] == 1
@@ -0,0 +1,59 @@
+import re
+import threading
+from collections import OrderedDict
+from types import SimpleNamespace
+from typing import Optional
+
+from conftest import load_ai_server
+
+# 문장 분리/문장 캐시에 필요한 정의만 ai_server.py에서 꺼냄 (타입 주석에만 쓰이는 이름은 아무 값으로)
+_ns = load_ai_server(
+    {"_SENTENCE_END", "_HAS_WORD", "_split_sentences", "_tts_params", "SentenceSegmentCache"},
+    {"re": re, "threading": threading, "OrderedDict": OrderedDict, "Optional": Optional,
+     "TTSRequestWithModel": object},
+)
+_split_sentences = _ns["_split_sentences"]
+SentenceSegmentCache = _ns["SentenceSegmentCache"]
+
+
+def test_splits_on_terminal_punctuation():
+    assert _split_sentences("안녕하세요. 반가워요! 잘 지냈어요?") == ["안녕하세요.", "반가워요!", "잘 지냈어요?"]
+
+
+def test_does_not_split_decimal_numbers():
+    assert _split_sentences("가격은 3.5달러입니다. 좋아요!") == ["가격은 3.5달러입니다.", "좋아요!"]
+    assert _split_sentences("The version is 3.5.") == ["The version is 3.5."]
+
+
+def test_splits_after_number_at_sentence_end():
+    assert _split_sentences("모두 3. 다음은 4.") == ["모두 3.", "다음은 4."]
+
+
+# --- 문장 캐시 키 ---
+_MANIFEST = {
+    "gpt_path": "/logs/1_voice/s1.ckpt", "gpt_mtime": 1.0,
+    "sovits_path": "/logs/1_voice/s2.pth", "sovits_mtime": 1.0,
+    "ref_audio_path": "/logs/1_voice/1_input.wav", "prompt_text": "안녕하세요", "prompt_lang": None,
+}
+
+
+def _req(**overrides):
+    fields = dict(text_lang="ko", prompt_lang="ko", text_split_method="cut5", speed_factor=1.0,
+                  top_k=5, top_p=1.0, temperature=1.0, repetition_penalty=1.35)
+    return SimpleNamespace(**{**fields, **overrides})
+
+
+def test_sentence_cache_key_covers_every_synthesis_parameter():
+    base = SentenceSegmentCache.key(_MANIFEST, _req(), "좋아요!")
+    assert base == SentenceSegmentCache.key(_MANIFEST, _req(), "좋아요!")
+    for field, value in [("prompt_lang", "en"), ("text_lang", "en"), ("text_split_method", "cut0"),
+                         ("speed_factor", 1.2), ("top_k", 15), ("top_p", 0.8), ("temperature", 0.7),
+                         ("repetition_penalty", 1.0)]:
+        assert SentenceSegmentCache.key(_MANIFEST, _req(**{field: value}), "좋아요!") != base, field
+
+
+def test_sentence_cache_key_uses_manifest_prompt_language_first():
+    manifest = {**_MANIFEST, "prompt_lang": "ja"}
+    assert SentenceSegmentCache.key(manifest, _req(prompt_lang="ko"), "좋아요!") == \
+        SentenceSegmentCache.key(manifest, _req(prompt_lang="en"), "좋아요!")
+    assert SentenceSegmentCache.key(manifest, _req(), "좋아요!") != SentenceSegmentCache.key(_MANIFEST, _req(), "좋아요!")
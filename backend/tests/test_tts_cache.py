@@ -0,0 +1,62 @@
+import os
+
+import tts_cache
+from tts_cache import TTSOutputCache
+
+
+def _write(path: str, size: int) -> str:
+    with open(path, "wb") as f:
+        f.write(b"\0" * size)
+    return path
+
+
+def test_key_normalizes_text_and_separates_options():
+    params = {"audio_format": "wav", "prompt_lang": "ko"}
+    key = tts_cache.make_key("/logs/1_voice", "v1", "안녕  하세요 ", params)
+    assert key == tts_cache.make_key("/logs/1_voice", "v1", "안녕 하세요", dict(params))
+    assert key != tts_cache.make_key("/logs/1_voice", "v2", "안녕 하세요", params)
+    assert key != tts_cache.make_key("/logs/1_voice", "v1", "안녕 하세요", {**params, "audio_format": "opus"})
+
+
+def test_hit_links_file_and_survives_eviction(tmp_path):
+    cache = TTSOutputCache(str(tmp_path / "cache"), max_bytes=100)
+    cache.store("a" * 64, _write(str(tmp_path / "first.wav"), 40))
+
+    dest = str(tmp_path / "user_copy.wav")
+    assert cache.link_into("a" * 64, dest)
+    assert os.path.getsize(dest) == 40
+    assert not cache.link_into("b" * 64, str(tmp_path / "miss.wav"))
+    assert cache.stats["hits"] == 1 and cache.stats["misses"] == 1
+
+    # 캐시에서 지워져도 유저가 받은 파일(하드링크)은 남음
+    cache.store("b" * 64, _write(str(tmp_path / "second.wav"), 90))
+    assert "a" * 64 not in cache.entries
+    assert os.path.exists(dest)
+
+
+def test_eviction_is_least_recently_used_within_byte_limit(tmp_path):
+    cache = TTSOutputCache(str(tmp_path / "cache"), max_bytes=100)
+    for name in ("a", "b", "c"):
+        cache.store(name * 64, _write(str(tmp_path / f"{name}.wav"), 30))
+    assert cache.link_into("a" * 64, str(tmp_path / "touch.wav"))  # a를 최근 사용으로
+
+    cache.store("d" * 64, _write(str(tmp_path / "d.wav"), 30))
+    assert list(cache.entries) == ["c" * 64, "a" * 64, "d" * 64]
+    assert cache.total_bytes == 90
+    assert cache.stats["evictions"] == 1
+    assert not os.path.exists(os.path.join(cache.cache_dir, "b" * 64))
+
+
+def test_restart_restores_entries_and_drops_missing_files(tmp_path):
+    cache_dir = str(tmp_path / "cache")
+    cache = TTSOutputCache(cache_dir, max_bytes=1000)
+    for name in ("a", "b"):
+        cache.store(name * 64, _write(str(tmp_path / f"{name}.wav"), 10))
+
+    restarted = TTSOutputCache(cache_dir, max_bytes=1000)
+    assert set(restarted.entries) == {"a" * 64, "b" * 64}
+    assert restarted.total_bytes == 20
+
+    os.remove(os.path.join(cache_dir, "a" * 64))
+    assert not restarted.link_into("a" * 64, str(tmp_path / "gone.wav"))
+    assert "a" * 64 not in restarted.entries and restarted.total_bytes == 10
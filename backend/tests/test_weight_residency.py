@@ -0,0 +1,140 @@
+import os
+import threading
+from collections import OrderedDict
+
+from conftest import load_ai_server
+
+_ns = load_ai_server(
+    {"WEIGHT_KINDS", "_UNSET", "_checkpoint_identity", "WeightResidencyManager"},
+    {"os": os, "threading": threading, "OrderedDict": OrderedDict},
+)
+WeightResidencyManager = _ns["WeightResidencyManager"]
+
+
+class _Tensor:
+    def numel(self):
+        return 1000
+
+    def element_size(self):
+        return 4
+
+
+class _Module:
+    def __init__(self, name):
+        self.name = name
+        self.device = "cuda"
+
+    def parameters(self):
+        return [_Tensor()]
+
+    def buffers(self):
+        return []
+
+    def to(self, device):
+        self.device = device
+        return self
+
+
+class _Configs:
+    def __init__(self):
+        self.device = "cuda"
+        self.version = "v2"
+        self.use_vocoder = False
+
+
+class _Pipeline:
+    """init_*_weights처럼 모듈 말고도 버전 플래그/보조 모델을 바꾸는 가짜 TTS 파이프라인"""
+
+    def __init__(self):
+        self.configs = _Configs()
+        self.t2s_model = None
+        self.vits_model = None
+        self.is_v2pro = False
+        self.loads = []
+
+    def init_t2s_weights(self, path):
+        self.loads.append(path)
+        self.configs.t2s_weights_path = path
+        self.t2s_model = _Module(path)
+
+    def init_vits_weights(self, path):
+        self.loads.append(path)
+        with open(path) as f:
+            version = f.read()
+        self.configs.vits_weights_path = path
+        self.configs.version = version
+        self.is_v2pro = version == "v2Pro"
+        if self.is_v2pro and not hasattr(self, "sv_model"):
+            self.sv_model = _Module("sv")
+        if version == "v3":
+            self.configs.use_vocoder = True
+            self.vocoder = _Module("bigvgan")
+        else:
+            self.configs.use_vocoder = False
+        self.vits_model = _Module(path)
+
+
+def _checkpoint(tmp_path, name, version):
+    path = tmp_path / name
+    path.write_text(version)
+    return str(path)
+
+
+def test_restore_puts_back_every_attribute_the_load_changed(tmp_path):
+    pipeline = _Pipeline()
+    cache = WeightResidencyManager(pipeline, max_models=4, max_bytes=10 ** 9)
+    v2 = _checkpoint(tmp_path, "v2.pth", "v2")
+    v3 = _checkpoint(tmp_path, "v3.pth", "v3")
+    pro = _checkpoint(tmp_path, "pro.pth", "v2Pro")
+
+    assert cache.activate("vits", v2) == "miss"
+    assert cache.activate("vits", v3) == "miss"
+    assert pipeline.configs.use_vocoder and pipeline.configs.version == "v3"
+    assert cache.activate("vits", pro) == "miss"
+    assert pipeline.is_v2pro
+
+    # v2로 돌아오면 v3/v2Pro 로드가 바꾼 플래그도 v2 값으로 (디스크에서 다시 읽지 않음)
+    assert cache.activate("vits", v2) == "hit"
+    assert pipeline.vits_model.name == v2 and pipeline.vits_model.device == "cuda"
+    assert pipeline.configs.version == "v2"
+    assert pipeline.configs.use_vocoder is False
+    assert pipeline.is_v2pro is False
+    assert pipeline.configs.vits_weights_path == v2
+
+    assert cache.activate("vits", v3) == "hit"
+    assert pipeline.configs.use_vocoder and pipeline.vocoder.name == "bigvgan"
+    assert pipeline.loads == [v2, v3, pro]
+
+
+def test_hardlinked_voices_share_one_resident_copy(tmp_path):
+    pipeline = _Pipeline()
+    cache = WeightResidencyManager(pipeline, max_models=4, max_bytes=10 ** 9)
+    blob = _checkpoint(tmp_path, "base.pth", "v2")
+    voices = []
+    for i in range(3):
+        link = str(tmp_path / f"voice_{i}.pth")
+        os.link(blob, link)
+        voices.append(link)
+
+    assert cache.activate("vits", voices[0]) == "miss"
+    assert cache.activate("vits", voices[1]) == "active"
+    assert cache.activate("t2s", _checkpoint(tmp_path, "s1.ckpt", "")) == "miss"
+    assert cache.activate("vits", voices[2]) == "active"
+    assert len(cache.resident) == 2 and pipeline.loads.count(blob) == 0
+    assert len([p for p in pipeline.loads if p in voices]) == 1
+    # 보고서와 configs에는 실제로 요청한 경로가 남음
+    assert cache.report()["active"]["vits"] == voices[2]
+    assert pipeline.configs.vits_weights_path == voices[2]
+
+
+def test_eviction_parks_and_drops_least_recent_checkpoint(tmp_path):
+    pipeline = _Pipeline()
+    cache = WeightResidencyManager(pipeline, max_models=2, max_bytes=10 ** 9)
+    paths = [_checkpoint(tmp_path, f"{i}.pth", "v2") for i in range(3)]
+    for path in paths:
+        cache.activate("vits", path)
+    assert cache.stats["evictions"] == 1
+    assert [entry["path"] for entry in cache.resident.values()] == paths[1:]
+    # 밀려난 모듈은 호스트 메모리(cpu)로 내려가 있음
+    assert cache.resident[next(iter(cache.resident))]["module"].device == "cpu"
+    assert cache.activate("vits", paths[0]) == "miss"
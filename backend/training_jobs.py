@@ -0,0 +1,190 @@
+import os
+import asyncio
+from datetime import datetime
+from starlette.concurrency import run_in_threadpool
+import models
+from database import SessionLocal
+from ai_client import ai_client
+
+# 음성 학습 작업 큐
+# POST /voice/train 은 training_jobs 행만 만들고 바로 job_id를 돌려주고,
+# 실제 학습(AI 서버 /train_model)과 데모 샘플 생성은 여기 백그라운드 워커가 처리합니다.
+# 워커는 DB 세션을 짧게 열고 닫기 때문에, 학습이 몇 분 걸려도 커넥션을 붙잡지 않습니다.
+
+TRAINING_CONCURRENCY = int(os.getenv("TRAINING_CONCURRENCY", 1))
+DEMO_SAMPLE_TEXT = "안녕하세요. 제 목소리를 들어보세요."
+
+FINAL_STATUSES = ("DONE", "FAILED")
+
+
+def _load_job(job_id: int) -> dict | None:
+    db = SessionLocal()
+    try:
+        job = db.query(models.TrainingJob).filter(models.TrainingJob.id == job_id).first()
+        if not job:
+            return None
+        return {c.name: getattr(job, c.name) for c in models.TrainingJob.__table__.columns}
+    finally:
+        db.close()
+
+
+def _update_job(job_id: int, **fields):
+    db = SessionLocal()
+    try:
+        db.query(models.TrainingJob).filter(models.TrainingJob.id == job_id).update(fields)
+        db.commit()
+    finally:
+        db.close()
+
+
+def _create_voice_model(job: dict, model_path: str) -> int:
+    db = SessionLocal()
+    try:
+        new_model = models.VoiceModel(
+            user_id=job["user_id"],
+            model_name=job["model_name"],
+            description=job["description"],
+            price=job["price"],
+            model_path=model_path,
+            is_public=job["is_public"],
+            usage_count=0
+        )
+        db.add(new_model)
+        db.commit()
+        return new_model.id
+    finally:
+        db.close()
+
+
+def _set_demo_url(voice_model_id: int, demo_url: str):
+    db = SessionLocal()
+    try:
+        db.query(models.VoiceModel).filter(models.VoiceModel.id == voice_model_id).update({"demo_audio_url": demo_url})
+        db.commit()
+    finally:
+        db.close()
+
+
+def _recover_jobs() -> list[int]:
+    # 서버 재시작 시: 대기 중이던 작업은 다시 큐에, 돌던 작업은 정리
+    db = SessionLocal()
+    try:
+        jobs = db.query(models.TrainingJob).filter(
+            models.TrainingJob.status.in_(["QUEUED", "RUNNING", "RENDERING_DEMO"])
+        ).order_by(models.TrainingJob.id).all()
+        requeue = []
+        for job in jobs:
+            if job.status == "QUEUED":
+                requeue.append(job.id)
+            elif job.status == "RENDERING_DEMO":
+                # 모델은 이미 만들어졌고 샘플만 빠진 상태
+                job.status = "DONE"
+                job.finished_at = datetime.now()
+            else:
+                job.status = "FAILED"
+                job.error = "서버 재시작으로 학습이 중단되었습니다."
+                job.finished_at = datetime.now()
+        db.commit()
+        return requeue
+    finally:
+        db.close()
+
+
+class TrainingJobRunner:
+    def __init__(self, concurrency: int):
+        self.concurrency = concurrency
+        self.queue = None
+        self.workers = []
+        self.render_demo = None
+        self.changed = {}  # job_id -> asyncio.Event (상태 변경 구독자 깨우기용)
+
+    async def start(self, render_demo):
+        """render_demo: main._internal_tts_process (순환 import를 피하려고 주입받음)"""
+        self.render_demo = render_demo
+        self.queue = asyncio.Queue()
+        for job_id in await run_in_threadpool(_recover_jobs):
+            self.queue.put_nowait(job_id)
+        self.workers = [asyncio.create_task(self._worker()) for _ in range(self.concurrency)]
+
+    async def stop(self):
+        for worker in self.workers:
+            worker.cancel()
+        await asyncio.gather(*self.workers, return_exceptions=True)
+
+    async def submit(self, job_id: int):
+        await self.queue.put(job_id)
+
+    def queue_depth(self) -> int:
+        return self.queue.qsize() if self.queue else 0
+
+    async def wait_for_change(self, job_id: int, timeout: float):
+        """작업 상태가 바뀌거나 timeout이 지날 때까지 대기 (SSE 구독용)"""
+        event = self.changed.setdefault(job_id, asyncio.Event())
+        try:
+            await asyncio.wait_for(event.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+
+    async def _set(self, job_id: int, **fields):
+        await run_in_threadpool(_update_job, job_id, **fields)
+        event = self.changed.pop(job_id, None)
+        if event:
+            event.set()
+
+    async def _worker(self):
+        while True:
+            job_id = await self.queue.get()
+            try:
+                await self._run(job_id)
+            except Exception as e:
+                print(f"학습 작업 #{job_id} 처리 중 오류: {e}")
+            finally:
+                self.queue.task_done()
+
+    async def _run(self, job_id: int):
+        job = await run_in_threadpool(_load_job, job_id)
+        if not job or job["status"] != "QUEUED":
+            return
+
+        await self._set(job_id, status="RUNNING", started_at=datetime.now())
+        try:
+            # 1. AI 서버에 학습 요청
+            response = await ai_client.post("/train_model", {
+                "user_id": str(job["user_id"]),
+                "model_name": job["model_name"],
+                "ref_audio_path": job["shared_path"],
+                "ref_text": job["ref_text"]
+            })
+            model_path = response.json().get("model_path")
+            if not model_path:
+                raise Exception("AI 서버가 모델 경로를 반환하지 않았습니다.")
+
+            # 2. DB 저장
+            voice_model_id = await run_in_threadpool(_create_voice_model, job, model_path)
+            await self._set(job_id, status="RENDERING_DEMO", voice_model_id=voice_model_id)
+
+            # 3. 샘플 오디오 생성 (실패해도 모델 생성은 성공으로 간주)
+            try:
+                demo_url = await self.render_demo(
+                    text=DEMO_SAMPLE_TEXT,
+                    voice_model_path=model_path,
+                    user_id=job["user_id"],
+                    ref_audio_path=job["shared_path"], # 학습 시 사용한 파일 재사용
+                    prompt_text=job["ref_text"]        # 학습 시 사용한 텍스트 재사용
+                )
+                await run_in_threadpool(_set_demo_url, voice_model_id, demo_url)
+            except Exception as e:
+                print(f"샘플 생성 실패 (무시됨): {e}")
+
+            await self._set(job_id, status="DONE", finished_at=datetime.now())
+
+        except Exception as e:
+            print(f"Error during training job #{job_id}: {e}")
+            # 실패 시 업로드한 파일 삭제 (보관용 링크와 공유 폴더 원본 모두)
+            for path in {job["upload_path"], job["shared_path"]}:
+                if path and os.path.exists(path):
+                    os.remove(path)
+            await self._set(job_id, status="FAILED", error=str(e)[:1000], finished_at=datetime.now())
+
+
+training_runner = TrainingJobRunner(TRAINING_CONCURRENCY)
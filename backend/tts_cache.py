@@ -0,0 +1,116 @@
+import os
+import json
+import shutil
+import hashlib
+import threading
+import unicodedata
+from collections import OrderedDict
+
+# TTS 결과물 캐시 (내용 주소 기반)
+# 같은 목소리 + 같은 체크포인트 + 같은 문장 + 같은 합성 옵션이면 GPU를 다시 돌리지 않고 저장된 오디오를 재사용합니다.
+# 캐시 파일은 {cache_dir}/{key} 에 두고(포맷은 키에 포함), 유저 폴더에는 하드링크로 연결합니다.
+# (하드링크라서 캐시에서 지워져도 유저가 받은 파일은 그대로 남음)
+
+
+def normalize_text(text: str) -> str:
+    # 유니코드 정규화 + 공백 정리 ("안녕  하세요 " == "안녕 하세요")
+    return " ".join(unicodedata.normalize("NFC", text).split())
+
+
+def make_key(model_path: str, checkpoint_version: str, text: str, params: dict) -> str:
+    material = json.dumps({
+        "model_path": model_path,
+        "checkpoint_version": checkpoint_version,
+        "text": normalize_text(text),
+        "params": params,
+    }, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+
+class TTSOutputCache:
+    def __init__(self, cache_dir: str, max_bytes: int):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()  # key -> 파일 크기 (앞쪽이 가장 오래 안 쓴 것)
+        self.total_bytes = 0
+        self.stats = {"hits": 0, "misses": 0, "evictions": 0}
+        self.lock = threading.Lock()
+
+        os.makedirs(cache_dir, exist_ok=True)
+        self._load()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key)
+
+    def _load(self):
+        # 서버 재시작 시 기존 캐시 파일을 최근 사용 순서(mtime)대로 복원
+        files = []
+        for name in os.listdir(self.cache_dir):
+            if "." in name:  # 키는 확장자 없는 sha256
+                continue
+            st = os.stat(os.path.join(self.cache_dir, name))
+            files.append((st.st_mtime, name, st.st_size))
+        for _, key, size in sorted(files):
+            self.entries[key] = size
+            self.total_bytes += size
+        self._evict()
+
+    def link_into(self, key: str, dest_path: str) -> bool:
+        """캐시에 있으면 dest_path로 하드링크하고 True (히트 카운트 포함)"""
+        with self.lock:
+            if key not in self.entries:
+                self.stats["misses"] += 1
+                return False
+            try:
+                _link_or_copy(self._path(key), dest_path)
+            except FileNotFoundError:
+                # 누군가 캐시 파일을 지운 경우
+                self.total_bytes -= self.entries.pop(key)
+                self.stats["misses"] += 1
+                return False
+            self.entries.move_to_end(key)
+            self.stats["hits"] += 1
+        os.utime(self._path(key), None)  # 재시작 후에도 LRU 순서 유지
+        return True
+
+    def store(self, key: str, src_path: str):
+        """새로 생성된 결과물을 캐시에 등록 (하드링크라 추가 디스크 사용 없음)"""
+        with self.lock:
+            if key in self.entries:
+                return
+            _link_or_copy(src_path, self._path(key))
+            size = os.path.getsize(src_path)
+            self.entries[key] = size
+            self.total_bytes += size
+            self._evict()
+
+    def _evict(self):
+        while self.total_bytes > self.max_bytes and self.entries:
+            key, size = self.entries.popitem(last=False)
+            self.total_bytes -= size
+            self.stats["evictions"] += 1
+            try:
+                os.remove(self._path(key))
+            except FileNotFoundError:
+                pass
+
+    def report(self) -> dict:
+        with self.lock:
+            lookups = self.stats["hits"] + self.stats["misses"]
+            return {
+                **self.stats,
+                "hit_rate": round(self.stats["hits"] / lookups, 4) if lookups else 0.0,
+                "entries": len(self.entries),
+                "total_bytes": self.total_bytes,
+                "max_bytes": self.max_bytes,
+            }
+
+
+def _link_or_copy(src: str, dest: str):
+    # 같은 파일시스템이면 하드링크, 아니면 복사
+    try:
+        os.link(src, dest)
+    except FileExistsError:
+        pass
+    except OSError:
+        shutil.copyfile(src, dest)
@@ -241,6 +241,28 @@ export async function uploadVoice(payload) {
   })
 }
 
+// [NEW] 학습 작업 상태 조회 (QUEUED / RUNNING / RENDERING_DEMO / DONE / FAILED)
+export async function fetchTrainingJob(jobId) {
+  return requestJson(`${APP_API_BASE_URL}/voice/train/jobs/${jobId}`)
+}
+
+// [NEW] 학습 작업이 끝날 때까지 폴링 (상태가 바뀔 때마다 onUpdate 호출)
+export async function waitForTrainingJob(jobId, { onUpdate, intervalMs = 3000 } = {}) {
+  let lastStatus = null
+  while (true) {
+    const job = await fetchTrainingJob(jobId)
+    if (job.status !== lastStatus) {
+      lastStatus = job.status
+      onUpdate?.(job)
+    }
+    if (job.status === 'DONE') return job
+    if (job.status === 'FAILED') {
+      throw new Error(job.error || '학습에 실패했습니다.')
+    }
+    await new Promise((resolve) => setTimeout(resolve, intervalMs))
+  }
+}
+
 export async function fetchMyVoices() {
   if (isMockEnabled) {
     return mockFetchMyVoices()
@@ -581,6 +603,73 @@ export async function synthesizeTts(payload, { directEngine = false } = {}) {
   throw new Error('TTS 응답 형식이 올바르지 않습니다.')
 }
 
+// [NEW] TTS 스트리밍 생성 - 청크가 도착할 때마다 onChunk(Uint8Array) 호출
+// 서버가 저장한 파일 주소는 X-Audio-Url 헤더로 전달됨
+export async function streamTts(payload, { onChunk } = {}) {
+  const response = await fetch(`${APP_API_BASE_URL}/tts/generate/stream`, {
+    method: 'POST',
+    headers: buildAuthHeaders({ 'Content-Type': 'application/json' }),
+    body: JSON.stringify(payload),
+    credentials: 'include',
+  })
+  if (!response.ok) {
+    const message = await response.text()
+    throw new Error(message || 'Request failed')
+  }
+
+  const audioUrl = response.headers.get('x-audio-url') || ''
+  const contentType = response.headers.get('content-type') || 'audio/wav'
+  const chunks = []
+  const reader = response.body.getReader()
+  while (true) {
+    const { done, value } = await reader.read()
+    if (done) break
+    chunks.push(value)
+    onChunk?.(value)
+  }
+  return { audioUrl, blob: new Blob(chunks, { type: contentType }) }
+}
+
+// [NEW] 파이프라인 대화 - 문장 텍스트/음성이 준비되는 대로 콜백 호출 (SSE)
+// onText({ index, text }), onAudio({ index, blob }) / 최종 결과 { reply_text, audio_url, remaining_credits } 반환
+export async function streamChatVoice(payload, { onText, onAudio } = {}) {
+  const response = await fetch(`${APP_API_BASE_URL}/chat/voice/stream`, {
+    method: 'POST',
+    headers: buildAuthHeaders({ 'Content-Type': 'application/json' }),
+    body: JSON.stringify(payload),
+    credentials: 'include',
+  })
+  if (!response.ok) {
+    const message = await response.text()
+    throw new Error(message || 'Request failed')
+  }
+
+  const reader = response.body.pipeThrough(new TextDecoderStream()).getReader()
+  let buffer = ''
+  while (true) {
+    const { done, value } = await reader.read()
+    if (done) break
+    buffer += value
+    const events = buffer.split('\n\n')
+    buffer = events.pop()
+    for (const raw of events) {
+      if (!raw.startsWith('data: ')) continue
+      const event = JSON.parse(raw.slice(6))
+      if (event.type === 'text') {
+        onText?.({ index: event.index, text: event.text })
+      } else if (event.type === 'audio') {
+        const bytes = Uint8Array.from(atob(event.audio), (c) => c.charCodeAt(0))
+        onAudio?.({ index: event.index, blob: new Blob([bytes], { type: 'audio/wav' }) })
+      } else if (event.type === 'done') {
+        return event
+      } else if (event.type === 'error') {
+        throw new Error(event.detail || '대화 생성에 실패했습니다.')
+      }
+    }
+  }
+  throw new Error('응답이 중간에 끊겼습니다.')
+}
+
 export async function chatWithBot(payload) {
   // [NEW] 텍스트만 먼저 받기 위해 /chat/text 엔드포인트 사용
   return requestJson(`${APP_API_BASE_URL}/chat/text`, {
@@ -9,6 +9,7 @@ import {
   fetchSavedVoiceList,
   synthesizeTts,
   generateTts,
+  streamChatVoice,
 } from '../api'
 import { APP_API_BASE_URL } from '../api/client'
 import useCredits from '../hooks/useCredits'
@@ -153,6 +154,8 @@ function ChatPage() {
   const [status, setStatus] = useState(null)
   const [audioUrl, setAudioUrl] = useState('')
   const audioRef = useRef(null)
+  const streamQueueRef = useRef([]) // [NEW] 스트리밍 대화에서 받은 문장 음성 (재생 대기)
+  const streamPlayingRef = useRef(false)
   const [isPaused, setIsPaused] = useState(false)
   const [loading, setLoading] = useState(false)
   const [isListening, setIsListening] = useState(false)
@@ -336,6 +339,73 @@ function ChatPage() {
     return null
   }
 
+  // [NEW] 문장 음성을 도착한 순서대로 이어서 재생
+  const playNextStreamed = () => {
+    const nextUrl = streamQueueRef.current.shift()
+    if (!nextUrl) {
+      streamPlayingRef.current = false
+      setIsPaused(true)
+      return
+    }
+    streamPlayingRef.current = true
+    if (audioRef.current) {
+      audioRef.current.pause()
+    }
+    audioRef.current = new Audio(nextUrl)
+    audioRef.current.onended = () => {
+      URL.revokeObjectURL(nextUrl)
+      playNextStreamed()
+    }
+    audioRef.current.play().catch(() => {})
+    setIsPaused(false)
+  }
+
+  // [NEW] 파이프라인 대화 - 답변 문장이 나오는 대로 화면에 붙이고, 문장 음성은 오는 대로 재생
+  // 전체 답변/전체 음성을 기다리지 않으므로 첫 소리가 훨씬 빨리 나옴
+  const sendWithVoiceStream = async (text, voiceModelId) => {
+    const botId = `bot-${Date.now()}`
+    streamQueueRef.current = []
+    streamPlayingRef.current = false
+    setChatHistory((prev) => [
+      ...prev,
+      { role: 'user', text },
+      { id: botId, role: 'bot', text: '', audioUrl: null, isLoading: true },
+    ])
+    setMessage('')
+    const updateBot = (update) =>
+      setChatHistory((prev) =>
+        prev.map((item) => (item.id === botId ? { ...item, ...update(item) } : item)),
+      )
+
+    try {
+      const result = await streamChatVoice(
+        { username: 'user', voice_model_id: voiceModelId, text, message: text },
+        {
+          onText: ({ text: sentence }) =>
+            updateBot((item) => ({ text: item.text ? `${item.text} ${sentence}` : sentence })),
+          onAudio: ({ blob }) => {
+            streamQueueRef.current.push(URL.createObjectURL(blob))
+            if (!streamPlayingRef.current) {
+              playNextStreamed()
+            }
+          },
+        },
+      )
+      let nextUrl = result?.audio_url || ''
+      if (nextUrl.startsWith('/')) {
+        nextUrl = `${APP_API_BASE_URL}${nextUrl}`
+      }
+      // 합친 음성 파일 주소를 저장해 두고 다음에 재생 버튼을 누르면 그 파일을 재생
+      updateBot(() => ({ text: result?.reply_text || '', audioUrl: nextUrl || null, isLoading: false }))
+      if (Number.isFinite(result?.remaining_credits)) {
+        setCredits(result.remaining_credits)
+      }
+    } catch (error) {
+      updateBot((item) => ({ text: item.text || '응답을 받지 못했습니다.', isLoading: false }))
+      throw error
+    }
+  }
+
   const handleSend = async () => {
     if (!message.trim()) return
     await syncCredits({ allowDecrease: false })
@@ -347,6 +417,14 @@ function ChatPage() {
     setLoading(true)
     setStatus(null)
     try {
+      // [NEW] 보이스가 선택돼 있으면 텍스트/음성을 한 번에 스트리밍으로 받음 (목업 대화 모드는 기존 흐름)
+      if (selectedVoice && !isMockChatEnabled()) {
+        const voiceIdValue = Number(selectedVoice)
+        await sendWithVoiceStream(message, Number.isFinite(voiceIdValue) ? voiceIdValue : selectedVoice)
+        setLoading(false)
+        return
+      }
+
       let botText = ''
       try {
         const username = 'user' // 백엔드에서 토큰으로 유저 식별하므로 임의 값
@@ -7,7 +7,9 @@ import {
   fetchMyVoices,
   fetchSavedVoiceList,
   synthesizeTts,
+  streamTts,
   uploadVoice,
+  waitForTrainingJob,
 } from '../api'
 import useCredits from '../hooks/useCredits'
 
@@ -18,6 +20,14 @@ const languages = [
   { value: 'zh', label: '중국어' },
 ]
 
+// [NEW] 학습 작업 상태 표시 문구
+const TRAINING_STATUS_LABELS = {
+  QUEUED: '학습 대기 중입니다...',
+  RUNNING: '목소리를 학습하고 있습니다...',
+  RENDERING_DEMO: '미리듣기 샘플을 만들고 있습니다...',
+  DONE: '학습 완료!',
+}
+
 const presetOptions = [
   {
     id: 'default',
@@ -542,6 +552,15 @@ function MainPage() {
       formData.append('audio_file', targetFile, filename)
       const response = await uploadVoice(formData)
       setTrainStatus('업로드 완료! 학습 파이프라인에서 처리됩니다.')
+      if (response?.job_id) {
+        const job = await waitForTrainingJob(response.job_id, {
+          onUpdate: (next) => {
+            const label = TRAINING_STATUS_LABELS[next.status]
+            if (label) setTrainStatus(label)
+          },
+        })
+        response.voiceId = job.voice_model_id
+      }
       await loadVoices({
         preserveSelection: true,
         preferName: trainName.trim(),
@@ -611,7 +630,11 @@ function MainPage() {
             voice_model_id: voiceModelId,
           }
 
-      const trySynthesize = async () => synthesizeTts(payload, { directEngine })
+      // [NEW] 백엔드 경유 합성은 스트리밍 엔드포인트로 받음 (생성 후 파일을 다시 내려받는 왕복이 없음)
+      const trySynthesize = async () =>
+        directEngine
+          ? synthesizeTts(payload, { directEngine })
+          : (await streamTts(payload)).blob
       let blob
       let retried = false
       let charged = false